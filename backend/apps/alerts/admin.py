@@ -1,7 +1,12 @@
 from django.contrib import admin
-from .models import SecurityAlert
+from .models import SecurityAlert, Incident
 
 @admin.register(SecurityAlert)
 class SecurityAlertAdmin(admin.ModelAdmin):
-    list_display = ['alert_type', 'severity', 'timestamp', 'resolved']
+    list_display = ['alert_type', 'severity', 'timestamp', 'occurrences', 'last_seen', 'resolved']
     list_filter = ['severity', 'resolved']
+
+@admin.register(Incident)
+class IncidentAdmin(admin.ModelAdmin):
+    list_display = ['title', 'severity', 'status', 'alert_count', 'first_seen', 'last_seen']
+    list_filter = ['severity', 'status']
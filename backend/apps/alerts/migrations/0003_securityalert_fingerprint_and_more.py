@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-19 17:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alerts', '0002_alter_securityalert_options'),
+    ]
+
+    operations = [
+        # security_alerts is managed by the desktop app (managed=False): makemigrations
+        # does not detect field changes on unmanaged models, so the deduplication
+        # columns are recorded here to keep the migration state in step with models.py
+        migrations.AddField(
+            model_name='securityalert',
+            name='fingerprint',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='securityalert',
+            name='occurrences',
+            field=models.IntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='securityalert',
+            name='last_seen',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterModelTable(
+            name='securityalert',
+            table='security_alerts',
+        ),
+    ]
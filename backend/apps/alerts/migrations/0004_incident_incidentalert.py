@@ -0,0 +1,64 @@
+# Generated by Django 4.2.7 on 2026-10-19 17:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alerts', '0003_securityalert_fingerprint_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Incident',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(blank=True, max_length=255, null=True)),
+                ('severity', models.CharField(blank=True, max_length=20, null=True)),
+                ('status', models.CharField(default='Open', max_length=20)),
+                ('first_seen', models.DateTimeField(blank=True, null=True)),
+                ('last_seen', models.DateTimeField(blank=True, null=True)),
+                ('alert_count', models.IntegerField(default=0)),
+                ('entities', models.TextField(blank=True, null=True)),
+                ('resolved_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'incidents',
+                'ordering': ['-last_seen'],
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='IncidentAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+            ],
+            options={
+                'db_table': 'incident_alerts',
+                'managed': False,
+            },
+        ),
+        # Relations of unmanaged models are not detected by makemigrations:
+        # recorded here so the migration state matches models.py
+        migrations.AddField(
+            model_name='incidentalert',
+            name='incident',
+            field=models.ForeignKey(db_column='incident_id', on_delete=django.db.models.deletion.CASCADE, to='alerts.incident'),
+        ),
+        migrations.AddField(
+            model_name='incidentalert',
+            name='alert',
+            field=models.ForeignKey(db_column='alert_id', on_delete=django.db.models.deletion.CASCADE, to='alerts.securityalert'),
+        ),
+        migrations.AddField(
+            model_name='incident',
+            name='alerts',
+            field=models.ManyToManyField(related_name='incidents', through='alerts.IncidentAlert', to='alerts.securityalert'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='incidentalert',
+            unique_together={('incident', 'alert')},
+        ),
+    ]
@@ -14,7 +14,8 @@ class SecurityAlert(models.Model):
     ]
     
     # Mapped to 'security_alerts' table
-    # Columns: id, timestamp, alert_type, severity, description, source_ip, target_ip, status, resolved, resolved_at, notes
+    # Columns: id, timestamp, alert_type, severity, description, source_ip, target_ip, status, resolved, resolved_at, notes,
+    #          fingerprint, occurrences, last_seen (deduplicated repeats)
     
     timestamp = models.DateTimeField(auto_now_add=True)
     alert_type = models.CharField(max_length=100)
@@ -30,6 +31,10 @@ class SecurityAlert(models.Model):
     resolved_at = models.DateTimeField(blank=True, null=True)
     notes = models.TextField(blank=True, null=True)
     
+    fingerprint = models.CharField(max_length=64, blank=True, null=True, editable=False)
+    occurrences = models.IntegerField(default=1)
+    last_seen = models.DateTimeField(blank=True, null=True)
+    
     class Meta:
         managed = False
         db_table = 'security_alerts'
@@ -37,3 +42,39 @@ class SecurityAlert(models.Model):
     
     def __str__(self):
         return f"{self.alert_type} - {self.severity}"
+
+
+class Incident(models.Model):
+    """Correlated alerts sharing an IP / MAC within a time window (written by the desktop app)"""
+    
+    # Mapped to 'incidents' table
+    # Columns: id, title, severity, status, first_seen, last_seen, alert_count, entities, resolved_at
+    
+    title = models.CharField(max_length=255, blank=True, null=True)
+    severity = models.CharField(max_length=20, blank=True, null=True)
+    status = models.CharField(max_length=20, default='Open') # Open, Resolved
+    first_seen = models.DateTimeField(blank=True, null=True)
+    last_seen = models.DateTimeField(blank=True, null=True)
+    alert_count = models.IntegerField(default=0)
+    entities = models.TextField(blank=True, null=True) # Comma-separated IPs / MACs
+    resolved_at = models.DateTimeField(blank=True, null=True)
+    
+    alerts = models.ManyToManyField(SecurityAlert, through='IncidentAlert', related_name='incidents')
+    
+    class Meta:
+        managed = False
+        db_table = 'incidents'
+        ordering = ['-last_seen']
+    
+    def __str__(self):
+        return f"#{self.id} {self.title} - {self.severity}"
+
+
+class IncidentAlert(models.Model):
+    incident = models.ForeignKey(Incident, on_delete=models.CASCADE, db_column='incident_id')
+    alert = models.ForeignKey(SecurityAlert, on_delete=models.CASCADE, db_column='alert_id')
+    
+    class Meta:
+        managed = False
+        db_table = 'incident_alerts'
+        unique_together = ('incident', 'alert')
@@ -0,0 +1,28 @@
+"""
+Security Score
+حساب درجة الأمان بنفس قواعد تطبيق سطح المكتب (security_rules.json)
+"""
+import sys
+
+from django.conf import settings
+from django.db.models import Count
+
+from .models import SecurityAlert
+
+if str(settings.DESKTOP_APP_DIR) not in sys.path:
+    sys.path.append(str(settings.DESKTOP_APP_DIR))
+
+from rule_engine import get_engine
+
+
+def current_security_score():
+    """درجة الأمان الحالية من التنبيهات غير المحلولة (تجميع في قاعدة البيانات)"""
+    counts = {}
+    rows = (SecurityAlert.objects.filter(resolved=False)
+            .values('severity')
+            .annotate(count=Count('id')))
+    for row in rows:
+        severity = (row['severity'] or '').title()
+        counts[severity] = counts.get(severity, 0) + row['count']
+
+    return int(get_engine().security_score(counts))
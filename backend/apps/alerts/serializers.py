@@ -1,7 +1,21 @@
 from rest_framework import serializers
-from .models import SecurityAlert
+from .models import SecurityAlert, Incident
 
 class SecurityAlertSerializer(serializers.ModelSerializer):
     class Meta:
         model = SecurityAlert
         fields = '__all__'
+
+
+class IncidentSerializer(serializers.ModelSerializer):
+    entities = serializers.SerializerMethodField()
+    alerts = SecurityAlertSerializer(many=True, read_only=True)
+    
+    class Meta:
+        model = Incident
+        fields = ['id', 'title', 'severity', 'status', 'first_seen', 'last_seen',
+                  'alert_count', 'entities', 'resolved_at', 'alerts']
+        read_only_fields = ['title', 'severity', 'first_seen', 'last_seen', 'alert_count']
+    
+    def get_entities(self, obj):
+        return obj.entities.split(',') if obj.entities else []
@@ -1,8 +1,10 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import SecurityAlertViewSet
+from .views import SecurityAlertViewSet, IncidentViewSet
 
 router = DefaultRouter()
+# Registered first so 'incidents/' is not taken as an alert id
+router.register(r'incidents', IncidentViewSet)
 router.register(r'', SecurityAlertViewSet)
 
 urlpatterns = [path('', include(router.urls))]
@@ -1,10 +1,32 @@
 from rest_framework import viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from .models import SecurityAlert
-from .serializers import SecurityAlertSerializer
+from django.utils import timezone
+from .models import SecurityAlert, Incident
+from .serializers import SecurityAlertSerializer, IncidentSerializer
 
 class SecurityAlertViewSet(viewsets.ModelViewSet):
     queryset = SecurityAlert.objects.all()
     serializer_class = SecurityAlertSerializer
     # permission_classes = [IsAuthenticated]  # Commented for testing
     filterset_fields = ['severity', 'resolved', 'alert_type']
+
+
+class IncidentViewSet(viewsets.ReadOnlyModelViewSet):
+    """Incidents (correlated alerts) with their member alerts"""
+    queryset = Incident.objects.prefetch_related('alerts')
+    serializer_class = IncidentSerializer
+    # permission_classes = [IsAuthenticated]  # Commented for testing
+    filterset_fields = ['severity', 'status']
+    
+    @action(detail=True, methods=['post'])
+    def resolve(self, request, pk=None):
+        """Resolve the incident and all of its alerts"""
+        incident = self.get_object()
+        now = timezone.now()
+        incident.status = 'Resolved'
+        incident.resolved_at = now
+        incident.save(update_fields=['status', 'resolved_at'])
+        incident.alerts.filter(resolved=False).update(resolved=True, status='Resolved', resolved_at=now)
+        return Response(self.get_serializer(incident).data)
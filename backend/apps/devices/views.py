@@ -11,6 +11,7 @@ from django.db.models import Count, Avg
 from .models import Device
 from .serializers import DeviceSerializer, DeviceSyncSerializer
 from apps.alerts.models import SecurityAlert
+from apps.alerts.scoring import current_security_score
 
 
 class DeviceViewSet(viewsets.ModelViewSet):
@@ -107,21 +108,12 @@ class DeviceViewSet(viewsets.ModelViewSet):
     def statistics(self, request):
         """إحصائيات الأجهزة والشبكة"""
         # Calculate real security score
-        alerts = SecurityAlert.objects.filter(resolved=False)
-        deduction = 0
-        for alert in alerts:
-            severity = alert.severity.lower()
-            if severity == 'critical': deduction += 15
-            elif severity == 'high': deduction += 10
-            elif severity == 'medium': deduction += 5
-            elif severity == 'low': deduction += 1
-            
-        security_score = max(0, 100 - deduction)
+        security_score = current_security_score()
 
         stats = {
             'total_devices': Device.objects.count(),
             'active_devices': Device.objects.filter(status__in=['active', 'Active']).count(),
-            'total_alerts': alerts.count(),
+            'total_alerts': SecurityAlert.objects.filter(resolved=False).count(),
             'average_security_score': security_score,
         }
         return Response(stats)
@@ -1,4 +1,5 @@
 from django.contrib import admin
-from .models import NetworkStat
+from .models import NetworkStat, TopTalker
 
 admin.site.register(NetworkStat)
+admin.site.register(TopTalker)
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-19 17:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0002_alter_networkstat_options'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TopTalker',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField(auto_now_add=True)),
+                ('dimension', models.CharField(max_length=20)),
+                ('rank', models.IntegerField(default=0)),
+                ('key', models.CharField(max_length=64)),
+                ('packets', models.BigIntegerField(default=0)),
+                ('bytes', models.BigIntegerField(default=0)),
+                ('share', models.FloatField(default=0.0)),
+                ('packet_rate', models.FloatField(default=0.0)),
+            ],
+            options={
+                'db_table': 'top_talkers',
+                'ordering': ['-timestamp', 'dimension', 'rank'],
+                'managed': False,
+            },
+        ),
+        migrations.AlterModelTable(
+            name='networkstat',
+            table='network_stats',
+        ),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 4.2.7 on 2026-10-19 17:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0003_toptalker_alter_networkstat_table'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NetworkStatDay',
+            fields=[
+                ('bucket', models.DateTimeField(primary_key=True, serialize=False)),
+                ('samples', models.IntegerField(default=0)),
+                ('total_devices_avg', models.FloatField(null=True)),
+                ('active_devices_avg', models.FloatField(null=True)),
+                ('active_devices_max', models.FloatField(null=True)),
+                ('download_speed_avg', models.FloatField(null=True)),
+                ('download_speed_p95', models.FloatField(null=True)),
+                ('upload_speed_avg', models.FloatField(null=True)),
+                ('upload_speed_p95', models.FloatField(null=True)),
+                ('bandwidth_usage_avg', models.FloatField(null=True)),
+                ('packet_loss_avg', models.FloatField(null=True)),
+                ('latency_avg', models.FloatField(null=True)),
+                ('latency_p95', models.FloatField(null=True)),
+            ],
+            options={
+                'db_table': 'network_stats_1d',
+                'ordering': ['-bucket'],
+                'abstract': False,
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='NetworkStatHour',
+            fields=[
+                ('bucket', models.DateTimeField(primary_key=True, serialize=False)),
+                ('samples', models.IntegerField(default=0)),
+                ('total_devices_avg', models.FloatField(null=True)),
+                ('active_devices_avg', models.FloatField(null=True)),
+                ('active_devices_max', models.FloatField(null=True)),
+                ('download_speed_avg', models.FloatField(null=True)),
+                ('download_speed_p95', models.FloatField(null=True)),
+                ('upload_speed_avg', models.FloatField(null=True)),
+                ('upload_speed_p95', models.FloatField(null=True)),
+                ('bandwidth_usage_avg', models.FloatField(null=True)),
+                ('packet_loss_avg', models.FloatField(null=True)),
+                ('latency_avg', models.FloatField(null=True)),
+                ('latency_p95', models.FloatField(null=True)),
+            ],
+            options={
+                'db_table': 'network_stats_1h',
+                'ordering': ['-bucket'],
+                'abstract': False,
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='NetworkStatMinute',
+            fields=[
+                ('bucket', models.DateTimeField(primary_key=True, serialize=False)),
+                ('samples', models.IntegerField(default=0)),
+                ('total_devices_avg', models.FloatField(null=True)),
+                ('active_devices_avg', models.FloatField(null=True)),
+                ('active_devices_max', models.FloatField(null=True)),
+                ('download_speed_avg', models.FloatField(null=True)),
+                ('download_speed_p95', models.FloatField(null=True)),
+                ('upload_speed_avg', models.FloatField(null=True)),
+                ('upload_speed_p95', models.FloatField(null=True)),
+                ('bandwidth_usage_avg', models.FloatField(null=True)),
+                ('packet_loss_avg', models.FloatField(null=True)),
+                ('latency_avg', models.FloatField(null=True)),
+                ('latency_p95', models.FloatField(null=True)),
+            ],
+            options={
+                'db_table': 'network_stats_1m',
+                'ordering': ['-bucket'],
+                'abstract': False,
+                'managed': False,
+            },
+        ),
+    ]
@@ -18,3 +18,64 @@ class NetworkStat(models.Model):
         managed = False
         db_table = 'network_stats'
         ordering = ['-timestamp']
+
+
+class TopTalker(models.Model):
+    # Mapped to 'top_talkers' table (heavy-hitter snapshots written by the desktop app)
+    # Columns: id, timestamp, dimension, rank, key, packets, bytes, share, packet_rate
+    
+    timestamp = models.DateTimeField(auto_now_add=True)
+    dimension = models.CharField(max_length=20)
+    rank = models.IntegerField(default=0)
+    key = models.CharField(max_length=64)
+    packets = models.BigIntegerField(default=0)
+    bytes = models.BigIntegerField(default=0)
+    share = models.FloatField(default=0.0)
+    packet_rate = models.FloatField(default=0.0)
+    
+    class Meta:
+        managed = False
+        db_table = 'top_talkers'
+        ordering = ['-timestamp', 'dimension', 'rank']
+
+
+class NetworkStatRollup(models.Model):
+    # Mapped to the desktop rollup tables (stats_rollup.py): one row per bucket
+    # Columns: bucket, samples, <metric>_min/_max/_avg/_p95 for every network_stats metric
+    
+    bucket = models.DateTimeField(primary_key=True)
+    samples = models.IntegerField(default=0)
+    
+    total_devices_avg = models.FloatField(null=True)
+    active_devices_avg = models.FloatField(null=True)
+    active_devices_max = models.FloatField(null=True)
+    download_speed_avg = models.FloatField(null=True)
+    download_speed_p95 = models.FloatField(null=True)
+    upload_speed_avg = models.FloatField(null=True)
+    upload_speed_p95 = models.FloatField(null=True)
+    bandwidth_usage_avg = models.FloatField(null=True)
+    packet_loss_avg = models.FloatField(null=True)
+    latency_avg = models.FloatField(null=True)
+    latency_p95 = models.FloatField(null=True)
+    
+    class Meta:
+        abstract = True
+        ordering = ['-bucket']
+
+
+class NetworkStatMinute(NetworkStatRollup):
+    class Meta(NetworkStatRollup.Meta):
+        managed = False
+        db_table = 'network_stats_1m'
+
+
+class NetworkStatHour(NetworkStatRollup):
+    class Meta(NetworkStatRollup.Meta):
+        managed = False
+        db_table = 'network_stats_1h'
+
+
+class NetworkStatDay(NetworkStatRollup):
+    class Meta(NetworkStatRollup.Meta):
+        managed = False
+        db_table = 'network_stats_1d'
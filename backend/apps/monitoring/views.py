@@ -2,37 +2,55 @@ from rest_framework import viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from .models import NetworkStat
+from .models import NetworkStat, NetworkStatMinute, NetworkStatHour, NetworkStatDay, TopTalker
+from django.conf import settings
 from django.utils import timezone
 import random
+import sys
 from datetime import timedelta
 
+if str(settings.DESKTOP_APP_DIR) not in sys.path:
+    sys.path.append(str(settings.DESKTOP_APP_DIR))
+
+from stats_rollup import select_tier
+
+ROLLUP_MODELS = {'1m': NetworkStatMinute, '1h': NetworkStatHour, '1d': NetworkStatDay}
+
 class MonitoringViewSet(viewsets.ViewSet):
     # permission_classes = [IsAuthenticated]  # Commented for testing
 
     @action(detail=False, methods=['get'])
     def network_activity(self, request):
         """
-        Returns network activity from NetworkStat model.
+        Returns network activity for the last `hours` (default 24).
+        Reads raw NetworkStat rows for short ranges and the desktop rollup
+        tables (1m / 1h / 1d averages) for longer ones.
         """
-        # Get stats for last 24 hours
-        last_24h = timezone.now() - timedelta(hours=24)
-        stats = NetworkStat.objects.filter(timestamp__gte=last_24h).order_by('timestamp')
+        try:
+            hours = max(1, int(request.query_params.get('hours', 24)))
+        except ValueError:
+            hours = 24
+        since = timezone.now() - timedelta(hours=hours)
+        tier = select_tier(hours)
         
-        # If no real data, fallback to a single point or empty
-        if not stats.exists():
-            # Return empty or minimal data to prevent UI crash
+        if tier == 'raw':
+            stats = NetworkStat.objects.filter(timestamp__gte=since).order_by('timestamp')
+            points = [(stat.timestamp, stat.active_devices) for stat in stats]
+        else:
+            stats = ROLLUP_MODELS[tier].objects.filter(bucket__gte=since).order_by('bucket')
+            points = [(stat.bucket, round(stat.active_devices_avg or 0)) for stat in stats]
+        
+        # If no real data, return empty to prevent UI crash
+        if not points:
             return Response([])
 
-        # Downsample if too many points (e.g. take one per hour)
-        # For now, just return all or map nicely
+        # Format time as HH:MM (dates for the daily tier)
+        time_format = '%Y-%m-%d' if tier == '1d' else '%H:%M'
         data = []
-        for stat in stats:
-            # Format time as HH:MM
-            time_str = stat.timestamp.strftime('%H:%M')
+        for timestamp, devices in points:
             data.append({
-                'time': time_str,
-                'devices': stat.active_devices
+                'time': timestamp.strftime(time_format),
+                'devices': devices
             })
             
         return Response(data)
@@ -42,22 +60,10 @@ class MonitoringViewSet(viewsets.ViewSet):
         """
         Calculates security score based on unresolved alerts.
         """
-        # logic: Start with 100. Deduct points for unresolved alerts.
-        # Critical: -15, High: -10, Medium: -5, Low: -1
-        
-        from apps.alerts.models import SecurityAlert
+        # Weights come from the shared desktop rules (security_rules.json)
+        from apps.alerts.scoring import current_security_score
         
-        alerts = SecurityAlert.objects.filter(resolved=False)
-        deduction = 0
-        
-        for alert in alerts:
-            severity = alert.severity.lower()
-            if severity == 'critical': deduction += 15
-            elif severity == 'high': deduction += 10
-            elif severity == 'medium': deduction += 5
-            elif severity == 'low': deduction += 1
-            
-        score = max(0, 100 - deduction)
+        score = current_security_score()
         
         # For the trend graph, we might not have historical scores stored.
         # We can return the current score as the latest point, 
@@ -107,6 +113,29 @@ class MonitoringViewSet(viewsets.ViewSet):
             
         return Response(data)
 
+    @action(detail=False, methods=['get'])
+    def top_talkers(self, request):
+        """
+        Returns the latest heavy-hitter snapshot grouped by dimension
+        (source / destination / port).
+        """
+        latest = TopTalker.objects.order_by('-timestamp').values_list('timestamp', flat=True).first()
+        if latest is None:
+            return Response({'timestamp': None, 'source': [], 'destination': [], 'port': []})
+        
+        data = {'timestamp': latest, 'source': [], 'destination': [], 'port': []}
+        for talker in TopTalker.objects.filter(timestamp=latest).order_by('dimension', 'rank'):
+            data.setdefault(talker.dimension, []).append({
+                'rank': talker.rank,
+                'key': talker.key,
+                'packets': talker.packets,
+                'bytes': talker.bytes,
+                'share': talker.share,
+                'packet_rate': talker.packet_rate
+            })
+        
+        return Response(data)
+
     @action(detail=False, methods=['post'])
     def sync_stats(self, request):
         """
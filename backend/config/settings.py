@@ -2,6 +2,9 @@ from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Desktop application (shared database and security rules)
+DESKTOP_APP_DIR = BASE_DIR.parent / 'desktop_app'
+
 SECRET_KEY = 'django-insecure-dev-key-change-in-production'
 DEBUG = True
 ALLOWED_HOSTS = ['*']
@@ -58,7 +61,7 @@ WSGI_APPLICATION = 'config.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR.parent / 'desktop_app' / 'network_guardian.db',
+        'NAME': DESKTOP_APP_DIR / 'network_guardian.db',
     }
 }
 
@@ -0,0 +1,113 @@
+"""
+Alert Pipeline Module
+وحدة دمج التنبيهات المتكررة
+
+الوظائف:
+- بصمة ثابتة لكل تنبيه (النوع، الهدف، التفاصيل بعد التطبيع)
+- فهرس في الذاكرة للتنبيهات المفتوحة (غير المحلولة)
+- التكرار يحدّث عدد المرات ووقت آخر ظهور بدل إضافة صف جديد
+"""
+
+import hashlib
+import json
+import re
+import threading
+
+SEVERITY_RANK = {'low': 1, 'medium': 2, 'high': 3, 'critical': 4}
+
+# Leading emoji / symbols used in UI messages ("⚠️ ...", "🔥 ...")
+_PREFIX = re.compile(r'^[^\w]+')
+_SPACES = re.compile(r'\s+')
+# Standalone counts and measurements ("14 ports", "in 60 s"); IPs, ports,
+# versions and ids such as CVE-2021-44228 / SIG-1001 are kept
+_VOLATILE_NUMBER = re.compile(r'(?<![\w.\-:/])(?<!port )\d+(?:\.\d+)?(?![\w.\-:/])')
+
+
+def canonical_json(data):
+    """تمثيل JSON ثابت (مفاتيح مرتبة، بدون مسافات)"""
+    return json.dumps(data, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+
+
+def normalize_details(text):
+    """تطبيع نص التنبيه: بدون رموز البداية والمسافات الزائدة والأعداد المتغيرة"""
+    text = _PREFIX.sub('', str(text or '')).strip().lower()
+    text = _VOLATILE_NUMBER.sub('#', text)
+    return _SPACES.sub(' ', text)
+
+
+def fingerprint(alert):
+    """
+    بصمة التنبيه: نفس النوع + نفس الهدف + نفس التفاصيل = نفس التنبيه
+    يمكن للتنبيه تمرير 'details' (dict) بدل الاعتماد على الوصف
+    """
+    if alert.get('fingerprint'):
+        return alert['fingerprint']
+
+    details = alert.get('details')
+    if details is None:
+        details = normalize_details(alert.get('description'))
+
+    key = {
+        'type': str(alert.get('type') or alert.get('alert_type') or '').strip().lower(),
+        'source': alert.get('source_ip') or '',
+        'target': alert.get('target_ip') or '',
+        'details': details
+    }
+    return hashlib.sha256(canonical_json(key).encode('utf-8')).hexdigest()
+
+
+def higher_severity(current, new):
+    """الخطورة الأعلى من الاثنتين"""
+    if SEVERITY_RANK.get(str(new).lower(), 0) > SEVERITY_RANK.get(str(current).lower(), 0):
+        return new
+    return current
+
+
+class OpenAlertIndex:
+    """فهرس البصمة -> (رقم التنبيه، الخطورة) للتنبيهات المفتوحة"""
+
+    def __init__(self):
+        self.alerts = {}
+        self.stats = {'new': 0, 'merged': 0}
+        self._lock = threading.Lock()
+
+    def load(self, rows):
+        """تحميل التنبيهات المفتوحة من قاعدة البيانات: [(id, fingerprint, severity)]"""
+        with self._lock:
+            self.alerts = {fp: (alert_id, severity) for alert_id, fp, severity in rows if fp}
+
+    def get(self, fp):
+        with self._lock:
+            return self.alerts.get(fp)
+
+    def add(self, fp, alert_id, severity):
+        with self._lock:
+            self.alerts[fp] = (alert_id, severity)
+
+    def discard(self, fp=None, alert_id=None):
+        """حذف تنبيه من الفهرس (بالبصمة أو بالرقم)"""
+        with self._lock:
+            if fp is not None:
+                self.alerts.pop(fp, None)
+            elif alert_id is not None:
+                for key in [k for k, (i, _) in self.alerts.items() if i == alert_id]:
+                    del self.alerts[key]
+
+    def __len__(self):
+        return len(self.alerts)
+
+
+# Test the module
+if __name__ == "__main__":
+    samples = [
+        {'type': 'Security Scan', 'severity': 'High', 'description': '⚠️ Dangerous ports open: 23, 445',
+         'source_ip': '192.168.1.5', 'target_ip': 'localhost'},
+        {'type': 'Security Scan', 'severity': 'High', 'description': 'Dangerous ports open:  23, 3389',
+         'source_ip': '192.168.1.5', 'target_ip': 'localhost'},
+        {'type': 'Known Vulnerability', 'severity': 'Critical', 'description': 'CVE-2021-44228 (log4j 2.14.1 on port 8080)',
+         'source_ip': '192.168.1.7', 'target_ip': '192.168.1.7'},
+        {'type': 'Known Vulnerability', 'severity': 'Critical', 'description': 'CVE-2021-45046 (log4j 2.14.1 on port 8080)',
+         'source_ip': '192.168.1.7', 'target_ip': '192.168.1.7'},
+    ]
+    for alert in samples:
+        print(f"{fingerprint(alert)[:16]}  {normalize_details(alert['description'])}")
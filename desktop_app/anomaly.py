@@ -0,0 +1,331 @@
+"""
+Traffic Anomaly Detector Module
+وحدة كشف الشذوذ في حركة المرور
+
+الوظائف:
+- خط أساس EWMA (متوسط وتباين) لكل مقياس بذاكرة ثابتة
+- خط أساس موسمي حسب ساعة اليوم
+- كشف الانحرافات باستخدام Z-Score و CUSUM
+- تدريب خطوط الأساس من عينات الثانية في ملفات الحلقة (أو من network_stats) دفعة واحدة (NumPy)
+"""
+
+import math
+import time
+from datetime import datetime
+
+import numpy as np
+
+# Streaming metric -> (ring store column, scale from the per-second delta)
+RING_METRICS = {
+    'download_speed': ('rx_bytes', 8 / 1_000_000),
+    'upload_speed': ('tx_bytes', 8 / 1_000_000),
+    'packets_recv': ('rx_packets', 1.0),
+    'packets_sent': ('tx_packets', 1.0),
+}
+
+
+class MetricBaseline:
+    """خط أساس لمقياس واحد"""
+
+    __slots__ = ('alpha', 'mean', 'var', 'count',
+                 'hour_mean', 'hour_var', 'hour_count',
+                 'cusum_pos', 'cusum_neg')
+
+    def __init__(self, alpha=0.05):
+        self.alpha = alpha
+        self.mean = 0.0
+        self.var = 0.0
+        self.count = 0
+
+        # Seasonal (hour-of-day) baselines, 24 fixed slots
+        self.hour_mean = [0.0] * 24
+        self.hour_var = [0.0] * 24
+        self.hour_count = [0] * 24
+
+        self.cusum_pos = 0.0
+        self.cusum_neg = 0.0
+
+    def expected(self, hour, min_hour_samples):
+        """القيمة المتوقعة والتباين لساعة معينة"""
+        if self.hour_count[hour] >= min_hour_samples:
+            return self.hour_mean[hour], self.hour_var[hour]
+        return self.mean, self.var
+
+    def update(self, value, hour):
+        """تحديث المتوسط والتباين (EWMA)"""
+        if self.count == 0:
+            self.mean = value
+        else:
+            diff = value - self.mean
+            incr = self.alpha * diff
+            self.mean += incr
+            self.var = (1 - self.alpha) * (self.var + diff * incr)
+        self.count += 1
+
+        # Seasonal slot uses a running mean until it has enough
+        # history, then switches to the same exponential weighting
+        n = self.hour_count[hour]
+        weight = max(self.alpha, 1.0 / (n + 1))
+        diff = value - self.hour_mean[hour]
+        incr = weight * diff
+        self.hour_mean[hour] += incr
+        self.hour_var[hour] = (1 - weight) * (self.hour_var[hour] + diff * incr)
+        self.hour_count[hour] = n + 1
+
+
+class BackfillMoments:
+    """
+    عزوم التدريب (EWMA + حسب الساعة) تُجمع دفعة بعد دفعة بالترتيب الزمني
+    نفس نتيجة تمرير كل العينات مرة واحدة، بذاكرة الدفعة فقط
+    """
+
+    def __init__(self, alpha):
+        self.alpha = alpha
+        self.count = 0
+        # Decayed weight, weighted sum and weighted sum of squares
+        self.weight = 0.0
+        self.total = 0.0
+        self.squares = 0.0
+        self.hour_count = np.zeros(24, dtype=np.int64)
+        self.hour_sum = np.zeros(24, dtype=np.float64)
+        self.hour_squares = np.zeros(24, dtype=np.float64)
+
+    def add(self, hours, values):
+        """إضافة دفعة: ساعة اليوم والقيمة لكل عينة"""
+        hours = np.asarray(hours, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float64)
+        n = len(values)
+        if n == 0:
+            return
+
+        # Closed-form EWMA: older samples decay as (1 - alpha)^age; the first
+        # sample ever seeds the average, so it keeps the whole remaining weight
+        decay = (1 - self.alpha) ** np.arange(n - 1, -1, -1, dtype=np.float64)
+        weights = self.alpha * decay
+        if self.count == 0:
+            weights[0] = decay[0]
+        shrink = (1 - self.alpha) ** n
+        self.weight = self.weight * shrink + weights.sum()
+        self.total = self.total * shrink + np.dot(weights, values)
+        self.squares = self.squares * shrink + np.dot(weights, values * values)
+
+        self.hour_count += np.bincount(hours, minlength=24)
+        self.hour_sum += np.bincount(hours, weights=values, minlength=24)
+        self.hour_squares += np.bincount(hours, weights=values * values, minlength=24)
+        self.count += n
+
+    def apply(self, baseline, var_scale=1.0):
+        """نقل العزوم إلى خط أساس؛ يعيد عدد العينات"""
+        if self.count == 0:
+            return 0
+
+        mean = float(self.total / self.weight)
+        var = max(float(self.squares / self.weight) - mean * mean, 0.0)
+
+        counts = self.hour_count
+        with np.errstate(invalid='ignore', divide='ignore'):
+            hour_mean = np.where(counts > 0, self.hour_sum / counts, 0.0)
+            hour_var = np.where(counts > 0, self.hour_squares / counts - hour_mean ** 2, 0.0)
+        hour_var = np.clip(hour_var, 0.0, None) * var_scale
+
+        baseline.mean = mean
+        baseline.var = var * var_scale
+        baseline.count = self.count
+        baseline.hour_mean = hour_mean.tolist()
+        baseline.hour_var = hour_var.tolist()
+        baseline.hour_count = counts.tolist()
+        return self.count
+
+
+class TrafficAnomalyDetector:
+    """كاشف الشذوذ التدفقي لعينات حركة المرور"""
+
+    def __init__(self, alpha=0.05, z_threshold=4.0, cusum_k=0.5, cusum_h=8.0,
+                 warmup=60, min_hour_samples=30, cooldown=300):
+        self.alpha = alpha
+        self.z_threshold = z_threshold
+        self.cusum_k = cusum_k
+        self.cusum_h = cusum_h
+        self.warmup = warmup
+        self.min_hour_samples = min_hour_samples
+        self.cooldown = cooldown
+
+        self.baselines = {}
+        self.last_alert = {}
+
+    def _baseline(self, metric):
+        baseline = self.baselines.get(metric)
+        if baseline is None:
+            baseline = MetricBaseline(self.alpha)
+            self.baselines[metric] = baseline
+        return baseline
+
+    def _std(self, mean, var):
+        # Floor the deviation so near-idle metrics do not alert on noise
+        return max(math.sqrt(max(var, 0.0)), 0.05 * abs(mean), 1e-3)
+
+    def update(self, sample, timestamp=None):
+        """
+        معالجة عينة جديدة
+        sample: dict من اسم المقياس إلى القيمة
+        يعيد قائمة بالتنبيهات الأمنية
+        """
+        alerts = []
+
+        try:
+            timestamp = timestamp or datetime.now()
+            hour = timestamp.hour
+            now = timestamp.timestamp()
+
+            for metric, value in sample.items():
+                if value is None:
+                    continue
+                value = float(value)
+                baseline = self._baseline(metric)
+
+                if baseline.count >= self.warmup:
+                    mean, var = baseline.expected(hour, self.min_hour_samples)
+                    std = self._std(mean, var)
+                    z = (value - mean) / std
+
+                    baseline.cusum_pos = max(0.0, baseline.cusum_pos + z - self.cusum_k)
+                    baseline.cusum_neg = max(0.0, baseline.cusum_neg - z - self.cusum_k)
+
+                    alert = None
+                    if abs(z) >= self.z_threshold:
+                        alert = self._make_alert('zscore', metric, value, mean, std, z)
+                    elif baseline.cusum_pos > self.cusum_h or baseline.cusum_neg > self.cusum_h:
+                        alert = self._make_alert('cusum', metric, value, mean, std, z)
+                        baseline.cusum_pos = 0.0
+                        baseline.cusum_neg = 0.0
+
+                    if alert and now - self.last_alert.get((metric, alert['method']), 0) >= self.cooldown:
+                        self.last_alert[(metric, alert['method'])] = now
+                        alerts.append(alert)
+
+                    # Clip outliers so a single burst does not poison the baseline
+                    limit = self.z_threshold * std
+                    value = min(max(value, mean - limit), mean + limit)
+
+                baseline.update(value, hour)
+
+        except Exception as e:
+            print(f"Error updating anomaly detector: {e}")
+
+        return alerts
+
+    def _make_alert(self, method, metric, value, mean, std, z):
+        direction = 'spike' if z > 0 else 'drop'
+
+        if direction == 'drop':
+            severity = 'Low'
+        elif abs(z) >= 2 * self.z_threshold:
+            severity = 'High'
+        else:
+            severity = 'Medium'
+
+        if method == 'zscore':
+            details = f"z={z:.1f}"
+        else:
+            details = "sustained shift (CUSUM)"
+
+        return {
+            'type': 'Traffic Anomaly',
+            'severity': severity,
+            'description': (
+                f"Abnormal {metric} {direction}: {value:.2f} "
+                f"(expected {mean:.2f} ± {std:.2f}, {details})"
+            ),
+            'source_ip': None,
+            'target_ip': None,
+            'method': method,
+            'metric': metric
+        }
+
+    def backfill(self, metric, hours, values, var_scale=1.0):
+        """
+        تدريب خط الأساس لمقياس من مصفوفات NumPy دفعة واحدة
+        hours: ساعة اليوم لكل عينة، values: القيم بالترتيب الزمني
+        var_scale يضرب التباين عندما تكون العينات متوسطات لعدة ثوانٍ
+        """
+        moments = BackfillMoments(self.alpha)
+        moments.add(hours, values)
+        return moments.apply(self._baseline(metric), var_scale)
+
+    def backfill_from_store(self, store, seconds=None, metrics=tuple(RING_METRICS)):
+        """
+        تدريب خطوط الأساس من عينات الثانية في TrafficStore (نفس دقة البث المباشر)
+        يعيد عدد العينات، أو 0 إن لم تكن هناك عينات
+        """
+        try:
+            start = None if seconds is None else time.time() - seconds
+            columns = ('timestamp',) + tuple(RING_METRICS[metric][0] for metric in metrics)
+            samples = store.range(start=start, columns=columns)
+            timestamps = np.asarray(samples['timestamp'], dtype=np.float64)
+            if len(timestamps) == 0:
+                return 0
+
+            # A sample after a gap (agent stopped) holds the whole gap's delta
+            gaps = np.diff(timestamps, prepend=timestamps[0] - 1.0).clip(1.0, None)
+            hours = ((timestamps + time.localtime().tm_gmtoff) // 3600 % 24).astype(np.int64)
+
+            for metric in metrics:
+                column, scale = RING_METRICS[metric]
+                values = np.asarray(samples[column], dtype=np.float64) * scale / gaps
+                self.backfill(metric, hours, values)
+
+            return len(timestamps)
+
+        except Exception as e:
+            print(f"Error backfilling anomaly baselines from traffic store: {e}")
+            return 0
+
+    def backfill_from_db(self, db, metrics=('download_speed', 'upload_speed'), hours=None, sample_seconds=5):
+        """
+        تدريب خطوط الأساس من جدول network_stats (بديل عند غياب ملفات الحلقة)
+        كل صف متوسط sample_seconds ثانية، فيُكبَّر التباين بنفس النسبة
+        ليقارب تباين عينات الثانية التي يقيسها البث المباشر
+        الصفوف تُقرأ دفعات فلا تكبر الذاكرة مع طول السجل
+        """
+        try:
+            moments = {metric: BackfillMoments(self.alpha) for metric in metrics}
+            for rows in db.iter_network_stats_series(list(metrics), hours=hours):
+                data = np.array(rows, dtype=np.float64)
+                hour_col = data[:, 0].astype(np.int64)
+                for idx, metric in enumerate(metrics, start=1):
+                    moments[metric].add(hour_col, np.nan_to_num(data[:, idx]))
+
+            count = 0
+            for metric in metrics:
+                count = moments[metric].apply(self._baseline(metric), var_scale=sample_seconds)
+            return count
+
+        except Exception as e:
+            print(f"Error backfilling anomaly baselines: {e}")
+            return 0
+
+
+# Test the module
+if __name__ == "__main__":
+    import random
+
+    detector = TrafficAnomalyDetector(warmup=30)
+
+    # Train on 24h of synthetic data in one pass
+    n = 24 * 3600 // 5
+    hours = np.repeat(np.arange(24), n // 24)
+    values = 5 + 3 * np.sin(hours / 24 * 2 * np.pi) + np.random.normal(0, 0.5, len(hours))
+
+    start = time.perf_counter()
+    detector.backfill('download_speed', hours, values)
+    print(f"Backfilled {len(values)} samples in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    # Stream normal samples for the current hour, then a spike
+    expected, _ = detector.baselines['download_speed'].expected(datetime.now().hour, 30)
+    alerts = []
+    for _ in range(120):
+        alerts += detector.update({'download_speed': random.gauss(expected, 0.5)})
+    alerts += detector.update({'download_speed': 80})
+
+    for alert in alerts:
+        print(f"[{alert['severity']}] {alert['description']}")
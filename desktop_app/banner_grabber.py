@@ -0,0 +1,229 @@
+"""
+Banner Grabber Module
+وحدة التعرف على الخدمات من الـ Banner
+
+الوظائف:
+- فتح اتصالات متزامنة بعد اكتشاف المنافذ المفتوحة
+- إرسال Probe مناسب للبروتوكول (انتظار الترحيب، HTTP HEAD، TLS ClientHello)
+- قراءة اسم الشهادة (CN) لخدمات TLS
+- تصنيف الخدمة بمجموعة أنماط مترجمة مرة واحدة
+- ذاكرة مؤقتة لكل (ip, port) مع مدة صلاحية لتجنب إعادة الفحص
+"""
+
+import re
+import socket
+import ssl
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Services that speak first: wait for the greeting before probing
+GREETING_PORTS = frozenset({21, 22, 23, 25, 110, 143, 587, 3306, 5900})
+TLS_PORTS = frozenset({443, 465, 636, 853, 993, 995, 8443})
+
+HTTP_PROBE = b"HEAD / HTTP/1.0\r\nUser-Agent: NetworkGuardian\r\n\r\n"
+
+# One alternation, one pass: the matching group name is the service
+_SERVICE_PATTERNS = [
+    ('SSH', r'SSH-\d'),
+    ('HTTP', r'HTTP/\d'),
+    ('FTP', r'220[ -].*(?:FTP|FileZilla)'),
+    ('SMTP', r'220[ -].*(?:SMTP|Postfix|Exim|Sendmail|mail)'),
+    ('POP3', r'\+OK'),
+    ('IMAP', r'\* OK'),
+    ('VNC', r'RFB \d{3}\.\d{3}'),
+    ('MySQL', r'.\x00\x00\x00\x0a\d+\.\d+'),
+    ('Redis', r'-(?:ERR|NOAUTH|DENIED)'),
+    ('Telnet', r'\xff[\xfb-\xfe]'),
+    ('RTSP', r'RTSP/\d'),
+    ('SIP', r'SIP/\d'),
+    ('FTP', r'220[ -]'),
+]
+SERVICE_PATTERN = re.compile(
+    '|'.join(f'(?P<{name}_{i}>{pattern})' for i, (name, pattern) in enumerate(_SERVICE_PATTERNS)),
+    re.I | re.S
+)
+
+_CN_OID = b'\x06\x03\x55\x04\x03'
+
+
+def classify(banner, tls=False):
+    """تحديد الخدمة من الـ Banner (None إن لم تُعرف)"""
+    if not banner:
+        return 'TLS' if tls else None
+    match = SERVICE_PATTERN.match(banner)
+    if match is None:
+        return 'TLS' if tls else None
+    service = match.lastgroup.rsplit('_', 1)[0]
+    if tls:
+        service = {'HTTP': 'HTTPS', 'SMTP': 'SMTPS', 'POP3': 'POP3S', 'IMAP': 'IMAPS'}.get(service, service)
+    return service
+
+
+def certificate_cn(der):
+    """اسم الشهادة (Subject CN) من شهادة DER بدون مكتبات خارجية"""
+    if not der:
+        return None
+    names = []
+    position = der.find(_CN_OID)
+    while position != -1:
+        start = position + len(_CN_OID)
+        if start + 2 <= len(der):
+            length = der[start + 1]
+            if length < 0x80:
+                names.append(der[start + 2:start + 2 + length].decode('utf-8', 'replace'))
+        position = der.find(_CN_OID, start)
+    # Issuer comes before subject in the certificate
+    return names[-1] if names else None
+
+
+class BannerGrabber:
+    """فحص متزامن للخدمات مع ذاكرة مؤقتة لكل (ip, port)"""
+
+    def __init__(self, timeout=1.5, workers=32, ttl=3600, max_entries=65536):
+        self.timeout = timeout
+        self.workers = workers
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.cache = {}         # (ip, port) -> (expires, result)
+        self.stats = {'hits': 0, 'misses': 0}
+        self._lock = threading.Lock()
+        self._tls_context = ssl.create_default_context()
+        self._tls_context.check_hostname = False
+        self._tls_context.verify_mode = ssl.CERT_NONE
+
+    def _recv(self, sock, size=1024):
+        try:
+            return sock.recv(size)
+        except (socket.timeout, OSError):
+            return b''
+
+    def _probe_plain(self, ip, port):
+        """اتصال عادي: انتظار الترحيب ثم HTTP HEAD إن لم يتكلم الخادم"""
+        with socket.create_connection((ip, port), timeout=self.timeout) as sock:
+            # Server-first protocols answer immediately; others get a short wait
+            sock.settimeout(self.timeout if port in GREETING_PORTS else min(self.timeout, 0.5))
+            data = self._recv(sock)
+            if not data:
+                sock.settimeout(self.timeout)
+                sock.sendall(HTTP_PROBE)
+                data = self._recv(sock)
+            return data
+
+    def _probe_tls(self, ip, port):
+        """TLS ClientHello: اسم الشهادة ثم HTTP HEAD داخل القناة المشفرة"""
+        with socket.create_connection((ip, port), timeout=self.timeout) as raw:
+            with self._tls_context.wrap_socket(raw, server_hostname=ip) as sock:
+                cn = certificate_cn(sock.getpeercert(binary_form=True))
+                sock.settimeout(min(self.timeout, 0.5))
+                data = self._recv(sock)
+                if not data:
+                    sock.settimeout(self.timeout)
+                    sock.sendall(HTTP_PROBE)
+                    data = self._recv(sock)
+                return data, cn
+
+    def probe(self, ip, port):
+        """فحص منفذ واحد بدون الذاكرة المؤقتة"""
+        result = {'ip': ip, 'port': port, 'service': None, 'banner': '', 'tls': False, 'cert_cn': None}
+        try:
+            data = b''
+            if port not in TLS_PORTS:
+                data = self._probe_plain(ip, port)
+            # Silent or binary garbage on a plain connection: try TLS
+            if port in TLS_PORTS or not data or data[:1] == b'\x15':
+                try:
+                    data, result['cert_cn'] = self._probe_tls(ip, port)
+                    result['tls'] = True
+                except (ssl.SSLError, OSError):
+                    pass
+        except OSError:
+            return result
+
+        banner = data.decode('latin-1')
+        # Keep headers only (HTTP) and drop control characters
+        banner = banner.split('\r\n\r\n', 1)[0]
+        result['service'] = classify(banner, result['tls'])
+        result['banner'] = ''.join(ch for ch in banner if ch.isprintable() or ch in '\r\n').strip()[:512]
+        return result
+
+    def grab(self, ip, port):
+        """فحص منفذ مع الذاكرة المؤقتة"""
+        key = (ip, port)
+        now = time.monotonic()
+        with self._lock:
+            cached = self.cache.get(key)
+            if cached is not None and cached[0] > now:
+                self.stats['hits'] += 1
+                return cached[1]
+            self.stats['misses'] += 1
+
+        result = self.probe(ip, port)
+
+        with self._lock:
+            if len(self.cache) >= self.max_entries:
+                self.expire()
+                if len(self.cache) >= self.max_entries:
+                    self.cache.pop(next(iter(self.cache)))
+            self.cache[key] = (now + self.ttl, result)
+        return result
+
+    def grab_many(self, targets):
+        """فحص متزامن لقائمة (ip, port) - يعيد النتائج بنفس الترتيب"""
+        targets = list(targets)
+        if not targets:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(targets))) as pool:
+            return list(pool.map(lambda target: self.grab(*target), targets))
+
+    def expire(self):
+        """حذف النتائج المنتهية"""
+        now = time.monotonic()
+        for key in [k for k, (expires, _) in self.cache.items() if expires <= now]:
+            del self.cache[key]
+
+    def invalidate(self, ip=None):
+        """مسح الذاكرة المؤقتة (لجهاز واحد أو للكل)"""
+        with self._lock:
+            if ip is None:
+                self.cache.clear()
+            else:
+                for key in [k for k in self.cache if k[0] == ip]:
+                    del self.cache[key]
+
+
+# Test the module
+if __name__ == "__main__":
+    import socketserver
+
+    class _Greeting(socketserver.BaseRequestHandler):
+        def handle(self):
+            time.sleep(0.2)
+            self.request.sendall(b"SSH-2.0-OpenSSH_8.2p1 Ubuntu-4ubuntu0.5\r\n")
+
+    class _Http(socketserver.BaseRequestHandler):
+        def handle(self):
+            self.request.recv(1024)
+            time.sleep(0.2)
+            self.request.sendall(b"HTTP/1.1 200 OK\r\nServer: Apache/2.4.49 (Unix)\r\n\r\n<html>")
+
+    servers = []
+    for handler in (_Greeting, _Http) * 10:
+        server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+    targets = [('127.0.0.1', server.server_address[1]) for server in servers]
+
+    grabber = BannerGrabber()
+    start = time.perf_counter()
+    results = grabber.grab_many(targets)
+    print(f"Probed {len(targets)} services in {time.perf_counter() - start:.2f}s (concurrent)")
+    for result in results[:2]:
+        print(f"  {result['port']}: {result['service']} - {result['banner'].splitlines()[0]}")
+
+    start = time.perf_counter()
+    grabber.grab_many(targets)
+    print(f"Cached rescan in {(time.perf_counter() - start) * 1000:.1f} ms ({grabber.stats})")
+
+    for server in servers:
+        server.shutdown()
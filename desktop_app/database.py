@@ -6,38 +6,182 @@ Database Manager Module
 - حفظ معلومات الأجهزة
 - تسجيل النشاطات (Logs)
 - حفظ التنبيهات الأمنية
-- تخزين إحصائيات الشبكة
+- تخزين إحصائيات الشبكة (مع تجميع للدقيقة/الساعة/اليوم وحذف الخام القديم)
+- اتصال قراءة لكل خيط وخيط كتابة واحد (WAL)
+- كتابة السجلات دفعات في الخلفية (Write-Behind)
+- فهرس للأجهزة في الذاكرة (MAC / IP) يُحدَّث مع كل كتابة
+- بحث نصي كامل (FTS5) في السجلات والتنبيهات
 """
 
-import sqlite3
+import atexit
 import json
-from datetime import datetime
+from datetime import datetime, timedelta
 import os
+import time
+
+from alert_pipeline import OpenAlertIndex, fingerprint, higher_severity
+from db_connection import ConnectionManager
+from device_index import DEVICE_COLUMNS, DeviceIndex
+from exporter import check_table
+from incidents import Incident, IncidentCorrelator
+from log_queue import LogQueue
+from search_index import SEARCH_SOURCES, fts_query, search_schema
+from stats_rollup import METRICS, StatsRollup, TIER_TABLES, rollup_schema, select_tier
+
+# get_statistics() counters and the query each one materializes
+STATS_COUNTS = {
+    'total_devices': 'SELECT COUNT(*) FROM devices',
+    'active_devices': "SELECT COUNT(*) FROM devices WHERE status = 'Active'",
+    'total_alerts': 'SELECT COUNT(*) FROM security_alerts',
+    'unresolved_alerts': 'SELECT COUNT(*) FROM security_alerts WHERE resolved = 0',
+    'total_scans': 'SELECT COUNT(*) FROM scan_history',
+}
+SELECT_DEVICES = 'SELECT {} FROM devices'.format(', '.join(DEVICE_COLUMNS))
+REBUILD_STATS = 'UPDATE stats_counters SET {} WHERE id = 1'.format(
+    ', '.join(f'{name} = ({query})' for name, query in STATS_COUNTS.items()))
+
+# Default retention of exported flows (setting flows_retention_hours, 0 = forever)
+FLOWS_RETENTION_HOURS = 7 * 24
+
+# Schema migrations: index + 1 = PRAGMA user_version after applying
+MIGRATIONS = [
+    # 1: alert deduplication (fingerprint, occurrence count, last seen)
+    [
+        'ALTER TABLE security_alerts ADD COLUMN fingerprint TEXT',
+        'ALTER TABLE security_alerts ADD COLUMN occurrences INTEGER DEFAULT 1',
+        'ALTER TABLE security_alerts ADD COLUMN last_seen TIMESTAMP',
+        'UPDATE security_alerts SET occurrences = 1, last_seen = timestamp',
+        'CREATE INDEX IF NOT EXISTS idx_security_alerts_fingerprint ON security_alerts (fingerprint, resolved)',
+    ],
+    # 2: one row per MAC address (bulk upsert target)
+    [
+        "UPDATE devices SET mac = NULL WHERE lower(trim(mac)) IN ('', 'unknown')",
+        # Duplicates of a MAC are folded into the most recently seen row
+        '''UPDATE devices SET
+               first_seen = (SELECT MIN(o.first_seen) FROM devices o
+                             WHERE lower(replace(o.mac, '-', ':')) = lower(replace(devices.mac, '-', ':'))),
+               is_trusted = (SELECT MAX(o.is_trusted) FROM devices o
+                             WHERE lower(replace(o.mac, '-', ':')) = lower(replace(devices.mac, '-', ':')))
+           WHERE mac IS NOT NULL''',
+        '''DELETE FROM devices WHERE mac IS NOT NULL AND id <> (
+               SELECT o.id FROM devices o
+               WHERE lower(replace(o.mac, '-', ':')) = lower(replace(devices.mac, '-', ':'))
+               ORDER BY o.last_seen DESC, o.id DESC LIMIT 1)''',
+        "UPDATE devices SET mac = lower(replace(mac, '-', ':')) WHERE mac IS NOT NULL",
+        'CREATE UNIQUE INDEX IF NOT EXISTS idx_devices_mac ON devices (mac)',
+        'CREATE INDEX IF NOT EXISTS idx_devices_ip ON devices (ip)',
+    ],
+    # 3: indexes for every DatabaseManager access path (checked by query_plans.py)
+    [
+        'CREATE INDEX IF NOT EXISTS idx_devices_last_seen ON devices (last_seen)',
+        'CREATE INDEX IF NOT EXISTS idx_activity_logs_timestamp ON activity_logs (timestamp)',
+        'CREATE INDEX IF NOT EXISTS idx_activity_logs_level_timestamp ON activity_logs (level, timestamp)',
+        'CREATE INDEX IF NOT EXISTS idx_security_alerts_timestamp ON security_alerts (timestamp)',
+        'CREATE INDEX IF NOT EXISTS idx_security_alerts_status_timestamp ON security_alerts (status, timestamp)',
+        'CREATE INDEX IF NOT EXISTS idx_security_alerts_resolved ON security_alerts (resolved, fingerprint)',
+        'CREATE INDEX IF NOT EXISTS idx_network_stats_timestamp ON network_stats (timestamp)',
+        'CREATE INDEX IF NOT EXISTS idx_scan_history_timestamp ON scan_history (timestamp)',
+        'CREATE INDEX IF NOT EXISTS idx_incidents_last_seen ON incidents (last_seen)',
+        'CREATE INDEX IF NOT EXISTS idx_incidents_status_last_seen ON incidents (status, last_seen)',
+    ],
+    # 4: get_statistics() counters kept current by triggers (one row, id = 1)
+    [
+        '''CREATE TABLE IF NOT EXISTS stats_counters (
+               id INTEGER PRIMARY KEY CHECK (id = 1),
+               total_devices INTEGER NOT NULL DEFAULT 0,
+               active_devices INTEGER NOT NULL DEFAULT 0,
+               total_alerts INTEGER NOT NULL DEFAULT 0,
+               unresolved_alerts INTEGER NOT NULL DEFAULT 0,
+               total_scans INTEGER NOT NULL DEFAULT 0
+           )''',
+        'INSERT OR IGNORE INTO stats_counters (id) VALUES (1)',
+        REBUILD_STATS,
+        # Stale devices are flipped to Inactive by expire_active_devices()
+        'CREATE INDEX IF NOT EXISTS idx_devices_status_last_seen ON devices (status, last_seen)',
+        '''CREATE TRIGGER IF NOT EXISTS trg_devices_insert AFTER INSERT ON devices BEGIN
+               UPDATE stats_counters SET total_devices = total_devices + 1,
+                   active_devices = active_devices + (NEW.status IS 'Active') WHERE id = 1;
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_devices_delete AFTER DELETE ON devices BEGIN
+               UPDATE stats_counters SET total_devices = total_devices - 1,
+                   active_devices = active_devices - (OLD.status IS 'Active') WHERE id = 1;
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_devices_status AFTER UPDATE OF status ON devices
+           WHEN (OLD.status IS 'Active') <> (NEW.status IS 'Active') BEGIN
+               UPDATE stats_counters SET
+                   active_devices = active_devices + (NEW.status IS 'Active') - (OLD.status IS 'Active')
+               WHERE id = 1;
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_alerts_insert AFTER INSERT ON security_alerts BEGIN
+               UPDATE stats_counters SET total_alerts = total_alerts + 1,
+                   unresolved_alerts = unresolved_alerts + (NEW.resolved IS 0) WHERE id = 1;
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_alerts_delete AFTER DELETE ON security_alerts BEGIN
+               UPDATE stats_counters SET total_alerts = total_alerts - 1,
+                   unresolved_alerts = unresolved_alerts - (OLD.resolved IS 0) WHERE id = 1;
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_alerts_resolved AFTER UPDATE OF resolved ON security_alerts
+           WHEN (OLD.resolved IS 0) <> (NEW.resolved IS 0) BEGIN
+               UPDATE stats_counters SET
+                   unresolved_alerts = unresolved_alerts + (NEW.resolved IS 0) - (OLD.resolved IS 0)
+               WHERE id = 1;
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_scans_insert AFTER INSERT ON scan_history BEGIN
+               UPDATE stats_counters SET total_scans = total_scans + 1 WHERE id = 1;
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_scans_delete AFTER DELETE ON scan_history BEGIN
+               UPDATE stats_counters SET total_scans = total_scans - 1 WHERE id = 1;
+           END''',
+    ],
+    # 5: full-text search over activity_logs and security_alerts (FTS5, kept in sync by triggers)
+    search_schema(),
+    # 6: flows retention (compact_network_stats) deletes by last_seen
+    [
+        'CREATE INDEX IF NOT EXISTS idx_flows_last_seen ON flows (last_seen)',
+    ],
+]
+
+
+def normalize_mac(mac):
+    """توحيد MAC (أحرف صغيرة و :) أو None إن كان مجهولاً"""
+    mac = str(mac or '').strip().lower().replace('-', ':')
+    return mac if mac and mac != 'unknown' else None
 
 
 class DatabaseManager:
     def __init__(self, db_path='network_guardian.db'):
         """تهيئة قاعدة البيانات"""
         self.db_path = db_path
-        self.conn = None
-        self.cursor = None
+        self.pool = None
+        self.log_queue = None
+        self.open_alerts = OpenAlertIndex()
+        self.correlator = IncidentCorrelator()
+        self.stats_rollup = StatsRollup()
+        self.devices = DeviceIndex()
+        self._devices_version = None
         self.connect()
         self.create_tables()
+        self.migrate()
+        self.load_open_alerts()
+        self.load_open_incidents()
+        self.load_devices()
     
     def connect(self):
         """الاتصال بقاعدة البيانات"""
         try:
-            self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
-            self.cursor = self.conn.cursor()
+            self.pool = ConnectionManager(self.db_path)
+            self.log_queue = LogQueue(self._write_logs)
+            # Queued log lines are written even if the window is closed without safe_exit
+            atexit.register(self.close)
             print(f"Database connected: {self.db_path}")
         except Exception as e:
             print(f"Database connection error: {e}")
     
     def create_tables(self):
         """إنشاء الجداول"""
-        try:
+        def _create(conn):
             # Devices table
-            self.cursor.execute('''
+            conn.execute('''
                 CREATE TABLE IF NOT EXISTS devices (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     ip TEXT NOT NULL,
@@ -55,7 +199,7 @@ class DatabaseManager:
             ''')
             
             # Activity Logs table
-            self.cursor.execute('''
+            conn.execute('''
                 CREATE TABLE IF NOT EXISTS activity_logs (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
@@ -67,7 +211,7 @@ class DatabaseManager:
             ''')
             
             # Security Alerts table
-            self.cursor.execute('''
+            conn.execute('''
                 CREATE TABLE IF NOT EXISTS security_alerts (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
@@ -84,7 +228,7 @@ class DatabaseManager:
             ''')
             
             # Network Stats table
-            self.cursor.execute('''
+            conn.execute('''
                 CREATE TABLE IF NOT EXISTS network_stats (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
@@ -98,8 +242,12 @@ class DatabaseManager:
                 )
             ''')
             
+            # Network stats rollups (1 minute / 1 hour / 1 day)
+            for statement in rollup_schema():
+                conn.execute(statement)
+            
             # Scan History table
-            self.cursor.execute('''
+            conn.execute('''
                 CREATE TABLE IF NOT EXISTS scan_history (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
@@ -112,8 +260,72 @@ class DatabaseManager:
                 )
             ''')
             
+            # Flows table (expired connection-tracking records)
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS flows (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    proto INTEGER,
+                    src_ip TEXT,
+                    src_port INTEGER,
+                    dst_ip TEXT,
+                    dst_port INTEGER,
+                    packets INTEGER,
+                    bytes INTEGER,
+                    first_seen REAL,
+                    last_seen REAL,
+                    tcp_flags INTEGER,
+                    end_reason TEXT
+                )
+            ''')
+            
+            # Incidents table (correlated alerts)
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS incidents (
+                    id INTEGER PRIMARY KEY,
+                    title TEXT,
+                    severity TEXT,
+                    status TEXT DEFAULT 'Open',
+                    first_seen TIMESTAMP,
+                    last_seen TIMESTAMP,
+                    alert_count INTEGER DEFAULT 0,
+                    entities TEXT,
+                    resolved_at TIMESTAMP
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS incident_alerts (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    incident_id INTEGER NOT NULL,
+                    alert_id INTEGER NOT NULL,
+                    UNIQUE(incident_id, alert_id)
+                )
+            ''')
+            conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_incident_alerts_alert
+                ON incident_alerts (alert_id)
+            ''')
+            
+            # Top talkers table (periodic heavy-hitter snapshots)
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS top_talkers (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    dimension TEXT,
+                    rank INTEGER,
+                    key TEXT,
+                    packets INTEGER,
+                    bytes INTEGER,
+                    share REAL,
+                    packet_rate REAL
+                )
+            ''')
+            conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_top_talkers_timestamp
+                ON top_talkers (timestamp)
+            ''')
+            
             # Settings table
-            self.cursor.execute('''
+            conn.execute('''
                 CREATE TABLE IF NOT EXISTS settings (
                     key TEXT PRIMARY KEY,
                     value TEXT,
@@ -121,82 +333,150 @@ class DatabaseManager:
                 )
             ''')
             
-            self.conn.commit()
+        try:
+            self.pool.write(_create)
             print("Database tables created successfully")
         
         except Exception as e:
             print(f"Error creating tables: {e}")
     
+    def migrate(self):
+        """تطبيق ترحيلات المخطط حسب PRAGMA user_version"""
+        try:
+            version = self.pool.reader().execute('PRAGMA user_version').fetchone()[0]
+            for number, statements in enumerate(MIGRATIONS[version:], version + 1):
+                # One transaction per migration
+                def _apply(conn, statements=statements, number=number):
+                    for statement in statements:
+                        conn.execute(statement)
+                    conn.execute(f'PRAGMA user_version = {number}')
+                self.pool.write(_apply)
+                print(f"Database migrated to version {number}")
+        except Exception as e:
+            print(f"Error migrating database: {e}")
+    
     def save_device(self, device):
         """حفظ معلومات جهاز"""
-        try:
-            # Check if device exists
-            self.cursor.execute('''
-                SELECT id FROM devices WHERE ip = ? OR mac = ?
-            ''', (device.get('ip'), device.get('mac')))
-            
-            existing = self.cursor.fetchone()
-            
-            if existing:
-                # Update existing device
-                self.cursor.execute('''
-                    UPDATE devices 
-                    SET hostname = ?, 
-                        vendor = ?, 
-                        status = ?, 
-                        last_seen = ?
-                    WHERE id = ?
-                ''', (
-                    device.get('hostname', 'Unknown'),
-                    device.get('vendor', 'Unknown'),
-                    device.get('status', 'Active'),
-                    datetime.now().isoformat(),
-                    existing[0]
-                ))
+        result = self.save_devices([device])
+        return bool(result['new'] or result['updated'])
+    
+    def save_devices(self, devices):
+        """
+        حفظ نتيجة فحص كاملة في معاملة واحدة (UPSERT حسب MAC)
+        يعيد {'new': [...], 'updated': [...]}
+        """
+        now = datetime.now().isoformat()
+        by_mac = {}
+        without_mac = []
+        for device in devices:
+            row = {
+                'ip': device.get('ip'),
+                'mac': normalize_mac(device.get('mac')),
+                'hostname': device.get('hostname', 'Unknown'),
+                'vendor': device.get('vendor', 'Unknown'),
+                'status': device.get('status', 'Active'),
+                'now': now,
+                'device': device
+            }
+            if row['mac']:
+                by_mac[row['mac']] = row     # the last sighting in a scan wins
             else:
-                # Insert new device
-                self.cursor.execute('''
+                without_mac.append(row)
+        
+        def _save(conn):
+            self._sync_devices(conn)
+            new, updated, ids = [], [], []
+            if by_mac:
+                known = {mac for mac in by_mac if self.devices.contains(mac=mac)}
+                conn.executemany('''
                     INSERT INTO devices (ip, mac, hostname, vendor, status, first_seen, last_seen)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    device.get('ip'),
-                    device.get('mac'),
-                    device.get('hostname', 'Unknown'),
-                    device.get('vendor', 'Unknown'),
-                    device.get('status', 'Active'),
-                    datetime.now().isoformat(),
-                    datetime.now().isoformat()
-                ))
-            
-            self.conn.commit()
-            return True
+                    VALUES (:ip, :mac, :hostname, :vendor, :status, :now, :now)
+                    ON CONFLICT(mac) DO UPDATE SET
+                        ip = excluded.ip,
+                        hostname = excluded.hostname,
+                        vendor = excluded.vendor,
+                        status = excluded.status,
+                        last_seen = excluded.last_seen
+                ''', list(by_mac.values()))
+                for mac, row in by_mac.items():
+                    (updated if mac in known else new).append(row['device'])
+                ids += [r[0] for r in conn.execute('''
+                    SELECT id FROM devices WHERE mac IN (SELECT value FROM json_each(?))
+                ''', (json.dumps(list(by_mac)),))]
+            
+            # No MAC (e.g. behind a router): matched by IP, the most recently seen row
+            for row in without_mac:
+                known = self.devices.find(ip=row['ip'])
+                if known:
+                    conn.execute('''
+                        UPDATE devices
+                        SET hostname = :hostname, vendor = :vendor, status = :status, last_seen = :now
+                        WHERE id = :id
+                    ''', dict(row, id=known['id']))
+                    ids.append(known['id'])
+                    updated.append(row['device'])
+                    continue
+                cursor = conn.execute('''
+                    INSERT INTO devices (ip, mac, hostname, vendor, status, first_seen, last_seen)
+                    VALUES (:ip, NULL, :hostname, :vendor, :status, :now, :now)
+                ''', row)
+                ids.append(cursor.lastrowid)
+                new.append(row['device'])
+            
+            # Write-through: the index gets the rows exactly as stored
+            self.devices.upsert(conn.execute(SELECT_DEVICES + '''
+                WHERE id IN (SELECT value FROM json_each(?))
+            ''', (json.dumps(ids),)).fetchall())
+            return {'new': new, 'updated': updated}
+            
+        try:
+            return self.pool.write(_save)
         
         except Exception as e:
-            print(f"Error saving device: {e}")
-            return False
+            print(f"Error saving devices: {e}")
+            # The transaction may have failed after the index was updated
+            self.load_devices()
+            return {'new': [], 'updated': []}
+    
+    def load_devices(self):
+        """تحميل فهرس الأجهزة في الذاكرة (عند البدء وبعد أي خطأ في الكتابة)"""
+        try:
+            self.pool.write(self._load_devices)
+        except Exception as e:
+            print(f"Error loading devices: {e}")
+    
+    def _load_devices(self, conn):
+        # data_version on the writer connection only moves when another
+        # connection (the Django backend, another process) commits
+        self._devices_version = conn.execute('PRAGMA data_version').fetchone()[0]
+        self.devices.load(conn.execute(SELECT_DEVICES).fetchall())
+    
+    def _sync_devices(self, conn):
+        """إعادة تحميل الفهرس إذا كتب اتصال آخر في قاعدة البيانات (في خيط الكتابة)"""
+        if conn.execute('PRAGMA data_version').fetchone()[0] != self._devices_version:
+            self._load_devices(conn)
+    
+    def get_device_index_stats(self):
+        """إحصائيات فهرس الأجهزة: الحجم، نسبة الإصابة، الذاكرة"""
+        return self.devices.info()
     
     def get_all_devices(self):
-        """الحصول على جميع الأجهزة"""
+        """
+        الحصول على جميع الأجهزة (من الفهرس في الذاكرة، بدون SQL)
+        تغييرات الـ Backend تصل عند الكتابة التالية أو الصيانة الدورية (expire_active_devices)
+        """
         try:
-            self.cursor.execute('''
-                SELECT ip, mac, hostname, vendor, status, first_seen, last_seen, is_trusted
-                FROM devices
-                ORDER BY last_seen DESC
-            ''')
-            
-            rows = self.cursor.fetchall()
-            
             devices = []
-            for row in rows:
+            for device in self.devices.all():
                 devices.append({
-                    'ip': row[0],
-                    'mac': row[1],
-                    'hostname': row[2],
-                    'vendor': row[3],
-                    'status': row[4],
-                    'first_seen': row[5],
-                    'last_seen': row[6],
-                    'is_trusted': row[7]
+                    'ip': device['ip'],
+                    'mac': device['mac'],
+                    'hostname': device['hostname'],
+                    'vendor': device['vendor'],
+                    'status': device['status'],
+                    'first_seen': device['first_seen'],
+                    'last_seen': device['last_seen'],
+                    'is_trusted': device['is_trusted']
                 })
             
             return devices
@@ -206,56 +486,25 @@ class DatabaseManager:
             return []
     
     def get_device(self, ip):
-        """الحصول على معلومات جهاز معين"""
-        try:
-            self.cursor.execute('''
-                SELECT * FROM devices WHERE ip = ?
-            ''', (ip,))
-            
-            row = self.cursor.fetchone()
-            
-            if row:
-                return {
-                    'id': row[0],
-                    'ip': row[1],
-                    'mac': row[2],
-                    'hostname': row[3],
-                    'vendor': row[4],
-                    'status': row[5],
-                    'first_seen': row[6],
-                    'last_seen': row[7],
-                    'device_type': row[8],
-                    'notes': row[9],
-                    'is_trusted': row[10]
-                }
-            
-            return None
-        
-        except Exception as e:
-            print(f"Error getting device: {e}")
-            return None
+        """الحصول على معلومات جهاز معين (بدون SQL)"""
+        return self.devices.find(ip=ip)
     
     def is_new_device(self, device):
-        """التحقق من كون الجهاز جديد"""
-        try:
-            self.cursor.execute('''
-                SELECT id FROM devices WHERE ip = ? OR mac = ?
-            ''', (device.get('ip'), device.get('mac')))
-            
-            return self.cursor.fetchone() is None
-        
-        except Exception as e:
-            print(f"Error checking new device: {e}")
-            return False
+        """التحقق من كون الجهاز جديد (بدون SQL)"""
+        mac = normalize_mac(device.get('mac'))
+        return not self.devices.contains(mac=mac, ip=device.get('ip'))
     
     def mark_device_trusted(self, ip, trusted=True):
         """تمييز جهاز كموثوق"""
+        def _mark(conn):
+            self._sync_devices(conn)
+            ids = [r[0] for r in conn.execute('''
+                UPDATE devices SET is_trusted = ? WHERE ip = ? RETURNING id
+            ''', (1 if trusted else 0, ip)).fetchall()]
+            self.devices.update(ids, is_trusted=1 if trusted else 0)
+        
         try:
-            self.cursor.execute('''
-                UPDATE devices SET is_trusted = ? WHERE ip = ?
-            ''', (1 if trusted else 0, ip))
-            
-            self.conn.commit()
+            self.pool.write(_mark)
             return True
         
         except Exception as e:
@@ -263,25 +512,30 @@ class DatabaseManager:
             return False
     
     def log_activity(self, level, message, source=None, details=None):
-        """تسجيل نشاط في السجل"""
+        """تسجيل نشاط في السجل (يُكتب في الخلفية ضمن دفعة)"""
         try:
-            self.cursor.execute('''
-                INSERT INTO activity_logs (level, message, source, details)
-                VALUES (?, ?, ?, ?)
-            ''', (level, message, source, details))
-            
-            self.conn.commit()
-            return True
+            # Stamped now (UTC, like CURRENT_TIMESTAMP), not when the batch is written
+            timestamp = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())
+            return self.log_queue.put((timestamp, level, message, source, details))
         
         except Exception as e:
             print(f"Error logging activity: {e}")
             return False
     
+    def _write_logs(self, records):
+        """كتابة دفعة سجلات في معاملة واحدة"""
+        self.pool.executemany('''
+            INSERT INTO activity_logs (timestamp, level, message, source, details)
+            VALUES (?, ?, ?, ?, ?)
+        ''', records)
+    
     def get_logs(self, level=None, limit=100):
         """الحصول على السجلات"""
         try:
+            self.log_queue.flush()
+            conn = self.pool.reader()
             if level:
-                self.cursor.execute('''
+                cursor = conn.execute('''
                     SELECT timestamp, level, message, source, details
                     FROM activity_logs
                     WHERE level = ?
@@ -289,14 +543,14 @@ class DatabaseManager:
                     LIMIT ?
                 ''', (level, limit))
             else:
-                self.cursor.execute('''
+                cursor = conn.execute('''
                     SELECT timestamp, level, message, source, details
                     FROM activity_logs
                     ORDER BY timestamp DESC
                     LIMIT ?
                 ''', (limit,))
             
-            rows = self.cursor.fetchall()
+            rows = cursor.fetchall()
             
             logs = []
             for row in rows:
@@ -314,11 +568,104 @@ class DatabaseManager:
             print(f"Error getting logs: {e}")
             return []
     
+    def search(self, text, source=None, level=None, order='rank', limit=50, offset=0,
+               markers=('[', ']')):
+        """
+        بحث نصي كامل في السجلات (logs) والتنبيهات (alerts) أو كليهما (source=None)
+        order: 'rank' الأكثر صلة (كل النتائج مرتبة)، أو 'recent' الأحدث أولاً
+        درجات bm25 لا تُقارن بين مصدرين: مع المصدرين تتناوب النتائج حسب ترتيبها في كل مصدر
+        level يقيّد النتائج بمستوى السجل (أو خطورة التنبيه)؛ markers تحيط الكلمات المطابقة في snippet
+        يعيد {'results': [...], 'has_more': bool}
+        """
+        try:
+            query = fts_query(text)
+            if not query:
+                return {'results': [], 'has_more': False}
+            self.log_queue.flush()
+            conn = self.pool.reader()
+            
+            if source:
+                # One source pages in SQL
+                results = self._search_source(conn, source, query, level, order, limit + 1, offset, markers)
+                return {'results': results[:limit], 'has_more': len(results) > limit}
+            
+            # Each source returns enough rows to fill the page after merging
+            wanted = offset + limit + 1
+            results = []
+            for name in SEARCH_SOURCES:
+                found = self._search_source(conn, name, query, level, order, wanted, 0, markers)
+                for position, result in enumerate(found):
+                    # bm25 relative to the source's best match (0..1], only used to order ties
+                    result['score'] = result['rank'] / found[0]['rank'] if found[0]['rank'] else 0.0
+                    result['position'] = position
+                results += found
+            
+            if order == 'recent':
+                results.sort(key=lambda r: r['timestamp'] or '', reverse=True)
+            else:
+                results.sort(key=lambda r: (r['position'], -r['score']))
+            for result in results:
+                del result['score'], result['position']
+            
+            return {'results': results[offset:offset + limit], 'has_more': len(results) > offset + limit}
+        
+        except Exception as e:
+            print(f"Error searching: {e}")
+            return {'results': [], 'has_more': False}
+    
+    def _search_source(self, conn, name, query, level, order, limit, offset, markers):
+        """صفحة من نتائج مصدر بحث واحد مرتبة"""
+        table, fts, _, _ = SEARCH_SOURCES[name]
+        if name == 'logs':
+            columns, level_column = 't.level, t.source, t.message', 't.level'
+        else:
+            columns, level_column = 't.severity, t.alert_type, t.description', 't.severity'
+        
+        where = f'{fts} MATCH :query'
+        if level:
+            where += f' AND {level_column} = :level'
+        order_by = f'{fts}.rowid DESC' if order == 'recent' else 'rank'
+        
+        cursor = conn.execute(f'''
+            SELECT t.id, t.timestamp, {columns},
+                   snippet({fts}, -1, :open, :close, '…', 16), rank
+            FROM {fts}
+            JOIN {table} t ON t.id = {fts}.rowid
+            WHERE {where}
+            ORDER BY {order_by}
+            LIMIT :limit OFFSET :offset
+        ''', {'query': query, 'level': level, 'limit': limit, 'offset': offset,
+              'open': markers[0], 'close': markers[1]})
+        
+        return [{
+            'kind': name,
+            'id': row[0],
+            'timestamp': row[1],
+            'level': row[2],
+            'source': row[3],
+            'message': row[4],
+            'snippet': row[5],
+            'rank': row[6]
+        } for row in cursor.fetchall()]
+    
+    def rebuild_search_index(self):
+        """إعادة بناء فهارس البحث من الجداول (للاستعادة بعد خلل)"""
+        try:
+            def _rebuild(conn):
+                for _, fts, _, _ in SEARCH_SOURCES.values():
+                    conn.execute(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")
+            self.pool.write(_rebuild)
+            return True
+        
+        except Exception as e:
+            print(f"Error rebuilding search index: {e}")
+            return False
+    
     def clear_logs(self):
         """مسح جميع السجلات"""
         try:
-            self.cursor.execute('DELETE FROM activity_logs')
-            self.conn.commit()
+            self.log_queue.discard()
+            self.pool.execute('DELETE FROM activity_logs')
             return True
         
         except Exception as e:
@@ -327,54 +674,226 @@ class DatabaseManager:
 
     def clear_devices(self):
         """مسح جميع الأجهزة من قاعدة البيانات"""
+        def _clear(conn):
+            conn.execute('DELETE FROM devices')
+            self.devices.clear()
+        
         try:
-            self.cursor.execute('DELETE FROM devices')
-            self.conn.commit()
+            self.pool.write(_clear)
             return True
         except Exception as e:
             print(f"Error clearing devices: {e}")
             return False
     
-    def save_security_alert(self, alert):
-        """حفظ تنبيه أمني"""
+    def load_open_alerts(self):
+        """تحميل فهرس التنبيهات المفتوحة (بصمة -> رقم)"""
         try:
-            self.cursor.execute('''
-                INSERT INTO security_alerts 
-                (alert_type, severity, description, source_ip, target_ip)
-                VALUES (?, ?, ?, ?, ?)
+            conn = self.pool.reader()
+            cursor = conn.execute('''
+                SELECT id, fingerprint, severity FROM security_alerts
+                WHERE resolved = 0 AND fingerprint IS NOT NULL
+            ''')
+            self.open_alerts.load(cursor.fetchall())
+        except Exception as e:
+            print(f"Error loading open alerts: {e}")
+    
+    def save_security_alert(self, alert):
+        """
+        حفظ تنبيه أمني
+        التنبيه المكرر (نفس البصمة وما زال مفتوحاً) يزيد عدد المرات بدل صف جديد
+        """
+        fp = fingerprint(alert)
+        
+        # Runs on the writer thread: the index and the correlator only change there
+        def _save(conn):
+            now = datetime.now().isoformat()
+            
+            existing = self.open_alerts.get(fp)
+            if existing:
+                alert_id, severity = existing
+                severity = higher_severity(severity, alert.get('severity'))
+                cursor = conn.execute('''
+                    UPDATE security_alerts
+                    SET occurrences = occurrences + 1,
+                        last_seen = ?,
+                        severity = ?,
+                        description = ?
+                    WHERE id = ? AND resolved = 0
+                ''', (now, severity, alert.get('description'), alert_id))
+                
+                if cursor.rowcount:
+                    self.open_alerts.add(fp, alert_id, severity)
+                    self.open_alerts.stats['merged'] += 1
+                    self.correlate_alert(conn, alert_id, alert)
+                    return
+                # Resolved elsewhere (e.g. from the web dashboard): open a new one
+                self.open_alerts.discard(fp)
+            
+            cursor = conn.execute('''
+                INSERT INTO security_alerts
+                (alert_type, severity, description, source_ip, target_ip,
+                 fingerprint, occurrences, last_seen)
+                VALUES (?, ?, ?, ?, ?, ?, 1, ?)
             ''', (
                 alert.get('type'),
                 alert.get('severity'),
                 alert.get('description'),
                 alert.get('source_ip'),
-                alert.get('target_ip')
+                alert.get('target_ip'),
+                fp,
+                now
             ))
             
-            self.conn.commit()
+            alert_id = cursor.lastrowid
+            self.open_alerts.add(fp, alert_id, alert.get('severity'))
+            self.open_alerts.stats['new'] += 1
+            self.correlate_alert(conn, alert_id, alert)
+        
+        try:
+            self.pool.write(_save)
             return True
         
         except Exception as e:
             print(f"Error saving alert: {e}")
             return False
     
+    def correlate_alert(self, conn, alert_id, alert):
+        """ربط التنبيه بحادثة وحفظها (ضمن معاملة الكتابة الحالية)"""
+        incident, merged = self.correlator.correlate(alert_id, alert)
+        
+        for merged_id in merged:
+            conn.execute('''
+                UPDATE OR IGNORE incident_alerts SET incident_id = ? WHERE incident_id = ?
+            ''', (incident.id, merged_id))
+            conn.execute('DELETE FROM incident_alerts WHERE incident_id = ?', (merged_id,))
+            conn.execute('DELETE FROM incidents WHERE id = ?', (merged_id,))
+        
+        conn.execute('''
+            INSERT INTO incidents (id, title, severity, status, first_seen, last_seen, alert_count, entities)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(id) DO UPDATE SET
+                title = excluded.title,
+                severity = excluded.severity,
+                last_seen = excluded.last_seen,
+                first_seen = excluded.first_seen,
+                alert_count = excluded.alert_count,
+                entities = excluded.entities
+        ''', (
+            incident.id,
+            incident.title,
+            incident.severity,
+            incident.status,
+            datetime.fromtimestamp(incident.first_seen).isoformat(),
+            datetime.fromtimestamp(incident.last_seen).isoformat(),
+            len(incident.alert_ids),
+            ','.join(sorted(incident.entities))
+        ))
+        conn.execute('''
+            INSERT OR IGNORE INTO incident_alerts (incident_id, alert_id) VALUES (?, ?)
+        ''', (incident.id, alert_id))
+        return incident
+    
+    def load_open_incidents(self):
+        """إعادة الحوادث المفتوحة ضمن النافذة الزمنية إلى المُجمِّع"""
+        try:
+            conn = self.pool.reader()
+            cursor = conn.execute('SELECT COALESCE(MAX(id), 0) FROM incidents')
+            self.correlator.next_id = cursor.fetchone()[0] + 1
+            
+            since = datetime.fromtimestamp(time.time() - self.correlator.window).isoformat()
+            cursor = conn.execute('''
+                SELECT id, title, severity, first_seen, last_seen, entities
+                FROM incidents
+                WHERE status = 'Open' AND last_seen >= ?
+            ''', (since,))
+            for incident_id, title, severity, first_seen, last_seen, entities in cursor.fetchall():
+                incident = Incident(incident_id, datetime.fromisoformat(first_seen).timestamp(), severity)
+                incident.title = title
+                incident.last_seen = datetime.fromisoformat(last_seen).timestamp()
+                incident.entities = set(filter(None, (entities or '').split(',')))
+                cursor = conn.execute('''
+                    SELECT ia.alert_id, a.alert_type
+                    FROM incident_alerts ia LEFT JOIN security_alerts a ON a.id = ia.alert_id
+                    WHERE ia.incident_id = ?
+                ''', (incident_id,))
+                for alert_id, alert_type in cursor.fetchall():
+                    incident.alert_ids.add(alert_id)
+                    alert_type = alert_type or 'Alert'
+                    incident.alert_types[alert_type] = incident.alert_types.get(alert_type, 0) + 1
+                self.correlator.restore(incident)
+        except Exception as e:
+            print(f"Error loading incidents: {e}")
+    
+    def get_incidents(self, status='Open', limit=50):
+        """الحصول على الحوادث مع أرقام تنبيهاتها"""
+        try:
+            conn = self.pool.reader()
+            query = '''
+                SELECT id, title, severity, status, first_seen, last_seen, alert_count, entities
+                FROM incidents
+            '''
+            params = ()
+            if status:
+                query += ' WHERE status = ?'
+                params = (status,)
+            query += ' ORDER BY last_seen DESC LIMIT ?'
+            cursor = conn.execute(query, params + (limit,))
+            rows = cursor.fetchall()
+            
+            incidents = []
+            for row in rows:
+                cursor = conn.execute('SELECT alert_id FROM incident_alerts WHERE incident_id = ?', (row[0],))
+                incidents.append({
+                    'id': row[0],
+                    'title': row[1],
+                    'severity': row[2],
+                    'status': row[3],
+                    'first_seen': row[4],
+                    'last_seen': row[5],
+                    'alert_count': row[6],
+                    'entities': row[7].split(',') if row[7] else [],
+                    'alert_ids': [r[0] for r in cursor.fetchall()]
+                })
+            return incidents
+        
+        except Exception as e:
+            print(f"Error getting incidents: {e}")
+            return []
+    
+    def resolve_incident(self, incident_id):
+        """إغلاق حادثة"""
+        def _resolve(conn):
+            conn.execute('''
+                UPDATE incidents SET status = 'Resolved', resolved_at = ? WHERE id = ?
+            ''', (datetime.now().isoformat(), incident_id))
+            self.correlator.close(incident_id)
+        
+        try:
+            self.pool.write(_resolve)
+            return True
+        except Exception as e:
+            print(f"Error resolving incident: {e}")
+            return False
+    
     def get_security_alerts(self, status='New', limit=50):
         """الحصول على التنبيهات الأمنية"""
         try:
+            conn = self.pool.reader()
             if status:
-                self.cursor.execute('''
+                cursor = conn.execute('''
                     SELECT * FROM security_alerts
                     WHERE status = ?
                     ORDER BY timestamp DESC
                     LIMIT ?
                 ''', (status, limit))
             else:
-                self.cursor.execute('''
+                cursor = conn.execute('''
                     SELECT * FROM security_alerts
                     ORDER BY timestamp DESC
                     LIMIT ?
                 ''', (limit,))
             
-            rows = self.cursor.fetchall()
+            rows = cursor.fetchall()
             
             alerts = []
             for row in rows:
@@ -389,7 +908,9 @@ class DatabaseManager:
                     'status': row[7],
                     'resolved': row[8],
                     'resolved_at': row[9],
-                    'notes': row[10]
+                    'notes': row[10],
+                    'occurrences': row[12],
+                    'last_seen': row[13]
                 })
             
             return alerts
@@ -400,8 +921,9 @@ class DatabaseManager:
     
     def resolve_alert(self, alert_id, notes=None):
         """حل تنبيه أمني"""
-        try:
-            self.cursor.execute('''
+        # Same writer-thread callback as save_security_alert, so a repeat can't merge in between
+        def _resolve(conn):
+            conn.execute('''
                 UPDATE security_alerts
                 SET status = 'Resolved',
                     resolved = 1,
@@ -409,8 +931,10 @@ class DatabaseManager:
                     notes = ?
                 WHERE id = ?
             ''', (datetime.now().isoformat(), notes, alert_id))
-            
-            self.conn.commit()
+            self.open_alerts.discard(alert_id=alert_id)
+        
+        try:
+            self.pool.write(_resolve)
             return True
         
         except Exception as e:
@@ -420,12 +944,11 @@ class DatabaseManager:
     def mark_alert_synced(self, alert_id):
         """تحديث حالة التنبيه إلى Synced"""
         try:
-            self.cursor.execute('''
+            self.pool.execute('''
                 UPDATE security_alerts
                 SET status = 'Synced'
                 WHERE id = ?
             ''', (alert_id,))
-            self.conn.commit()
             return True
         except Exception as e:
             print(f"Error marking alert as synced: {e}")
@@ -434,7 +957,7 @@ class DatabaseManager:
     def save_network_stats(self, stats):
         """حفظ إحصائيات الشبكة"""
         try:
-            self.cursor.execute('''
+            self.pool.execute('''
                 INSERT INTO network_stats
                 (total_devices, active_devices, download_speed, upload_speed, 
                  bandwidth_usage, packet_loss, latency)
@@ -448,38 +971,47 @@ class DatabaseManager:
                 stats.get('packet_loss', 0),
                 stats.get('latency', 0)
             ))
-            
-            self.conn.commit()
             return True
         
         except Exception as e:
             print(f"Error saving stats: {e}")
             return False
     
-    def get_network_stats(self, hours=24):
-        """الحصول على إحصائيات الشبكة"""
+    def get_network_stats(self, hours=24, tier=None):
+        """
+        الحصول على إحصائيات الشبكة (الأحدث أولاً)
+        يُختار المستوى (خام/دقيقة/ساعة/يوم) حسب المدى؛ قيم المستويات المجمّعة متوسطات
+        مع أعمدة <metric>_min/_max/_p95 و samples
+        """
         try:
-            self.cursor.execute('''
-                SELECT * FROM network_stats
-                WHERE timestamp > datetime('now', '-{} hours')
-                ORDER BY timestamp DESC
-            '''.format(hours))
+            tier = tier or select_tier(hours, self.stats_rollup.retention)
+            since = f'-{int(hours * 3600)} seconds'
+            conn = self.pool.reader()
+            if tier == 'raw':
+                cursor = conn.execute('''
+                    SELECT * FROM network_stats
+                    WHERE timestamp > datetime('now', ?)
+                    ORDER BY timestamp DESC
+                ''', (since,))
+            else:
+                cursor = conn.execute('''
+                    SELECT * FROM {}
+                    WHERE bucket > datetime('now', ?)
+                    ORDER BY bucket DESC
+                '''.format(TIER_TABLES[tier]), (since,))
             
-            rows = self.cursor.fetchall()
+            columns = [description[0] for description in cursor.description]
+            rows = cursor.fetchall()
             
             stats = []
             for row in rows:
-                stats.append({
-                    'id': row[0],
-                    'timestamp': row[1],
-                    'total_devices': row[2],
-                    'active_devices': row[3],
-                    'download_speed': row[4],
-                    'upload_speed': row[5],
-                    'bandwidth_usage': row[6],
-                    'packet_loss': row[7],
-                    'latency': row[8]
-                })
+                stat = dict(zip(columns, row))
+                if tier != 'raw':
+                    stat['timestamp'] = stat.pop('bucket')
+                    for metric in METRICS:
+                        stat[metric] = stat[f'{metric}_avg']
+                stat['tier'] = tier
+                stats.append(stat)
             
             return stats
         
@@ -487,10 +1019,148 @@ class DatabaseManager:
             print(f"Error getting stats: {e}")
             return []
     
+    def compact_network_stats(self):
+        """
+        تجميع إحصائيات الشبكة المكتملة في جداول الدقيقة/الساعة/اليوم وحذف ما تجاوز مدة الاحتفاظ
+        مدة الاحتفاظ بالساعات من الإعدادات: stats_retention_<raw|1m|1h|1d>_hours (0 = للأبد)
+        والتدفقات المنتهية: flows_retention_hours (الافتراضي FLOWS_RETENTION_HOURS)
+        """
+        try:
+            for name in TIER_TABLES:
+                value = self.get_setting(f'stats_retention_{name}_hours')
+                if value is not None:
+                    self.stats_rollup.retention[name] = float(value) or None
+            
+            # One window per transaction so a long backlog does not hold up other writes
+            total = {'buckets': 0, 'expired': 0, 'flows_expired': 0}
+            while True:
+                result = self.pool.write(self.stats_rollup.compact)
+                total['buckets'] += result['buckets']
+                total['expired'] += result['expired']
+                if not result['pending']:
+                    break
+            
+            hours = float(self.get_setting('flows_retention_hours', FLOWS_RETENTION_HOURS))
+            if hours:
+                # flows.last_seen is a Unix timestamp (packet time)
+                total['flows_expired'] = self.pool.execute('DELETE FROM flows WHERE last_seen < ?',
+                                                           (time.time() - hours * 3600,))[0]
+            return total
+        
+        except Exception as e:
+            print(f"Error compacting stats: {e}")
+            return None
+    
+    def _network_stats_series_query(self, columns, hours):
+        allowed = {'total_devices', 'active_devices', 'download_speed', 'upload_speed',
+                   'bandwidth_usage', 'packet_loss', 'latency'}
+        columns = [col for col in columns if col in allowed]
+        if not columns:
+            return None, ()
+        
+        query = '''
+            SELECT CAST(strftime('%H', timestamp, 'localtime') AS INTEGER), {}
+            FROM network_stats
+        '''.format(', '.join(columns))
+        params = ()
+        if hours:
+            query += " WHERE timestamp > datetime('now', ?)"
+            params = (f'-{int(hours)} hours',)
+        query += ' ORDER BY timestamp ASC'
+        return query, params
+    
+    def get_network_stats_series(self, columns, hours=None):
+        """الحصول على أعمدة إحصائيات الشبكة مع ساعة اليوم (للتحليل)"""
+        try:
+            query, params = self._network_stats_series_query(columns, hours)
+            if query is None:
+                return []
+            return self.pool.reader().execute(query, params).fetchall()
+
+        except Exception as e:
+            print(f"Error getting stats series: {e}")
+            return []
+    
+    def iter_network_stats_series(self, columns, hours=None, chunk_size=5000):
+        """
+        مثل get_network_stats_series لكن دفعات بذاكرة ثابتة (لتدريب خطوط الأساس من سجل طويل)
+        مولّد يُستهلك في نفس الخيط
+        """
+        query, params = self._network_stats_series_query(columns, hours)
+        if query is None:
+            return
+        cursor = self.pool.reader().execute(query, params)
+        try:
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    return
+                yield rows
+        finally:
+            cursor.close()
+    
+    def save_flows(self, flows):
+        """حفظ دفعة من التدفقات المنتهية"""
+        try:
+            self.pool.executemany('''
+                INSERT INTO flows
+                (proto, src_ip, src_port, dst_ip, dst_port, packets, bytes,
+                 first_seen, last_seen, tcp_flags, end_reason)
+                VALUES (:proto, :src_ip, :src_port, :dst_ip, :dst_port, :packets, :bytes,
+                        :first_seen, :last_seen, :tcp_flags, :end_reason)
+            ''', flows)
+            return True
+        
+        except Exception as e:
+            print(f"Error saving flows: {e}")
+            return False
+    
+    def save_top_talkers(self, rows, retention_hours=24):
+        """حفظ لقطة أكثر المستخدمين استهلاكاً وحذف اللقطات القديمة"""
+        def _save(conn):
+            # One timestamp for the whole snapshot so it can be read back as a unit
+            cursor = conn.execute("SELECT CURRENT_TIMESTAMP")
+            timestamp = cursor.fetchone()[0]
+            
+            conn.executemany('''
+                INSERT INTO top_talkers
+                (timestamp, dimension, rank, key, packets, bytes, share, packet_rate)
+                VALUES (:timestamp, :dimension, :rank, :key, :packets, :bytes, :share, :packet_rate)
+            ''', [dict(row, timestamp=timestamp) for row in rows])
+            
+            conn.execute('''
+                DELETE FROM top_talkers WHERE timestamp < datetime('now', ?)
+            ''', (f'-{retention_hours} hours',))
+            
+        try:
+            self.pool.write(_save)
+            return True
+        
+        except Exception as e:
+            print(f"Error saving top talkers: {e}")
+            return False
+    
+    def get_top_talkers(self):
+        """الحصول على آخر لقطة لأكثر المستخدمين استهلاكاً"""
+        try:
+            conn = self.pool.reader()
+            cursor = conn.execute('''
+                SELECT * FROM top_talkers
+                WHERE timestamp = (SELECT MAX(timestamp) FROM top_talkers)
+                ORDER BY dimension, rank
+            ''')
+            
+            columns = [description[0] for description in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+        
+        except Exception as e:
+            print(f"Error getting top talkers: {e}")
+            return []
+    
     def save_scan_history(self, scan):
         """حفظ سجل الفحص"""
         try:
-            self.cursor.execute('''
+            self.pool.execute('''
                 INSERT INTO scan_history
                 (scan_type, duration, devices_found, alerts_generated, status, results)
                 VALUES (?, ?, ?, ?, ?, ?)
@@ -502,8 +1172,6 @@ class DatabaseManager:
                 scan.get('status'),
                 json.dumps(scan.get('results', {}))
             ))
-            
-            self.conn.commit()
             return True
         
         except Exception as e:
@@ -513,13 +1181,14 @@ class DatabaseManager:
     def get_scan_history(self, limit=20):
         """الحصول على سجل الفحوصات"""
         try:
-            self.cursor.execute('''
+            conn = self.pool.reader()
+            cursor = conn.execute('''
                 SELECT * FROM scan_history
                 ORDER BY timestamp DESC
                 LIMIT ?
             ''', (limit,))
             
-            rows = self.cursor.fetchall()
+            rows = cursor.fetchall()
             
             history = []
             for row in rows:
@@ -543,12 +1212,10 @@ class DatabaseManager:
     def save_setting(self, key, value):
         """حفظ إعداد"""
         try:
-            self.cursor.execute('''
+            self.pool.execute('''
                 INSERT OR REPLACE INTO settings (key, value, updated_at)
                 VALUES (?, ?, ?)
             ''', (key, value, datetime.now().isoformat()))
-            
-            self.conn.commit()
             return True
         
         except Exception as e:
@@ -558,11 +1225,12 @@ class DatabaseManager:
     def get_setting(self, key, default=None):
         """الحصول على إعداد"""
         try:
-            self.cursor.execute('''
+            conn = self.pool.reader()
+            cursor = conn.execute('''
                 SELECT value FROM settings WHERE key = ?
             ''', (key,))
             
-            row = self.cursor.fetchone()
+            row = cursor.fetchone()
             
             if row:
                 return row[0]
@@ -574,54 +1242,116 @@ class DatabaseManager:
             return default
     
     def get_statistics(self):
-        """الحصول على إحصائيات عامة"""
+        """الحصول على إحصائيات عامة (صف العدادات الذي تحدّثه الـ Triggers)"""
         try:
-            stats = {}
+            conn = self.pool.reader()
+            cursor = conn.execute('''
+                SELECT {} FROM stats_counters WHERE id = 1
+            '''.format(', '.join(STATS_COUNTS)))
             
-            # Total devices
-            self.cursor.execute('SELECT COUNT(*) FROM devices')
-            stats['total_devices'] = self.cursor.fetchone()[0]
+            row = cursor.fetchone()
+            if row is None:
+                return {}
             
-            # Active devices (seen in last hour)
-            self.cursor.execute('''
-                SELECT COUNT(*) FROM devices 
-                WHERE last_seen > datetime('now', '-1 hour')
-            ''')
-            stats['active_devices'] = self.cursor.fetchone()[0]
-            
-            # Total alerts
-            self.cursor.execute('SELECT COUNT(*) FROM security_alerts')
-            stats['total_alerts'] = self.cursor.fetchone()[0]
-            
-            # Unresolved alerts
-            self.cursor.execute('''
-                SELECT COUNT(*) FROM security_alerts WHERE resolved = 0
-            ''')
-            stats['unresolved_alerts'] = self.cursor.fetchone()[0]
-            
-            # Total scans
-            self.cursor.execute('SELECT COUNT(*) FROM scan_history')
-            stats['total_scans'] = self.cursor.fetchone()[0]
-            
-            return stats
+            return dict(zip(STATS_COUNTS, row))
         
         except Exception as e:
             print(f"Error getting statistics: {e}")
             return {}
     
-    def export_data(self, table_name, format='json'):
-        """تصدير البيانات"""
+    def check_statistics(self):
+        """
+        مقارنة العدادات بالعدّ الفعلي في الجداول
+        يعيد {name: (counter, actual)} للعدادات المختلفة فقط (فارغ = متسق)
+        """
         try:
-            self.cursor.execute(f'SELECT * FROM {table_name}')
-            rows = self.cursor.fetchall()
+            counters = self.get_statistics()
+            conn = self.pool.reader()
+            mismatches = {}
+            for name, query in STATS_COUNTS.items():
+                actual = conn.execute(query).fetchone()[0]
+                if counters.get(name) != actual:
+                    mismatches[name] = (counters.get(name), actual)
+            return mismatches
+        
+        except Exception as e:
+            print(f"Error checking statistics: {e}")
+            return None
+    
+    def rebuild_statistics(self):
+        """إعادة حساب صف العدادات من الجداول (للاستعادة بعد خلل)"""
+        try:
+            def _rebuild(conn):
+                conn.execute('INSERT OR IGNORE INTO stats_counters (id) VALUES (1)')
+                conn.execute(REBUILD_STATS)
+            self.pool.write(_rebuild)
+            return self.get_statistics()
+        
+        except Exception as e:
+            print(f"Error rebuilding statistics: {e}")
+            return {}
+    
+    def expire_active_devices(self, max_age_hours=1):
+        """تحويل الأجهزة التي لم تُرَ منذ max_age_hours ساعة إلى Inactive"""
+        try:
+            # last_seen is written as local isoformat() by save_devices
+            cutoff = (datetime.now() - timedelta(hours=max_age_hours)).isoformat()
+            
+            def _expire(conn):
+                # Also picks up devices the backend changed since the last write
+                self._sync_devices(conn)
+                ids = [r[0] for r in conn.execute('''
+                    UPDATE devices SET status = 'Inactive'
+                    WHERE status = 'Active' AND last_seen < ?
+                    RETURNING id
+                ''', (cutoff,)).fetchall()]
+                self.devices.update(ids, status='Inactive')
+                return len(ids)
             
-            # Get column names
-            self.cursor.execute(f'PRAGMA table_info({table_name})')
-            columns = [col[1] for col in self.cursor.fetchall()]
+            return self.pool.write(_expire)
+        
+        except Exception as e:
+            print(f"Error expiring active devices: {e}")
+            return 0
+    
+    def count_rows(self, table_name):
+        """عدد صفوف جدول من القائمة البيضاء"""
+        table_name = check_table(table_name)
+        self.log_queue.flush()
+        return self.pool.reader().execute(f'SELECT COUNT(*) FROM {table_name}').fetchone()[0]
+    
+    def iter_table(self, table_name, chunk_size=5000):
+        """
+        قراءة جدول من القائمة البيضاء دفعات بذاكرة ثابتة
+        يعيد (أسماء الأعمدة, مولّد دفعات الصفوف)؛ يُستهلك المولّد في نفس الخيط
+        """
+        table_name = check_table(table_name)
+        self.log_queue.flush()
+        cursor = self.pool.reader().execute(f'SELECT * FROM {table_name}')
+        columns = [description[0] for description in cursor.description]
+        
+        def _chunks():
+            try:
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        return
+                    yield rows
+            finally:
+                # Ends the read snapshot even when the consumer stops early
+                cursor.close()
+        
+        return columns, _chunks()
+    
+    def export_data(self, table_name, format='json'):
+        """تصدير البيانات (في الذاكرة؛ للجداول الكبيرة استخدم exporter.ExportJob)"""
+        try:
+            columns, chunks = self.iter_table(table_name)
             
             data = []
-            for row in rows:
-                data.append(dict(zip(columns, row)))
+            for rows in chunks:
+                for row in rows:
+                    data.append(dict(zip(columns, row)))
             
             if format == 'json':
                 return json.dumps(data, indent=2)
@@ -635,8 +1365,11 @@ class DatabaseManager:
     def close(self):
         """إغلاق الاتصال بقاعدة البيانات"""
         try:
-            if self.conn:
-                self.conn.close()
+            if self.log_queue:
+                self.log_queue.close()
+            if self.pool:
+                self.pool.close()
+                self.pool = None
                 print("Database connection closed")
         except Exception as e:
             print(f"Error closing database: {e}")
@@ -644,6 +1377,29 @@ class DatabaseManager:
 
 # Test the module
 if __name__ == "__main__":
+    import sys
+    
+    # python database.py --check-stats | --rebuild-stats [db_path]
+    if len(sys.argv) > 1 and sys.argv[1] in ('--check-stats', '--rebuild-stats'):
+        db = DatabaseManager(sys.argv[2] if len(sys.argv) > 2 else 'network_guardian.db')
+        mismatches = db.check_statistics()
+        for name, (counter, actual) in (mismatches or {}).items():
+            print(f"{name}: counter {counter}, actual {actual}")
+        if sys.argv[1] == '--rebuild-stats':
+            print(f"Rebuilt: {db.rebuild_statistics()}")
+            mismatches = db.check_statistics()
+        print("Statistics counters are consistent" if mismatches == {} else "Statistics counters are inconsistent")
+        db.close()
+        sys.exit(0 if mismatches == {} else 1)
+    
+    # python database.py --rebuild-search [db_path]
+    if len(sys.argv) > 1 and sys.argv[1] == '--rebuild-search':
+        db = DatabaseManager(sys.argv[2] if len(sys.argv) > 2 else 'network_guardian.db')
+        ok = db.rebuild_search_index()
+        print("Search index rebuilt" if ok else "Search index rebuild failed")
+        db.close()
+        sys.exit(0 if ok else 1)
+    
     db = DatabaseManager('test_db.db')
     
     # Test device saving
@@ -664,6 +1420,9 @@ if __name__ == "__main__":
     # Log activity
     db.log_activity('INFO', 'Test log message')
     
+    # Full-text search
+    print(f"Search: {db.search('test log')['results'][:1]}")
+    
     # Get statistics
     stats = db.get_statistics()
     print(f"Statistics: {stats}")
@@ -0,0 +1,208 @@
+"""
+Database Connection Module
+وحدة اتصالات قاعدة البيانات (SQLite) الآمنة مع الخيوط
+
+الوظائف:
+- وضع WAL: القراءة لا تنتظر الكتابة
+- اتصال قراءة مستقل لكل خيط (Thread)
+- خيط كتابة واحد يستقبل عمليات الكتابة من طابور
+- تجميع عمليات الكتابة المتتالية في معاملة واحدة (كل عملية في SAVEPOINT خاص بها)
+"""
+
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future
+
+PRAGMAS = (
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA busy_timeout = 5000',
+    'PRAGMA mmap_size = 268435456',
+    'PRAGMA temp_store = MEMORY',
+)
+
+_STOP = object()
+
+
+class ConnectionManager:
+    """اتصالات قراءة لكل خيط + خيط كتابة واحد"""
+
+    def __init__(self, db_path, max_batch=256):
+        self.db_path = db_path
+        self.max_batch = max_batch
+        self._local = threading.local()
+        self._readers = []          # (thread, connection)
+        self._readers_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._closed = False
+        self._closed_lock = threading.Lock()     # no job can be queued behind _STOP
+        self._trace = None
+        self.stats = {'writes': 0, 'transactions': 0, 'failed': 0}
+
+        # The writer connection is opened here so connection errors reach the caller
+        self._writer_conn = self._open()
+        self._writer_conn.isolation_level = None     # transactions are explicit
+        self._writer_conn.execute('PRAGMA journal_mode = WAL')
+        self._writer = threading.Thread(target=self._write_loop, name='db-writer', daemon=True)
+        self._writer.start()
+
+    def _open(self):
+        # Each connection is only used by one thread; the flag lets close() run from any thread
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=5.0)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        conn.set_trace_callback(self._trace)
+        return conn
+
+    def set_trace_callback(self, callback):
+        """تمرير كل أمر SQL تنفذه الاتصالات (الحالية والجديدة) إلى callback (None للإيقاف)"""
+        self._trace = callback
+        self._writer_conn.set_trace_callback(callback)
+        with self._readers_lock:
+            for _, conn in self._readers:
+                conn.set_trace_callback(callback)
+
+    def reader(self):
+        """اتصال القراءة الخاص بالخيط الحالي"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._open()
+            conn.execute('PRAGMA query_only = 1')
+            self._local.conn = conn
+            with self._readers_lock:
+                # Scan threads are short-lived: close what finished threads left behind
+                alive = []
+                for thread, other in self._readers:
+                    if thread.is_alive():
+                        alive.append((thread, other))
+                    else:
+                        other.close()
+                alive.append((threading.current_thread(), conn))
+                self._readers = alive
+        return conn
+
+    def write(self, fn, *args):
+        """
+        تنفيذ fn(conn, *args) في خيط الكتابة داخل معاملة وإرجاع نتيجتها
+        الاستدعاء من داخل خيط الكتابة نفسه يُنفَّذ مباشرة ضمن المعاملة الحالية
+        بعد close() يرفع sqlite3.ProgrammingError بدل الانتظار إلى الأبد
+        """
+        if threading.current_thread() is self._writer:
+            return fn(self._writer_conn, *args)
+        future = Future()
+        with self._closed_lock:
+            if self._closed:
+                raise sqlite3.ProgrammingError("Cannot write to a closed ConnectionManager")
+            self._queue.put((fn, args, future))
+        return future.result()
+
+    def execute(self, sql, params=()):
+        """تنفيذ أمر كتابة واحد؛ يعيد (عدد الصفوف المتأثرة, آخر id)"""
+        def _execute(conn):
+            cursor = conn.execute(sql, params)
+            return cursor.rowcount, cursor.lastrowid
+        return self.write(_execute)
+
+    def executemany(self, sql, rows):
+        """تنفيذ أمر كتابة على دفعة صفوف"""
+        return self.write(lambda conn: conn.executemany(sql, rows).rowcount)
+
+    def _write_loop(self):
+        conn = self._writer_conn
+        while True:
+            job = self._queue.get()
+            if job is _STOP:
+                break
+
+            # Group whatever is already queued into one transaction (one fsync)
+            jobs = [job]
+            stop = False
+            while len(jobs) < self.max_batch:
+                try:
+                    job = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if job is _STOP:
+                    stop = True
+                    break
+                jobs.append(job)
+
+            results = []
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                for fn, args, future in jobs:
+                    # A failing job only rolls back its own savepoint
+                    conn.execute('SAVEPOINT job')
+                    try:
+                        results.append((future, fn(conn, *args), None))
+                        conn.execute('RELEASE job')
+                    except Exception as e:
+                        conn.execute('ROLLBACK TO job')
+                        conn.execute('RELEASE job')
+                        results.append((future, None, e))
+                conn.execute('COMMIT')
+                self.stats['transactions'] += 1
+            except Exception as e:
+                if conn.in_transaction:
+                    conn.execute('ROLLBACK')
+                results = [(future, None, e) for _, _, future in jobs]
+
+            for future, result, error in results:
+                if error is None:
+                    self.stats['writes'] += 1
+                    future.set_result(result)
+                else:
+                    self.stats['failed'] += 1
+                    future.set_exception(error)
+
+            if stop:
+                break
+
+    def close(self):
+        """إنهاء خيط الكتابة بعد تنفيذ ما في الطابور وإغلاق كل الاتصالات"""
+        with self._closed_lock:
+            if not self._closed:
+                self._closed = True
+                self._queue.put(_STOP)
+        if self._writer.is_alive():
+            self._writer.join()
+        self._writer_conn.close()
+        with self._readers_lock:
+            for _, conn in self._readers:
+                conn.close()
+            self._readers = []
+        self._local = threading.local()
+
+
+# Test the module
+if __name__ == "__main__":
+    import os
+    import tempfile
+    import time
+
+    path = os.path.join(tempfile.gettempdir(), 'guardian_pool_test.db')
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+    manager = ConnectionManager(path)
+    manager.execute('CREATE TABLE events (id INTEGER PRIMARY KEY, thread INTEGER, value TEXT)')
+
+    def worker(n, count):
+        for i in range(count):
+            _, row_id = manager.execute('INSERT INTO events (thread, value) VALUES (?, ?)', (n, f"event {i}"))
+            # Read-your-writes: the insert is committed before execute() returns
+            assert manager.reader().execute('SELECT value FROM events WHERE id = ?', (row_id,)).fetchone()
+
+    threads = [threading.Thread(target=worker, args=(n, 2000)) for n in range(8)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    total = manager.reader().execute('SELECT COUNT(*) FROM events').fetchone()[0]
+    print(f"{total:,} writes from 8 threads in {elapsed:.2f}s ({total / elapsed:,.0f}/s), "
+          f"{manager.stats['transactions']:,} transactions")
+    manager.close()
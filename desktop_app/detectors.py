@@ -0,0 +1,104 @@
+"""
+Packet Detectors Module
+وحدة كاشفات التهديدات من الحزم
+
+الوظائف:
+- كشف ARP Spoofing / ARP Poisoning من حزم ARP
+- تجميع الكاشفات الافتراضية (ARP / فحص المنافذ / DNS / التواقيع / قوائم الحظر)
+"""
+
+from collections import OrderedDict
+
+from dns_monitor import DnsMonitor
+from domain_intel import DomainIntel
+from packet_decoder import ETH_P_ARP, ip_to_str, mac_to_str
+from scan_detector import ScanDetector
+from signatures import PayloadInspector
+from threat_intel import ThreatIntelDetector
+
+
+class ArpSpoofDetector:
+    """كشف تغيّر ربط IP بـ MAC"""
+
+    needs = ('arp',)
+
+    def __init__(self, max_entries=65536, max_ips_per_mac=16):
+        self.bindings = OrderedDict()   # ip -> mac
+        self.mac_ips = {}               # mac -> set of ips
+        self.max_entries = max_entries
+        self.max_ips_per_mac = max_ips_per_mac
+        self.reported = {}              # ip -> MACs already reported for it (cleared with the binding)
+
+    def _unlink(self, ip, mac):
+        # Drop the MAC entirely once it has no IP left, so churn cannot grow the dict
+        ips = self.mac_ips.get(mac)
+        if ips is not None:
+            ips.discard(ip)
+            if not ips:
+                del self.mac_ips[mac]
+
+    def process(self, pkt):
+        """معالجة حزمة ARP"""
+        if pkt.ethertype != ETH_P_ARP or not pkt.src_ip:
+            return []
+
+        alerts = []
+        ip, mac = pkt.src_ip, pkt.src_mac
+        known = self.bindings.get(ip)
+
+        if known is None:
+            self.bindings[ip] = mac
+            if len(self.bindings) > self.max_entries:
+                old_ip, old_mac = self.bindings.popitem(last=False)
+                self._unlink(old_ip, old_mac)
+                self.reported.pop(old_ip, None)
+        elif known != mac:
+            reported = self.reported.setdefault(ip, set())
+            if mac not in reported:
+                # An IP flapping between many MACs starts reporting afresh
+                if len(reported) >= self.max_ips_per_mac:
+                    reported.clear()
+                reported.add(mac)
+                alerts.append({
+                    'type': 'ARP Spoofing',
+                    'severity': 'High',
+                    'description': (
+                        f"IP {ip_to_str(ip)} moved from {mac_to_str(known)} "
+                        f"to {mac_to_str(mac)}"
+                    ),
+                    'source_ip': ip_to_str(ip),
+                    'target_ip': ip_to_str(pkt.dst_ip)
+                })
+            self._unlink(ip, known)
+            self.bindings[ip] = mac
+            self.bindings.move_to_end(ip)
+        else:
+            self.bindings.move_to_end(ip)
+
+        ips = self.mac_ips.setdefault(mac, set())
+        ips.add(ip)
+        if len(ips) == self.max_ips_per_mac + 1:
+            alerts.append({
+                'type': 'ARP Poisoning',
+                'severity': 'High',
+                'description': f"MAC {mac_to_str(mac)} claims {len(ips)} IP addresses",
+                'source_ip': ip_to_str(ip),
+                'target_ip': None
+            })
+
+        return alerts
+
+    def flush(self):
+        return []
+
+
+def default_detectors(dns_monitor=None, signature_engine=None, intel_detector=None):
+    """إنشاء مجموعة الكاشفات الافتراضية"""
+    detectors = [ArpSpoofDetector(), ScanDetector(), dns_monitor or DnsMonitor(domain_intel=DomainIntel()),
+                 PayloadInspector(signature_engine)]
+    # Blocklist matching needs every packet: only when a blocklist is loaded
+    if intel_detector is None:
+        intel_detector = ThreatIntelDetector()
+    if intel_detector.intel.count:
+        detectors.append(intel_detector)
+    return detectors
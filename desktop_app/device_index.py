@@ -0,0 +1,161 @@
+"""
+Device Index Module
+وحدة فهرس الأجهزة في الذاكرة
+
+الوظائف:
+- نسخة في الذاكرة من جدول devices مفهرسة حسب MAC و IP
+- تُحمّل مرة واحدة عند البدء وتُحدّث مع كل كتابة (Write-Through)
+- فحص الجهاز الجديد والبحث بدون أي استعلام SQL
+- إحصائيات الحجم ونسبة الإصابة والذاكرة المستخدمة
+"""
+
+import sys
+import threading
+
+DEVICE_COLUMNS = ('id', 'ip', 'mac', 'hostname', 'vendor', 'status', 'first_seen', 'last_seen',
+                  'device_type', 'notes', 'is_trusted')
+
+
+class DeviceIndex:
+    """رقم الجهاز -> الصف، مع فهرسين: MAC -> رقم و IP -> أرقام"""
+
+    def __init__(self):
+        self.devices = {}
+        self.by_mac = {}
+        self.by_ip = {}
+        self.stats = {'lookups': 0, 'hits': 0, 'misses': 0, 'writes': 0, 'reloads': 0}
+        self._lock = threading.Lock()
+
+    def load(self, rows):
+        """تحميل كل الأجهزة: صفوف بترتيب DEVICE_COLUMNS"""
+        with self._lock:
+            self.devices = {}
+            self.by_mac = {}
+            self.by_ip = {}
+            for row in rows:
+                self._put(dict(zip(DEVICE_COLUMNS, row)))
+            self.stats['reloads'] += 1
+
+    def _put(self, device):
+        old = self.devices.get(device['id'])
+        if old is not None:
+            self._unlink(old)
+        self.devices[device['id']] = device
+        if device['mac']:
+            self.by_mac[device['mac']] = device['id']
+        if device['ip']:
+            self.by_ip.setdefault(device['ip'], set()).add(device['id'])
+
+    def _unlink(self, device):
+        if device['mac'] and self.by_mac.get(device['mac']) == device['id']:
+            del self.by_mac[device['mac']]
+        ids = self.by_ip.get(device['ip'])
+        if ids is not None:
+            ids.discard(device['id'])
+            if not ids:
+                del self.by_ip[device['ip']]
+
+    def upsert(self, rows):
+        """تحديث الفهرس بعد كتابة: صفوف بترتيب DEVICE_COLUMNS"""
+        with self._lock:
+            for row in rows:
+                self._put(dict(zip(DEVICE_COLUMNS, row)))
+                self.stats['writes'] += 1
+
+    def update(self, ids, **fields):
+        """تعديل حقول أجهزة معروفة بأرقامها (status, is_trusted ...)"""
+        with self._lock:
+            for device_id in ids:
+                device = self.devices.get(device_id)
+                if device is not None:
+                    device.update(fields)
+                    self.stats['writes'] += 1
+
+    def clear(self):
+        with self._lock:
+            self.devices = {}
+            self.by_mac = {}
+            self.by_ip = {}
+
+    def _count(self, found):
+        self.stats['lookups'] += 1
+        self.stats['hits' if found else 'misses'] += 1
+        return found
+
+    def _latest(self, ip):
+        # Several rows may share an IP (DHCP churn, devices without a MAC)
+        ids = self.by_ip.get(ip)
+        if not ids:
+            return None
+        return max((self.devices[i] for i in ids), key=lambda d: (d['last_seen'] or '', d['id']))
+
+    def find(self, mac=None, ip=None):
+        """الجهاز حسب MAC إن وُجد وإلا حسب IP (آخر ظهور)؛ نسخة أو None"""
+        with self._lock:
+            if mac:
+                device_id = self.by_mac.get(mac)
+                device = self.devices.get(device_id) if device_id is not None else None
+            else:
+                device = self._latest(ip)
+            self._count(device is not None)
+            return dict(device) if device is not None else None
+
+    def contains(self, mac=None, ip=None):
+        """هل الجهاز معروف (MAC إن وُجد وإلا IP)"""
+        with self._lock:
+            found = (mac in self.by_mac) if mac else (ip in self.by_ip)
+            return self._count(found)
+
+    def ids_for_ip(self, ip):
+        with self._lock:
+            return set(self.by_ip.get(ip, ()))
+
+    def all(self):
+        """نسخ كل الأجهزة، الأحدث ظهوراً أولاً"""
+        with self._lock:
+            devices = [dict(device) for device in self.devices.values()]
+        devices.sort(key=lambda d: d['last_seen'] or '', reverse=True)
+        return devices
+
+    def memory_bytes(self):
+        """تقدير أعلى للذاكرة المستخدمة (الحاويات + القيم، والقيم المشتركة تُحسب لكل جهاز)"""
+        with self._lock:
+            size = sys.getsizeof(self.devices) + sys.getsizeof(self.by_mac) + sys.getsizeof(self.by_ip)
+            for device in self.devices.values():
+                size += sys.getsizeof(device) + sum(sys.getsizeof(value) for value in device.values())
+            size += sum(sys.getsizeof(ids) for ids in self.by_ip.values())
+            return size
+
+    def info(self):
+        """إحصائيات للمراقبة: الحجم، الإصابات، نسبة الإصابة، الذاكرة"""
+        lookups = self.stats['lookups']
+        return dict(self.stats,
+                    size=len(self.devices),
+                    hit_rate=self.stats['hits'] / lookups if lookups else 0.0,
+                    memory_bytes=self.memory_bytes())
+
+    def __len__(self):
+        return len(self.devices)
+
+
+# Test the module
+if __name__ == "__main__":
+    import time
+
+    index = DeviceIndex()
+    index.load((i, f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}",
+                '02:00:00:%02x:%02x:%02x' % (i >> 16 & 255, i >> 8 & 255, i & 255),
+                f"host-{i}", 'Unknown', 'Active', '2026-01-01T00:00:00', '2026-01-02T00:00:00', None, None, 0)
+               for i in range(1, 50001))
+
+    start = time.perf_counter()
+    for i in range(1, 100001):
+        index.contains(mac='02:00:00:%02x:%02x:%02x' % (i >> 16 & 255, i >> 8 & 255, i & 255))
+    elapsed = time.perf_counter() - start
+
+    index.upsert([(7, '192.168.1.7', '02:00:00:00:00:07', 'moved', 'Unknown', 'Active',
+                   '2026-01-01T00:00:00', '2026-01-03T00:00:00', None, None, 0)])
+    print(f"100,000 lookups in {elapsed * 1e3:.0f} ms; moved device: {index.find(ip='192.168.1.7')['hostname']}, "
+          f"old IP known: {index.contains(ip='10.0.0.7')}")
+    info = index.info()
+    print(f"size {info['size']:,}, hit rate {info['hit_rate']:.1%}, memory {info['memory_bytes'] / 1e6:.1f} MB")
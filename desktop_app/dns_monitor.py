@@ -0,0 +1,408 @@
+"""
+DNS Monitor Module
+وحدة مراقبة DNS وكشف التزييف (DNS Spoofing / Cache Poisoning)
+
+الوظائف:
+- تتبع استعلامات DNS وإجاباتها من الالتقاط الحي أو ملفات pcap
+- ذاكرة مؤقتة محدودة تحترم TTL لكل (Resolver, اسم, نوع)
+- كشف الإجابات المتعارضة والإجابات المتأخرة لنفس الاستعلام
+- كشف تغيّر إجابة الـ Resolver قبل انتهاء TTL مع تعارض في TTL أو التفويض (Cache Poisoning)
+- كشف Resolvers غير متوقعة لاستعلامات هذا الجهاز
+- فحص أسماء الاستعلامات و CNAME مقابل قائمة حظر النطاقات
+"""
+
+import platform
+import re
+import socket
+import subprocess
+from collections import OrderedDict
+
+from packet_decoder import PROTO_UDP, ip_to_int, ip_to_str, parse_dns
+
+RTYPE_A = 1
+RTYPE_CNAME = 5
+RTYPE_AAAA = 28
+
+# Seconds a re-served record's TTL may exceed the time left on the cached one
+TTL_SLACK = 2
+
+
+def system_resolvers():
+    """قراءة خوادم DNS المعرّفة في النظام"""
+    servers = []
+    try:
+        if platform.system() == "Windows":
+            output = subprocess.check_output(["ipconfig", "/all"], universal_newlines=True,
+                                             stderr=subprocess.DEVNULL)
+            capture = False
+            for line in output.splitlines():
+                if 'DNS Servers' in line:
+                    capture = True
+                    line = line.split(':', 1)[1]
+                elif capture and ':' in line and not line.strip()[0].isdigit():
+                    capture = False
+                if capture:
+                    servers += re.findall(r'\b\d{1,3}(?:\.\d{1,3}){3}\b', line)
+        else:
+            # systemd-resolved keeps the real upstreams behind the 127.0.0.53 stub
+            for path in ('/etc/resolv.conf', '/run/systemd/resolve/resolv.conf'):
+                try:
+                    with open(path, 'r') as f:
+                        for line in f:
+                            parts = line.split()
+                            if len(parts) >= 2 and parts[0] == 'nameserver':
+                                servers.append(parts[1])
+                except OSError:
+                    pass
+    except Exception as e:
+        print(f"Error reading DNS servers: {e}")
+
+    return list(dict.fromkeys(servers))
+
+
+def local_addresses():
+    """عناوين IPv4 الخاصة بهذا الجهاز"""
+    addresses = set()
+    try:
+        addresses.update(socket.gethostbyname_ex(socket.gethostname())[2])
+        # Connecting a UDP socket sends nothing but picks the outbound address
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+            probe.connect(('192.0.2.1', 53))
+            addresses.add(probe.getsockname()[0])
+    except OSError as e:
+        print(f"Error reading local addresses: {e}")
+
+    return sorted(addresses)
+
+
+class DnsMonitor:
+    """مراقبة DNS مع ذاكرة إجابات لكل Resolver"""
+
+    needs = ('dns',)
+
+    def __init__(self, resolvers=None, local_clients=None, max_entries=65536, max_pending=65536,
+                 query_timeout=5.0, late_window=10.0, min_ttl=30, max_ttl=86400,
+                 cooldown=300, domain_intel=None):
+        """
+        resolvers: خوادم DNS المعرّفة لهذا الجهاز
+        local_clients: عناوين هذا الجهاز؛ الـ Resolvers المعرّفة تخصه وحده،
+                       فأجهزة الشبكة الأخرى قد تستخدم البوابة أو خوادم أخرى بشكل مشروع
+        """
+        if resolvers is None:
+            resolvers = system_resolvers()
+        if local_clients is None:
+            local_clients = local_addresses()
+        self.expected_resolvers = set()
+        self.local_clients = set()
+        for addresses, servers in ((self.expected_resolvers, resolvers), (self.local_clients, local_clients)):
+            for server in servers:
+                try:
+                    addresses.add(ip_to_int(server))
+                except OSError:
+                    pass    # IPv6 addresses are not tracked by the IPv4 decoder
+
+        self.max_entries = max_entries
+        self.max_pending = max_pending
+        self.query_timeout = query_timeout
+        self.late_window = late_window
+        self.min_ttl = min_ttl
+        self.max_ttl = max_ttl
+        self.cooldown = cooldown
+        self.domain_intel = domain_intel
+
+        # (client, client_port, txid, qname) -> (ts, resolver)
+        self.pending = OrderedDict()
+        # (client, client_port, txid, qname) -> (ts, resolver, answers)
+        self.answered = OrderedDict()
+        # (resolver, qname, rtype) -> (answers, expires, delegation)
+        self.cache = OrderedDict()
+
+        # client -> (first query seen, last query seen), least recently active first
+        self.clients = OrderedDict()
+        self.observed_resolvers = {}    # resolver -> responses seen by local clients
+        self.last_alert = {}
+        self.counters = {
+            'queries': 0,
+            'responses': 0,
+            'cache_hits': 0,
+            'conflicts': 0,
+            'late_answers': 0,
+            'poisoning': 0,
+            'rotations': 0,
+            'unsolicited': 0,
+            'unexpected_resolvers': 0,
+            'blocked_domains': 0
+        }
+
+    def process(self, pkt):
+        """معالجة حزمة UDP من/إلى المنفذ 53"""
+        if pkt.proto != PROTO_UDP or not pkt.payload_length:
+            return []
+        if pkt.src_port != 53 and pkt.dst_port != 53:
+            return []
+
+        message = parse_dns(pkt.buf, pkt.payload_offset, pkt.payload_length)
+        if not message or not message['questions']:
+            return []
+
+        if not message['response']:
+            if pkt.dst_port == 53:
+                return self._on_query(pkt, message)
+            return []
+        if pkt.src_port == 53:
+            return self._on_response(pkt, message)
+        return []
+
+    def _on_query(self, pkt, message):
+        self.counters['queries'] += 1
+        key = (pkt.src_ip, pkt.src_port, message['id'], message['questions'][0][0])
+        self.pending[key] = (pkt.ts, pkt.dst_ip)
+        self.pending.move_to_end(key)
+
+        clients = self.clients
+        seen = clients.get(pkt.src_ip)
+        clients[pkt.src_ip] = (seen[0] if seen else pkt.ts, pkt.ts)
+        if seen is not None:
+            clients.move_to_end(pkt.src_ip)
+        elif len(clients) > self.max_pending:
+            clients.popitem(last=False)
+
+        # Drop queries that can no longer be answered, oldest first
+        pending = self.pending
+        while pending:
+            oldest = next(iter(pending))
+            if len(pending) <= self.max_pending and pkt.ts - pending[oldest][0] < self.query_timeout:
+                break
+            del pending[oldest]
+
+        return self._check_domain(message['questions'][0][0], pkt.src_ip, pkt.dst_ip, pkt.ts, 'looked up')
+
+    def _check_domain(self, name, client, resolver, ts, action):
+        """فحص اسم مقابل قائمة حظر النطاقات"""
+        if self.domain_intel is None:
+            return []
+        self.domain_intel.maybe_reload()
+        hit = self.domain_intel.match(name)
+        if hit is None:
+            return []
+        listed, severity = hit
+        return self._alert(('domain', client, listed), ts, 'blocked_domains', self.domain_intel.alert(
+            name, listed, severity, f"{ip_to_str(client)} {action}",
+            source_ip=ip_to_str(client), target_ip=ip_to_str(resolver)
+        ))
+
+    def _on_response(self, pkt, message):
+        self.counters['responses'] += 1
+        alerts = []
+        ts = pkt.ts
+        resolver = pkt.src_ip
+        qname, qtype = message['questions'][0]
+        answers = frozenset(value for _, rtype, _, value in message['answers']
+                            if rtype in (RTYPE_A, RTYPE_AAAA))
+
+        if pkt.dst_ip in self.local_clients:
+            self.observed_resolvers[resolver] = self.observed_resolvers.get(resolver, 0) + 1
+        if (self.expected_resolvers and pkt.dst_ip in self.local_clients
+                and resolver not in self.expected_resolvers):
+            alerts += self._alert(('resolver', resolver), ts, 'unexpected_resolvers', {
+                'type': 'Unexpected DNS Resolver',
+                'severity': 'Medium',
+                'description': f"{ip_to_str(pkt.dst_ip)} received DNS answers from "
+                               f"{ip_to_str(resolver)}, which is not a configured resolver",
+                'source_ip': ip_to_str(resolver),
+                'target_ip': ip_to_str(pkt.dst_ip)
+            })
+
+        # Same transaction answered more than once: a race between the real
+        # resolver and a spoofer, whichever of them arrived first
+        key = (pkt.dst_ip, pkt.dst_port, message['id'], qname)
+        first = self.answered.get(key)
+        if first is not None:
+            first_ts, first_resolver, first_answers = first
+            if answers != first_answers and ts - first_ts <= self.late_window:
+                self.counters['late_answers'] += 1
+                alerts += self._alert(('race', key), ts, 'conflicts', {
+                    'type': 'DNS Spoofing',
+                    'severity': 'High',
+                    'description': (
+                        f"Conflicting answers for {qname} (id {message['id']}): "
+                        f"{', '.join(sorted(first_answers)) or 'empty'} from {ip_to_str(first_resolver)} vs "
+                        f"{', '.join(sorted(answers)) or 'empty'} from {ip_to_str(resolver)} "
+                        f"{ts - first_ts:.3f}s later"
+                    ),
+                    'source_ip': ip_to_str(resolver),
+                    'target_ip': ip_to_str(pkt.dst_ip)
+                })
+            return alerts
+
+        # We watch this client's queries, yet nobody asked this one
+        if self.pending.pop(key, None) is None:
+            last_query = self.clients.get(pkt.dst_ip)
+            if (last_query is not None and ts - last_query[0] > self.query_timeout
+                    and ts - last_query[1] <= 60):
+                alerts += self._alert(('unsolicited', resolver, pkt.dst_ip), ts, 'unsolicited', {
+                    'type': 'DNS Spoofing',
+                    'severity': 'Medium',
+                    'description': f"Unsolicited DNS response for {qname} from {ip_to_str(resolver)} "
+                                   f"to {ip_to_str(pkt.dst_ip)} (no matching query)",
+                    'source_ip': ip_to_str(resolver),
+                    'target_ip': ip_to_str(pkt.dst_ip)
+                })
+        self.answered[key] = (ts, resolver, answers)
+        answered = self.answered
+        while answered:
+            oldest = next(iter(answered))
+            if len(answered) <= self.max_pending and ts - answered[oldest][0] < self.late_window:
+                break
+            del answered[oldest]
+
+        if answers and message['rcode'] == 0:
+            alerts += self._check_cache(pkt, resolver, qname, qtype, answers, message)
+        # A harmless query name can be aliased into a listed domain
+        for _, rtype, _, value in message['answers']:
+            if rtype == RTYPE_CNAME:
+                alerts += self._check_domain(value, pkt.dst_ip, resolver, ts, f"was sent via {qname} to")
+        return alerts
+
+    def _check_cache(self, pkt, resolver, qname, qtype, answers, message):
+        """
+        مقارنة الإجابة مع ما أعاده نفس الـ Resolver سابقاً ضمن TTL
+        اختلاف العناوين وحده طبيعي لدى شبكات CDN، فالتنبيه يتطلب أيضاً
+        TTL جديداً يتجاوز ما تبقى من السجل المخزن أو تفويضاً (CNAME / NS) مختلفاً
+        """
+        ts = pkt.ts
+        ttl = min(min(ttl for _, rtype, ttl, _ in message['answers'] if rtype in (RTYPE_A, RTYPE_AAAA)),
+                  self.max_ttl)
+        # Very short TTLs are load balancing by design
+        if ttl < self.min_ttl:
+            return []
+        delegation = frozenset([value for _, rtype, _, value in message['answers'] if rtype == RTYPE_CNAME]
+                               + message['authority'])
+
+        cache_key = (resolver, qname, qtype)
+        cached = self.cache.get(cache_key)
+        self.cache[cache_key] = (answers, ts + ttl, delegation)
+        self.cache.move_to_end(cache_key)
+        if len(self.cache) > self.max_entries:
+            self.cache.popitem(last=False)
+
+        if cached is None or ts >= cached[1]:
+            return []
+
+        self.counters['cache_hits'] += 1
+        cached_answers, expires, cached_delegation = cached
+        if answers & cached_answers:
+            # Overlapping sets are normal round-robin; keep what the resolver cached
+            self.cache[cache_key] = (cached_answers | answers, expires, cached_delegation)
+            return []
+
+        # A caching resolver counts the TTL down and keeps the delegation it resolved through
+        reasons = []
+        if ts + ttl > expires + TTL_SLACK:
+            reasons.append(f"with a fresh {ttl}s TTL {expires - ts:.0f}s before the old one expired")
+        if delegation != cached_delegation:
+            reasons.append(f"via {', '.join(sorted(delegation)) or 'no delegation'} instead of "
+                           f"{', '.join(sorted(cached_delegation)) or 'no delegation'}")
+        if not reasons:
+            self.counters['rotations'] += 1
+            return []
+
+        return self._alert(('poison', cache_key), ts, 'poisoning', {
+            'type': 'DNS Cache Poisoning',
+            'severity': 'High',
+            'description': (
+                f"{ip_to_str(resolver)} changed {qname} from {', '.join(sorted(cached_answers))} "
+                f"to {', '.join(sorted(answers))} {' and '.join(reasons)}"
+            ),
+            'source_ip': ip_to_str(resolver),
+            'target_ip': ip_to_str(pkt.dst_ip)
+        })
+
+    def _alert(self, key, ts, counter, alert):
+        self.counters[counter] += 1
+        if ts - self.last_alert.get(key, float('-inf')) < self.cooldown:
+            return []
+        self.last_alert[key] = ts
+        if len(self.last_alert) > 4096:
+            self.last_alert.pop(next(iter(self.last_alert)))
+        return [alert]
+
+    def flush(self):
+        return []
+
+    def summary(self):
+        """ملخص الحالة لفحص أمان DNS"""
+        observed = dict(self.observed_resolvers)
+        return {
+            'expected_resolvers': sorted(ip_to_str(ip) for ip in self.expected_resolvers),
+            'observed_resolvers': {ip_to_str(ip): count for ip, count in observed.items()},
+            'unexpected_resolvers': sorted(ip_to_str(ip) for ip in observed
+                                           if self.expected_resolvers and ip not in self.expected_resolvers),
+            'cache_entries': len(self.cache),
+            'counters': dict(self.counters)
+        }
+
+
+# Test the module
+if __name__ == "__main__":
+    import struct
+    import time
+
+    from packet_decoder import Packet, ETH_P_IP
+
+    def make_response(txid, name, addresses, ttl=300, flags=0x8180):
+        qname = b''.join(bytes([len(label)]) + label.encode() for label in name.split('.')) + b'\x00'
+        body = struct.pack('!HHHHHH', txid, flags, 1, len(addresses), 0, 0) + qname + struct.pack('!HH', 1, 1)
+        for address in addresses:
+            body += b'\xc0\x0c' + struct.pack('!HHIH', 1, 1, ttl, 4) + bytes(map(int, address.split('.')))
+        return body
+
+    def packet(ts, src, dst, sport, dport, payload):
+        pkt = Packet(ts, len(payload) + 42, ETH_P_IP)
+        pkt.proto = PROTO_UDP
+        pkt.src_ip, pkt.dst_ip = ip_to_int(src), ip_to_int(dst)
+        pkt.src_port, pkt.dst_port = sport, dport
+        pkt.buf, pkt.payload_offset, pkt.payload_length = payload, 0, len(payload)
+        return pkt
+
+    monitor = DnsMonitor(resolvers=['192.168.1.1'], local_clients=['192.168.1.10', '192.168.1.11'])
+    alerts = []
+    alerts += monitor.process(packet(1.0, '192.168.1.10', '192.168.1.1', 40000, 53,
+                                     make_response(7, 'bank.example', [], flags=0x0100)))
+    alerts += monitor.process(packet(1.01, '192.168.1.1', '192.168.1.10', 53, 40000,
+                                     make_response(7, 'bank.example', ['93.184.216.34'])))
+    # Spoofed late answer for the same transaction
+    alerts += monitor.process(packet(1.02, '192.168.1.1', '192.168.1.10', 53, 40000,
+                                     make_response(7, 'bank.example', ['6.6.6.6'])))
+    # Resolver changes its answer well within the TTL
+    alerts += monitor.process(packet(20.0, '192.168.1.1', '192.168.1.11', 53, 40001,
+                                     make_response(9, 'bank.example', ['6.6.6.6'])))
+    # CDN rotation: a disjoint set whose TTL keeps counting down is not poisoning
+    alerts += monitor.process(packet(30.0, '192.168.1.1', '192.168.1.12', 53, 40010,
+                                     make_response(21, 'cdn.example', ['198.51.100.1'], ttl=120)))
+    alerts += monitor.process(packet(60.0, '192.168.1.1', '192.168.1.12', 53, 40011,
+                                     make_response(22, 'cdn.example', ['198.51.100.2'], ttl=90)))
+    # Blind spoofing attempt: a response nobody asked for
+    alerts += monitor.process(packet(8.0, '192.168.1.10', '192.168.1.1', 40003, 53,
+                                     make_response(12, 'cdn.example', [], flags=0x0100)))
+    alerts += monitor.process(packet(8.5, '192.168.1.1', '192.168.1.10', 53, 40004,
+                                     make_response(4242, 'bank.example', ['6.6.6.7'])))
+    # Answer from a resolver nobody configured; other hosts may use their own
+    alerts += monitor.process(packet(21.0, '203.0.113.5', '192.168.1.11', 53, 40002,
+                                     make_response(11, 'mail.example', ['10.1.1.1'])))
+    alerts += monitor.process(packet(21.5, '192.168.1.254', '192.168.1.50', 53, 40005,
+                                     make_response(13, 'mail.example', ['10.1.1.1'])))
+
+    for alert in alerts:
+        print(f"[{alert['severity']}] {alert['type']}: {alert['description']}")
+
+    names = [f"host{i}.example" for i in range(5000)]
+    payloads = [make_response(i & 0xFFFF, names[i % 5000], [f"10.0.{i % 250}.{i % 200}"]) for i in range(20000)]
+    packets = [packet(100.0 + i * 0.001, '192.168.1.1', '192.168.1.10', 53, 1024 + i % 60000, p)
+               for i, p in enumerate(payloads)]
+    monitor = DnsMonitor(resolvers=['192.168.1.1'], local_clients=['192.168.1.10', '192.168.1.11'])
+    start = time.perf_counter()
+    for pkt in packets:
+        monitor.process(pkt)
+    elapsed = time.perf_counter() - start
+    print(f"{len(packets) / elapsed:,.0f} responses/s, {len(monitor.cache)} cache entries")
@@ -0,0 +1,351 @@
+"""
+Domain Intelligence Module
+وحدة قوائم حظر النطاقات (Domain Blocklists)
+
+الوظائف:
+- استيراد قوائم النطاقات (قوائم نصية، ملفات hosts، صيغة ||domain^)
+- بناء شجرة لاحقات بالمقاطع المعكوسة (com -> example -> ads)
+- حفظ الشجرة في جدول hash ثنائي يُحمّل عبر mmap (بدء فوري)
+- فحص أي اسم فرعي بعدد خطوات = عدد مقاطعه مهما كان حجم القائمة
+- تنبيهات بخطورة كل قائمة
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import re
+import struct
+import time
+
+import numpy as np
+
+from alert_pipeline import SEVERITY_RANK
+
+DEFAULT_DOMAIN_LIST = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'domain_intel.bin')
+
+MAGIC = b'NGDL'
+VERSION = 1
+# magic, version, table slots, metadata length
+HEADER = struct.Struct('<4sHxxII')
+
+SEVERITY_NAMES = {rank: name.capitalize() for name, rank in SEVERITY_RANK.items()}
+
+_DOMAIN = re.compile(r'^(?:[a-z0-9_](?:[a-z0-9_-]{0,61}[a-z0-9_])?\.)+[a-z0-9-]{2,63}$')
+# Host-file targets and names that must never be listed
+_SINKHOLES = {'0.0.0.0', '127.0.0.1', '::', '::1', '::0'}
+_IGNORED = {'localhost', 'localhost.localdomain', 'local', 'broadcasthost', 'ip6-localhost', 'ip6-loopback'}
+
+
+def normalize_domain(name):
+    """توحيد الاسم: أحرف صغيرة وبدون نقطة أخيرة أو *."""
+    name = str(name or '').strip().lower().rstrip('.')
+    if name.startswith('*.'):
+        name = name[2:]
+    return name
+
+
+def parse_entry(line):
+    """
+    سطر من قائمة نطاقات -> النطاق أو None
+    يدعم: example.com | 0.0.0.0 example.com | ||example.com^ | *.example.com | مع تعليقات # أو !
+    """
+    line = line.split('#', 1)[0].strip()
+    if not line or line[0] in '!;[':
+        return None
+    if line.startswith('||'):
+        line = line[2:].split('^', 1)[0]
+    parts = line.split()
+    if len(parts) >= 2 and parts[0] in _SINKHOLES:
+        line = parts[1]
+    elif parts:
+        line = parts[0]
+    domain = normalize_domain(line)
+    if domain in _IGNORED or not _DOMAIN.match(domain):
+        return None
+    return domain
+
+
+def _node_key(path):
+    """مفتاح عقدة الشجرة: hash بطول 64 بت لمسار المقاطع المعكوسة (0 محجوز للخانة الفارغة)"""
+    return int.from_bytes(hashlib.blake2b(path.encode('utf-8'), digest_size=8).digest(), 'little') or 1
+
+
+def _reduce(keys, values):
+    """مفتاح واحد لكل عقدة مع أعلى قيمة (0 = عقدة وسيطة)"""
+    order = np.argsort(keys, kind='stable')
+    keys, values = keys[order], values[order]
+    first = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+    return keys[first], np.maximum.reduceat(values, first)
+
+
+def _build_table(keys, values):
+    """جدول hash بعنونة مفتوحة (linear probing) مبني بعمليات numpy"""
+    size = 16
+    while size < len(keys) * 2:
+        size <<= 1
+    mask = size - 1
+    table_keys = np.zeros(size, dtype=np.uint64)
+    table_values = np.zeros(size, dtype=np.uint8)
+
+    slots = (keys & np.uint64(mask)).astype(np.int64)
+    pending = np.arange(len(keys))
+    while len(pending):
+        wanted = slots[pending]
+        free = np.flatnonzero(table_keys[wanted] == 0)
+        # One winner per free slot; everyone else moves one slot along
+        taken, first = np.unique(wanted[free], return_index=True)
+        winners = pending[free[first]]
+        table_keys[taken] = keys[winners]
+        table_values[taken] = values[winners]
+        won = np.zeros(len(pending), dtype=bool)
+        won[free[first]] = True
+        pending = pending[~won]
+        slots[pending] = (slots[pending] + 1) & mask
+    return table_keys, table_values
+
+
+def build_domain_list(sources, path=DEFAULT_DOMAIN_LIST, severity='High', chunk_entries=1 << 19, progress=None):
+    """
+    استيراد قوائم النطاقات إلى ملف الشجرة الثنائي
+    sources: مسارات أو أزواج (مسار, خطورة)
+    """
+    if isinstance(sources, str):
+        sources = [sources]
+
+    all_keys = np.empty(0, dtype=np.uint64)
+    all_values = np.empty(0, dtype=np.uint8)
+    pending_keys, pending_values = [], []
+    entries = 0
+    names = []
+
+    def _flush():
+        nonlocal all_keys, all_values, pending_keys, pending_values
+        if not pending_keys:
+            return
+        all_keys, all_values = _reduce(
+            np.concatenate([all_keys, np.array(pending_keys, dtype=np.uint64)]),
+            np.concatenate([all_values, np.array(pending_values, dtype=np.uint8)])
+        )
+        pending_keys, pending_values = [], []
+
+    for source in sources:
+        source, source_severity = source if isinstance(source, (tuple, list)) else (source, severity)
+        rank = SEVERITY_RANK.get(str(source_severity).lower(), SEVERITY_RANK['high'])
+        names.append(os.path.basename(source))
+        with open(source, 'r', encoding='utf-8', errors='ignore') as f:
+            for line in f:
+                domain = parse_entry(line)
+                if domain is None:
+                    continue
+                # Every ancestor becomes an interior node so lookups can stop early
+                node = ''
+                for label in reversed(domain.split('.')):
+                    node = f"{node}.{label}" if node else label
+                    pending_keys.append(_node_key(node))
+                    pending_values.append(0)
+                pending_values[-1] = rank
+                entries += 1
+                if len(pending_keys) >= chunk_entries:
+                    _flush()
+                    if progress:
+                        progress(entries)
+    _flush()
+
+    table_keys, table_values = _build_table(all_keys, all_values)
+    meta = json.dumps({
+        'sources': names,
+        'entries': entries,
+        'domains': int(np.count_nonzero(all_values)),
+        'nodes': len(all_keys),
+        'built': time.time()
+    }).encode('utf-8')
+    meta += b' ' * (-len(meta) % 8)        # keep the key array 8-byte aligned
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(table_keys), len(meta)))
+        f.write(meta)
+        f.write(table_keys.astype('<u8').tobytes())
+        f.write(table_values.tobytes())
+    os.replace(tmp_path, path)
+
+    if progress:
+        progress(entries)
+    return {'entries': entries, 'domains': int(np.count_nonzero(all_values)), 'nodes': len(all_keys)}
+
+
+class _Table:
+    """جدول محمّل: mmap + عرض المفاتيح والقيم"""
+
+    __slots__ = ('mm', 'keys', 'values', 'mask', 'meta', 'mtime')
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.mtime = os.fstat(f.fileno()).st_mtime
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, size, meta_len = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC or version != VERSION or size & (size - 1):
+            raise ValueError(f"Not a domain list index: {path}")
+        offset = HEADER.size
+        self.meta = json.loads(self.mm[offset:offset + meta_len].decode('utf-8').strip() or '{}')
+        offset += meta_len
+        view = memoryview(self.mm)
+        self.keys = view[offset:offset + size * 8].cast('Q')
+        self.values = view[offset + size * 8:offset + size * 9]
+        self.mask = size - 1
+
+    def get(self, key):
+        """قيمة العقدة (None إن لم تكن في الشجرة)"""
+        keys = self.keys
+        slot = key & self.mask
+        while True:
+            found = keys[slot]
+            if found == key:
+                return self.values[slot]
+            if found == 0:
+                return None
+            slot = (slot + 1) & self.mask
+
+
+class DomainIntel:
+    """فحص أسماء النطاقات مقابل القائمة المحمّلة"""
+
+    def __init__(self, path=DEFAULT_DOMAIN_LIST, check_interval=5.0):
+        self.path = path
+        self.check_interval = check_interval
+        self.table = None
+        self.last_check = 0.0
+        self.load()
+
+    def load(self):
+        """تحميل الملف (الجدول القديم يبقى عند الخطأ)"""
+        try:
+            table = _Table(self.path)
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            print(f"Error loading domain list: {e}")
+            return False
+        self.table = table
+        return True
+
+    def maybe_reload(self):
+        """إعادة التحميل إذا تغيّر الملف (بحد أقصى مرة كل check_interval)"""
+        now = time.monotonic()
+        if now - self.last_check < self.check_interval:
+            return False
+        self.last_check = now
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return False
+        if self.table is not None and mtime == self.table.mtime:
+            return False
+        return self.load()
+
+    def import_lists(self, sources, severity='High', progress=None):
+        """استيراد قوائم جديدة ثم تحميلها"""
+        result = build_domain_list(sources, self.path, severity=severity, progress=progress)
+        self.load()
+        return result
+
+    @property
+    def count(self):
+        return self.meta.get('domains', 0)
+
+    @property
+    def meta(self):
+        table = self.table
+        return table.meta if table is not None else {}
+
+    def match(self, name):
+        """
+        أول لاحقة مدرجة للاسم -> (النطاق المدرج, الخطورة) أو None
+        يمشي المقاطع من اليمين ويتوقف عند أول مقطع خارج الشجرة
+        """
+        table = self.table
+        if table is None or not name:
+            return None
+        labels = normalize_domain(name).split('.')
+        path = ''
+        for depth, label in enumerate(reversed(labels), 1):
+            path = f"{path}.{label}" if path else label
+            value = table.get(_node_key(path))
+            if value is None:
+                return None
+            if value:
+                return '.'.join(labels[-depth:]), SEVERITY_NAMES.get(value, 'High')
+        return None
+
+    def alert(self, name, listed, severity, context, source_ip=None, target_ip=None):
+        """تنبيه تطابق اسم مع قائمة النطاقات"""
+        description = f"{context} {name}"
+        if listed != normalize_domain(name):
+            description += f" (under {listed})"
+        sources = ', '.join(self.meta.get('sources', [])) or 'local domain list'
+        return {
+            'type': 'Blocked Domain',
+            'severity': severity,
+            'description': f"{description}, listed on the domain blocklist ({sources})",
+            'source_ip': source_ip,
+            'target_ip': target_ip
+        }
+
+    def check_hostname(self, hostname, ip=None):
+        """فحص اسم جهاز محلول (من get_hostname)"""
+        if not hostname or hostname == 'Unknown':
+            return []
+        self.maybe_reload()
+        hit = self.match(hostname)
+        if hit is None:
+            return []
+        context = f"Host {ip} resolves to" if ip else 'Host'
+        return [self.alert(hostname, hit[0], hit[1], context, source_ip=ip)]
+
+
+# Test the module
+if __name__ == "__main__":
+    import random
+    import string
+    import sys
+    import tempfile
+
+    if len(sys.argv) > 2 and sys.argv[1] == 'import':
+        start = time.perf_counter()
+        result = build_domain_list(sys.argv[2:], progress=lambda n: print(f"\r{n:,} entries", end=''))
+        print(f"\n{result['domains']:,} domains in {time.perf_counter() - start:.1f}s -> {DEFAULT_DOMAIN_LIST}")
+        sys.exit(0)
+
+    random.seed(1)
+    tlds = ['com', 'net', 'org', 'info', 'xyz', 'ru', 'io']
+    source = os.path.join(tempfile.gettempdir(), 'guardian_domains.txt')
+    count = 1_000_000
+    with open(source, 'w') as f:
+        f.write("# synthetic domain list\n0.0.0.0 localhost\n")
+        for i in range(count):
+            name = ''.join(random.choices(string.ascii_lowercase, k=random.randint(5, 12)))
+            if i % 3 == 0:
+                f.write(f"0.0.0.0 ads.{name}.{random.choice(tlds)}\n")
+            else:
+                f.write(f"||{name}.{random.choice(tlds)}^\n")
+        f.write("malware-c2.example\n")
+
+    path = os.path.join(tempfile.gettempdir(), 'guardian_domains.bin')
+    start = time.perf_counter()
+    result = build_domain_list([(source, 'Critical')], path)
+    print(f"Imported {result['entries']:,} entries -> {result['nodes']:,} trie nodes "
+          f"in {time.perf_counter() - start:.1f}s ({os.path.getsize(path) / 1e6:.1f} MB)")
+
+    start = time.perf_counter()
+    intel = DomainIntel(path)
+    print(f"Loaded in {(time.perf_counter() - start) * 1e3:.2f} ms")
+    for name in ('cdn.eu.malware-c2.example.', 'example', 'www.python.org', 'localhost'):
+        print(f"{name}: {intel.match(name)}")
+
+    probes = [f"www.{''.join(random.choices(string.ascii_lowercase, k=8))}.{random.choice(tlds)}"
+              for _ in range(100000)]
+    start = time.perf_counter()
+    hits = sum(intel.match(name) is not None for name in probes)
+    elapsed = time.perf_counter() - start
+    print(f"{elapsed / len(probes) * 1e6:.2f} us per lookup ({hits} hits)")
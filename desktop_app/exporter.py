@@ -0,0 +1,212 @@
+"""
+Exporter Module
+وحدة تصدير الجداول بالتدفق (Streaming)
+
+الوظائف:
+- قراءة الجدول دفعات (fetchmany) بذاكرة ثابتة مهما كان حجمه
+- الكتابة تدريجياً بصيغة CSV أو NDJSON أو JSON، مع ضغط gzip اختياري
+- التصدير في خيط خلفي مع تقدّم وإلغاء
+- السماح بالجداول المعروفة فقط (قائمة بيضاء)
+"""
+
+import csv
+import gzip
+import json
+import os
+import threading
+import time
+
+# Tables that may be exported (names are interpolated into SQL)
+EXPORT_TABLES = (
+    'devices', 'activity_logs', 'security_alerts', 'incidents', 'incident_alerts',
+    'network_stats', 'network_stats_1m', 'network_stats_1h', 'network_stats_1d',
+    'scan_history', 'flows', 'top_talkers', 'settings',
+)
+FORMATS = ('csv', 'ndjson', 'json')
+_EXTENSIONS = {'.csv': 'csv', '.ndjson': 'ndjson', '.jsonl': 'ndjson', '.json': 'json'}
+
+
+class ExportCancelled(Exception):
+    """أُلغي التصدير قبل اكتماله"""
+
+
+def check_table(table_name):
+    """التحقق من اسم الجدول مقابل القائمة البيضاء"""
+    if table_name not in EXPORT_TABLES:
+        raise ValueError(f"Table cannot be exported: {table_name!r}")
+    return table_name
+
+
+def detect_format(path):
+    """الصيغة والضغط من امتداد الملف: (format, gzip)"""
+    name = path.lower()
+    compressed = name.endswith('.gz')
+    if compressed:
+        name = name[:-3]
+    fmt = _EXTENSIONS.get(os.path.splitext(name)[1], 'csv')
+    return fmt, compressed
+
+
+class _Writer:
+    """كتابة الصفوف بالصيغة المطلوبة إلى ملف نصي مفتوح"""
+
+    def __init__(self, f, fmt, columns):
+        self.f = f
+        self.fmt = fmt
+        self.columns = columns
+        self.first = True
+        if fmt == 'csv':
+            self.csv = csv.writer(f)
+            self.csv.writerow(columns)
+        elif fmt == 'json':
+            f.write('[')
+
+    def write(self, rows):
+        if self.fmt == 'csv':
+            self.csv.writerows(rows)
+            return
+        dumps = json.dumps
+        lines = [dumps(dict(zip(self.columns, row)), ensure_ascii=False, default=str) for row in rows]
+        if self.fmt == 'ndjson':
+            self.f.write('\n'.join(lines) + '\n')
+        elif lines:
+            self.f.write(('\n' if self.first else ',\n') + ',\n'.join(lines))
+            self.first = False
+
+    def finish(self):
+        if self.fmt == 'json':
+            self.f.write('\n]\n')
+
+
+def export_rows(columns, chunks, path, fmt=None, compress=None, progress=None, cancel=None):
+    """
+    كتابة دفعات الصفوف chunks إلى path تدريجياً
+    الملف يُكتب باسم مؤقت ولا يحل محل الهدف إلا عند الاكتمال
+    progress(عدد الصفوف) بعد كل دفعة، و cancel حدث (Event) يوقف التصدير
+    يعيد عدد الصفوف المكتوبة
+    """
+    detected, compressed = detect_format(path)
+    fmt = fmt or detected
+    compress = compressed if compress is None else compress
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt!r}")
+
+    tmp_path = path + '.part'
+    opener = gzip.open if compress else open
+    options = {'compresslevel': 6} if compress else {}
+    rows_written = 0
+    try:
+        with opener(tmp_path, 'wt', encoding='utf-8', newline='', **options) as f:
+            writer = _Writer(f, fmt, columns)
+            for rows in chunks:
+                if cancel is not None and cancel.is_set():
+                    raise ExportCancelled(f"Export cancelled after {rows_written:,} rows")
+                writer.write(rows)
+                rows_written += len(rows)
+                if progress:
+                    progress(rows_written)
+            writer.finish()
+        os.replace(tmp_path, path)
+        return rows_written
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class ExportJob:
+    """تصدير جدول في خيط خلفي عبر DatabaseManager.iter_table"""
+
+    def __init__(self, db, table_name, path, fmt=None, compress=None, chunk_size=5000,
+                 progress=None, done=None):
+        self.db = db
+        self.table_name = check_table(table_name)
+        self.path = path
+        self.fmt = fmt
+        self.compress = compress
+        self.chunk_size = chunk_size
+        self.progress = progress        # progress(rows_written, total_rows)
+        self.done = done                # done(job) when finished, failed or cancelled
+        self.total = 0
+        self.rows = 0
+        self.error = None
+        self.cancelled = False
+        self.elapsed = 0.0
+        self._cancel = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f'export-{self.table_name}', daemon=True)
+        self._thread.start()
+        return self
+
+    def _report(self, rows):
+        self.rows = rows
+        if self.progress:
+            self.progress(rows, self.total)
+
+    def _run(self):
+        start = time.perf_counter()
+        try:
+            self.total = self.db.count_rows(self.table_name)
+            columns, chunks = self.db.iter_table(self.table_name, self.chunk_size)
+            self.rows = export_rows(columns, chunks, self.path, self.fmt, self.compress,
+                                    progress=self._report, cancel=self._cancel)
+        except ExportCancelled:
+            self.cancelled = True
+        except Exception as e:
+            self.error = e
+            print(f"Error exporting {self.table_name}: {e}")
+        self.elapsed = time.perf_counter() - start
+        if self.done:
+            self.done(self)
+
+    def cancel(self):
+        """طلب الإلغاء (يتوقف قبل الدفعة التالية ويحذف الملف الجزئي)"""
+        self._cancel.set()
+
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def wait(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self
+
+
+# Test the module
+if __name__ == "__main__":
+    import tempfile
+    import tracemalloc
+
+    from database import DatabaseManager
+
+    directory = tempfile.mkdtemp(prefix='guardian_export_')
+    db = DatabaseManager(os.path.join(directory, 'export.db'))
+    db.pool.executemany('INSERT INTO activity_logs (timestamp, level, message, source) VALUES (?, ?, ?, ?)',
+                        ((f'2026-01-01 00:{i // 60 % 60:02d}:{i % 60:02d}', 'INFO', f'event {i} ' + 'x' * 80,
+                          'bench') for i in range(300_000)))
+
+    for name in ('logs.csv', 'logs.ndjson.gz'):
+        path = os.path.join(directory, name)
+        tracemalloc.start()
+        job = ExportJob(db, 'activity_logs', path).start().wait()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"{name}: {job.rows:,} rows in {job.elapsed:.1f}s, {os.path.getsize(path) / 1e6:.0f} MB written, "
+              f"peak Python memory {peak / 1e6:.1f} MB")
+
+    job = ExportJob(db, 'activity_logs', os.path.join(directory, 'cancelled.csv'))
+    job.progress = lambda rows, total: rows >= 100_000 and job.cancel()
+    job.start().wait()
+    print(f"Cancelled: {job.cancelled}, partial file left: {os.path.exists(job.path + '.part')}")
+
+    try:
+        ExportJob(db, 'sqlite_master', os.path.join(directory, 'x.csv'))
+    except ValueError as e:
+        print(f"Rejected: {e}")
+
+    db.close()
+    for name in os.listdir(directory):
+        os.remove(os.path.join(directory, name))
+    os.rmdir(directory)
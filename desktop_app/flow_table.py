@@ -0,0 +1,264 @@
+"""
+Flow Table Module
+وحدة جدول التدفقات (Connection Tracking)
+
+الوظائف:
+- تجميع الحزم في تدفقات حسب (proto, src, sport, dst, dport)
+- سجلات مضغوطة في مصفوفات (array) بدل كائن لكل تدفق
+- انتهاء التدفقات عند الخمول (Idle) أو طول المدة (Active)، مع فحص دوري حتى بدون حزم
+- إخلاء الأقدم (LRU) عند الوصول للحد الأقصى لعدد التدفقات (أو لميزانية ذاكرة بالبايت)
+- تصدير التدفقات المنتهية على دفعات إلى SQLite
+"""
+
+import heapq
+import time
+from array import array
+from collections import OrderedDict
+
+from packet_decoder import ETH_P_IP, ip_to_str
+
+END_IDLE = 'idle'
+END_ACTIVE = 'active'
+END_EVICTED = 'evicted'
+END_FLUSH = 'flush'
+
+# Measured cost of one tracked flow: array records plus the OrderedDict entry and int key
+FLOW_BYTES = 224
+
+
+def flow_key(proto, src_ip, src_port, dst_ip, dst_port):
+    """مفتاح التدفق كرقم واحد (أسرع في التجزئة من tuple)"""
+    return (proto << 96) | (src_ip << 64) | (dst_ip << 32) | (src_port << 16) | dst_port
+
+
+def split_flow_key(key):
+    """تفكيك مفتاح التدفق إلى (proto, src_ip, src_port, dst_ip, dst_port)"""
+    return (key >> 96, (key >> 64) & 0xFFFFFFFF, (key >> 16) & 0xFFFF,
+            (key >> 32) & 0xFFFFFFFF, key & 0xFFFF)
+
+
+class FlowTable:
+    """جدول التدفقات مع انتهاء الصلاحية والإخلاء"""
+
+    needs = ('all',)
+
+    def __init__(self, idle_timeout=60, active_timeout=300, max_flows=1_000_000, max_bytes=None,
+                 export_batch=1000, exporter=None, sweep_interval=1.0):
+        self.idle_timeout = idle_timeout
+        self.active_timeout = active_timeout
+        # max_flows caps the number of flows; max_bytes (optional) caps their estimated memory
+        self.max_flows = max_flows if max_bytes is None else min(max_flows, max(1, max_bytes // FLOW_BYTES))
+        self.export_batch = export_batch
+        self.exporter = exporter
+        self.sweep_interval = sweep_interval
+
+        # key -> slot, ordered from least to most recently updated
+        self.flows = OrderedDict()
+        self.free_slots = []
+
+        # Array-backed records, one slot per flow
+        self.packets = array('Q')
+        self.bytes = array('Q')
+        self.first_seen = array('d')
+        self.last_seen = array('d')
+        self.tcp_flags = array('B')
+
+        self.pending = []
+        self.last_sweep = 0.0
+        self.counters = {
+            'created': 0,
+            'expired_idle': 0,
+            'expired_active': 0,
+            'evicted': 0,
+            'exported': 0
+        }
+
+    def __len__(self):
+        return len(self.flows)
+
+    def update(self, key, ts, length, flags=0):
+        """تحديث (أو إنشاء) تدفق بحزمة واحدة"""
+        slot = self.flows.get(key)
+
+        if slot is None:
+            if len(self.flows) >= self.max_flows:
+                old_key, old_slot = self.flows.popitem(last=False)
+                self._export(old_key, old_slot, END_EVICTED)
+                self.free_slots.append(old_slot)
+                self.counters['evicted'] += 1
+
+            if self.free_slots:
+                slot = self.free_slots.pop()
+                self.packets[slot] = 0
+                self.bytes[slot] = 0
+                self.first_seen[slot] = ts
+                self.tcp_flags[slot] = 0
+            else:
+                slot = len(self.packets)
+                self.packets.append(0)
+                self.bytes.append(0)
+                self.first_seen.append(ts)
+                self.last_seen.append(ts)
+                self.tcp_flags.append(0)
+
+            self.flows[key] = slot
+            self.counters['created'] += 1
+
+        else:
+            if ts - self.first_seen[slot] >= self.active_timeout:
+                # Long-lived flow: report what we have and start a new record
+                self._export(key, slot, END_ACTIVE)
+                self.counters['expired_active'] += 1
+                self.packets[slot] = 0
+                self.bytes[slot] = 0
+                self.first_seen[slot] = ts
+                self.tcp_flags[slot] = 0
+            self.flows.move_to_end(key)
+
+        self.packets[slot] += 1
+        self.bytes[slot] += length
+        self.last_seen[slot] = ts
+        self.tcp_flags[slot] |= flags
+
+        if ts - self.last_sweep >= self.sweep_interval:
+            self.expire(ts)
+
+    def process(self, pkt):
+        """تحديث الجدول من حزمة مفكوكة"""
+        if pkt.ethertype == ETH_P_IP:
+            self.update(flow_key(pkt.proto, pkt.src_ip, pkt.src_port, pkt.dst_ip, pkt.dst_port),
+                        pkt.ts, pkt.length, pkt.tcp_flags)
+        return []
+
+    def expire(self, now):
+        """إنهاء التدفقات الخاملة (الأقدم أولاً)"""
+        self.last_sweep = now
+        flows = self.flows
+        expired = 0
+
+        while flows:
+            key = next(iter(flows))
+            slot = flows[key]
+            if now - self.last_seen[slot] < self.idle_timeout:
+                break
+            del flows[key]
+            self._export(key, slot, END_IDLE)
+            self.free_slots.append(slot)
+            expired += 1
+
+        self.counters['expired_idle'] += expired
+        return expired
+
+    def sweep(self, now=None):
+        """
+        فحص دوري مستقل عن وصول الحزم (من خيط الالتقاط عند الخمول)
+        ينهي التدفقات الخاملة ويصدّر الدفعة المعلقة حتى لو لم تكتمل
+        """
+        now = time.time() if now is None else now
+        if now - self.last_sweep < self.sweep_interval:
+            return 0
+        expired = self.expire(now)
+        self.export_pending()
+        return expired
+
+    def _export(self, key, slot, reason):
+        if self.exporter is None:
+            return
+
+        self.pending.append((key, self.packets[slot], self.bytes[slot],
+                             self.first_seen[slot], self.last_seen[slot],
+                             self.tcp_flags[slot], reason))
+        if len(self.pending) >= self.export_batch:
+            self.export_pending()
+
+    def export_pending(self):
+        """تصدير الدفعة الحالية من التدفقات المنتهية"""
+        if not self.pending or self.exporter is None:
+            return 0
+
+        batch = []
+        for key, packets, size, first, last, flags, reason in self.pending:
+            proto, src_ip, src_port, dst_ip, dst_port = split_flow_key(key)
+            batch.append({
+                'proto': proto,
+                'src_ip': ip_to_str(src_ip),
+                'src_port': src_port,
+                'dst_ip': ip_to_str(dst_ip),
+                'dst_port': dst_port,
+                'packets': packets,
+                'bytes': size,
+                'first_seen': first,
+                'last_seen': last,
+                'tcp_flags': flags,
+                'end_reason': reason
+            })
+        self.pending = []
+
+        try:
+            self.exporter(batch)
+            self.counters['exported'] += len(batch)
+        except Exception as e:
+            print(f"Error exporting flows: {e}")
+
+        return len(batch)
+
+    def flush(self):
+        """إنهاء وتصدير جميع التدفقات"""
+        while self.flows:
+            key, slot = self.flows.popitem(last=False)
+            self._export(key, slot, END_FLUSH)
+            self.free_slots.append(slot)
+        self.export_pending()
+        return []
+
+    def top_flows(self, count=10):
+        """أكبر التدفقات الحالية حسب الحجم"""
+        ranked = heapq.nlargest(count, self.flows.items(), key=lambda item: self.bytes[item[1]])
+        result = []
+        for key, slot in ranked:
+            proto, src_ip, src_port, dst_ip, dst_port = split_flow_key(key)
+            result.append({
+                'proto': proto,
+                'src': f"{ip_to_str(src_ip)}:{src_port}",
+                'dst': f"{ip_to_str(dst_ip)}:{dst_port}",
+                'packets': self.packets[slot],
+                'bytes': self.bytes[slot]
+            })
+        return result
+
+    def memory_usage(self):
+        """تقدير استهلاك الذاكرة بالبايت"""
+        arrays = (self.packets, self.bytes, self.first_seen, self.last_seen, self.tcp_flags)
+        # OrderedDict hash entry, linked-list node and the int key per flow
+        return sum(a.itemsize * len(a) for a in arrays) + len(self.flows) * (FLOW_BYTES - 33)
+
+
+# Test the module
+if __name__ == "__main__":
+    import random
+    import time
+
+    exported = []
+    table = FlowTable(max_flows=1_000_000, idle_timeout=3600, active_timeout=7200,
+                      exporter=exported.extend, sweep_interval=3600)
+
+    keys = [flow_key(6, random.getrandbits(32), random.getrandbits(16), 0x0A000001, 443)
+            for _ in range(1_000_000)]
+
+    start = time.perf_counter()
+    for i, key in enumerate(keys):
+        table.update(key, 1.0, 60, 0x02)
+    elapsed = time.perf_counter() - start
+    print(f"Insert: {len(keys) / elapsed:,.0f} flows/s ({len(table):,} concurrent)")
+
+    start = time.perf_counter()
+    for i in range(1_000_000):
+        table.update(keys[i], 2.0, 1500, 0x10)
+    elapsed = time.perf_counter() - start
+    print(f"Update: {1_000_000 / elapsed:,.0f} packets/s")
+
+    print(f"Memory: ~{table.memory_usage() / 1024 / 1024:.0f} MB")
+
+    start = time.perf_counter()
+    table.flush()
+    print(f"Flush/export: {len(exported):,} flows in {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,238 @@
+"""
+Heavy Hitter Monitor Module
+وحدة تتبع أكثر المستخدمين استهلاكاً للشبكة (Top Talkers)
+
+الوظائف:
+- تتبع أثقل المصادر والوجهات والمنافذ حسب الحزم والبايتات
+- ذاكرة ثابتة عبر Space-Saving (بدون تخزين أي حزمة)
+- عتبات تكيفية (EWMA) لكل بُعد بدلاً من رقم ثابت
+- كشف DDoS و Heavy Hitter من الحصة أو المعدل
+"""
+
+import math
+
+from packet_decoder import ETH_P_IP, PROTO_TCP, PROTO_UDP, ip_to_str
+from sketches import SpaceSaving
+
+DIMENSIONS = ('source', 'destination', 'port')
+
+
+class HeavyHitterMonitor:
+    """تتبع Top-K على نوافذ زمنية ثابتة مع تنبيهات تكيفية"""
+
+    needs = ('all',)
+
+    def __init__(self, capacity=128, interval=10, top=10, alpha=0.1, z_threshold=4.0,
+                 share_threshold=0.6, min_packet_rate=500, warmup=6, cooldown=300):
+        self.capacity = capacity
+        self.interval = interval
+        self.top = top
+        self.alpha = alpha
+        self.z_threshold = z_threshold
+        self.share_threshold = share_threshold
+        self.min_packet_rate = min_packet_rate
+        self.warmup = warmup
+        self.cooldown = cooldown
+
+        self.packets = {dim: SpaceSaving(capacity) for dim in DIMENSIONS}
+        self.bytes = {dim: SpaceSaving(capacity) for dim in DIMENSIONS}
+        self.interval_start = None
+        self.last_ts = None
+
+        # EWMA of the heaviest key's packet rate per dimension: [mean, var, count]
+        self.baselines = {dim: [0.0, 0.0, 0] for dim in DIMENSIONS}
+        self.last_alert = {}
+
+        # Last closed interval, replaced atomically for readers in other threads
+        self.latest = {'timestamp': None, 'interval': interval, 'total_packets': 0,
+                       'total_bytes': 0, **{dim: [] for dim in DIMENSIONS}}
+
+    def process(self, pkt):
+        """تحديث العدادات من حزمة مفكوكة"""
+        if pkt.ethertype != ETH_P_IP:
+            return []
+
+        alerts = []
+        ts = self.last_ts = pkt.ts
+        if self.interval_start is None:
+            self.interval_start = ts
+        elif ts - self.interval_start >= self.interval:
+            alerts = self._close_interval(ts)
+
+        length = pkt.length
+        packets, size = self.packets, self.bytes
+        packets['source'].add(pkt.src_ip)
+        size['source'].add(pkt.src_ip, length)
+        packets['destination'].add(pkt.dst_ip)
+        size['destination'].add(pkt.dst_ip, length)
+        if pkt.proto == PROTO_TCP or pkt.proto == PROTO_UDP:
+            port = (pkt.proto << 16) | pkt.dst_port
+            packets['port'].add(port)
+            size['port'].add(port, length)
+
+        return alerts
+
+    def _close_interval(self, now):
+        """إغلاق النافذة الحالية: حساب اللقطة وفحص العتبات"""
+        elapsed = max(now - self.interval_start, 1e-9)
+        snapshot = {
+            'timestamp': now,
+            'interval': elapsed,
+            'total_packets': self.packets['source'].total,
+            'total_bytes': self.bytes['source'].total
+        }
+        alerts = []
+
+        for dim in DIMENSIONS:
+            by_packets = self.packets[dim]
+            by_bytes = self.bytes[dim]
+            total = by_packets.total or 1
+
+            rows = []
+            for key, count, error in by_packets.top(self.top):
+                rows.append({
+                    'key': self._format_key(dim, key),
+                    'packets': count,
+                    'bytes': by_bytes.counts.get(key, 0),
+                    'error': error,
+                    'share': count / total,
+                    'packet_rate': count / elapsed
+                })
+            snapshot[dim] = rows
+
+            if rows:
+                alerts += self._check(dim, rows[0], now)
+
+            by_packets.clear()
+            by_bytes.clear()
+
+        self.latest = snapshot
+        self.interval_start = now
+        return alerts
+
+    def _check(self, dim, heaviest, now):
+        """مقارنة أثقل مفتاح مع خط الأساس التكيفي"""
+        baseline = self.baselines[dim]
+        mean, var, count = baseline
+        rate = heaviest['packet_rate']
+
+        alerts = []
+        if count >= self.warmup and rate >= self.min_packet_rate:
+            sd = math.sqrt(var) if var > 0 else max(mean * 0.1, 1.0)
+            z = (rate - mean) / sd
+            # A dominant share lowers the bar, but the local host routinely owns
+            # most of its own traffic, so the rate must still be unusual
+            if z >= self.z_threshold or (heaviest['share'] >= self.share_threshold
+                                         and z >= self.z_threshold / 2):
+                alerts = self._alert(dim, heaviest, now, z)
+
+        # Learn from clipped values so an ongoing attack does not become normal
+        if count >= self.warmup:
+            rate = min(rate, mean + self.z_threshold * (math.sqrt(var) if var > 0 else mean))
+        if count == 0:
+            baseline[0] = rate
+        else:
+            diff = rate - mean
+            incr = self.alpha * diff
+            baseline[0] = mean + incr
+            baseline[1] = (1 - self.alpha) * (var + diff * incr)
+        baseline[2] = count + 1
+        return alerts
+
+    def _alert(self, dim, heaviest, now, z):
+        key = (dim, heaviest['key'])
+        if now - self.last_alert.get(key, float('-inf')) < self.cooldown:
+            return []
+        self.last_alert[key] = now
+        if len(self.last_alert) > 4096:
+            self.last_alert.pop(next(iter(self.last_alert)))
+
+        details = (f"{heaviest['packet_rate']:,.0f} packets/s, "
+                   f"{heaviest['share']:.0%} of traffic (z={z:.1f})")
+        if dim == 'destination':
+            return [{
+                'type': 'Possible DDoS',
+                'severity': 'High',
+                'description': f"Traffic flood towards {heaviest['key']}: {details}",
+                'source_ip': None,
+                'target_ip': heaviest['key']
+            }]
+        if dim == 'source':
+            return [{
+                'type': 'Heavy Hitter',
+                'severity': 'Medium',
+                'description': f"{heaviest['key']} is dominating traffic: {details}",
+                'source_ip': heaviest['key'],
+                'target_ip': None
+            }]
+        return [{
+            'type': 'Heavy Hitter',
+            'severity': 'Low',
+            'description': f"Traffic surge on port {heaviest['key']}: {details}",
+            'source_ip': None,
+            'target_ip': None
+        }]
+
+    @staticmethod
+    def _format_key(dim, key):
+        if dim == 'port':
+            proto = 'tcp' if key >> 16 == PROTO_TCP else 'udp'
+            return f"{key & 0xFFFF}/{proto}"
+        return ip_to_str(key)
+
+    def flush(self):
+        """إغلاق النافذة الأخيرة (نهاية ملف أو إيقاف الالتقاط)"""
+        if self.interval_start is None or not self.packets['source'].total:
+            return []
+        return self._close_interval(max(self.last_ts, self.interval_start + 1))
+
+    def snapshot_rows(self):
+        """صفوف آخر لقطة بصيغة جدول top_talkers"""
+        snapshot = self.latest
+        rows = []
+        for dim in DIMENSIONS:
+            for rank, row in enumerate(snapshot[dim], 1):
+                rows.append({
+                    'dimension': dim,
+                    'rank': rank,
+                    'key': row['key'],
+                    'packets': row['packets'],
+                    'bytes': row['bytes'],
+                    'share': round(row['share'], 4),
+                    'packet_rate': round(row['packet_rate'], 2)
+                })
+        return rows
+
+
+# Test the module
+if __name__ == "__main__":
+    import random
+    import time
+
+    from packet_decoder import Packet, ip_to_int
+
+    monitor = HeavyHitterMonitor()
+    victim = ip_to_int('10.0.0.5')
+    alerts = []
+    count = 0
+    start = time.perf_counter()
+
+    # 2 minutes of normal traffic, then 30 seconds of flood towards one host
+    for second in range(150):
+        flood = second >= 120
+        for _ in range(3000 if flood else 300):
+            pkt = Packet(1000.0 + second + random.random(), random.randint(60, 1500), ETH_P_IP)
+            pkt.proto = PROTO_TCP
+            pkt.src_ip = random.getrandbits(32) if flood else ip_to_int(f'10.0.0.{random.randint(1, 50)}')
+            pkt.dst_ip = victim if flood else ip_to_int(f'10.0.1.{random.randint(1, 20)}')
+            pkt.dst_port = 80 if flood else random.choice((443, 80, 53, 22))
+            alerts += monitor.process(pkt)
+            count += 1
+
+    elapsed = time.perf_counter() - start
+    alerts += monitor.flush()
+    for alert in alerts:
+        print(f"[{alert['severity']}] {alert['type']}: {alert['description']}")
+    print(f"{count / elapsed:,.0f} packets/s")
+    for row in monitor.snapshot_rows()[:3]:
+        print(row)
@@ -0,0 +1,111 @@
+"""
+Log Queue Module
+وحدة الكتابة المؤجلة لسجل النشاطات (Write-Behind)
+
+الوظائف:
+- إضافة السجلات إلى طابور في الذاكرة بدون انتظار قاعدة البيانات
+- خيط خلفي يكتب السجلات دفعات (كل N سجل أو كل M مللي ثانية)
+- طابور محدود: عند الامتلاء يُحذف الأقدم مع عدّاد للمحذوف
+- تفريغ مضمون عند الإغلاق
+"""
+
+import threading
+import time
+from collections import deque
+
+
+class LogQueue:
+    """طابور سجلات محدود يُفرَّغ في الخلفية عبر flush_fn(records)"""
+
+    def __init__(self, flush_fn, max_records=10000, batch_size=500, interval=0.25, name='log-writer'):
+        self.flush_fn = flush_fn
+        self.batch_size = batch_size
+        self.interval = interval
+        self.records = deque(maxlen=max_records)
+        self.stats = {'queued': 0, 'written': 0, 'dropped': 0, 'batches': 0, 'failed': 0}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()     # one batch in flight, in order
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def put(self, record):
+        """إضافة سجل (لا ينتظر أبداً)"""
+        with self._lock:
+            if self._closed:
+                return False
+            if len(self.records) == self.records.maxlen:
+                self.stats['dropped'] += 1      # deque drops the oldest
+            self.records.append(record)
+            self.stats['queued'] += 1
+            full = len(self.records) >= self.batch_size
+        if full:
+            self._wake.set()
+        return True
+
+    def _take(self):
+        with self._lock:
+            count = min(len(self.records), self.batch_size)
+            return [self.records.popleft() for _ in range(count)]
+
+    def flush(self):
+        """كتابة كل ما في الطابور الآن (في خيط المستدعي)"""
+        with self._flush_lock:
+            while True:
+                batch = self._take()
+                if not batch:
+                    return
+                try:
+                    self.flush_fn(batch)
+                    self.stats['written'] += len(batch)
+                    self.stats['batches'] += 1
+                except Exception as e:
+                    self.stats['failed'] += len(batch)
+                    print(f"Error writing log batch: {e}")
+
+    def discard(self):
+        """حذف ما في الطابور بدون كتابته"""
+        with self._lock:
+            self.records.clear()
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    def close(self):
+        """إيقاف الخيط الخلفي وكتابة الباقي"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._wake.set()
+        self._thread.join()
+        self.flush()
+
+    def __len__(self):
+        return len(self.records)
+
+
+# Test the module
+if __name__ == "__main__":
+    written = []
+
+    def slow_sink(batch):
+        time.sleep(0.002)       # one commit per batch
+        written.extend(batch)
+
+    log_queue = LogQueue(slow_sink, max_records=50000, batch_size=500, interval=0.05)
+    start = time.perf_counter()
+    threads = [threading.Thread(target=lambda n=n: [log_queue.put(('INFO', f"{n}:{i}")) for i in range(20000)])
+               for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    enqueue = time.perf_counter() - start
+    log_queue.close()
+    print(f"80,000 records enqueued in {enqueue * 1e3:.0f} ms, {len(written):,} written "
+          f"in {log_queue.stats['batches']} batches, {log_queue.stats['dropped']} dropped")
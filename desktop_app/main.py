@@ -19,8 +19,8 @@ import requests
 from datetime import datetime
 import sqlite3
 import os
+import re
 import psutil
-import csv
 from tkinter import filedialog
 import subprocess
 import sys
@@ -29,9 +29,20 @@ import sys
 from scanner import NetworkScanner
 from security import SecurityAnalyzer
 from database import DatabaseManager
+from exporter import ExportJob
 from api_client import SmartGuardianAPI
+from capture import RingCapture
+from detectors import default_detectors
+from flow_table import FlowTable
+from heavy_hitters import HeavyHitterMonitor, DIMENSIONS
+from log_queue import LogQueue
+from ring_store import TrafficStore, TOTAL
+from vuln_matcher import vulnerability_alerts
 from tkinter import simpledialog
 
+# Database maintenance period (independent of traffic monitoring and capture)
+MAINTENANCE_INTERVAL_MS = 60_000
+
 class SmartNetworkGuardian:
     def __init__(self, root):
         self.root = root
@@ -42,8 +53,8 @@ class SmartNetworkGuardian:
         base_dir = os.path.dirname(os.path.abspath(__file__))
         db_path = os.path.join(base_dir, 'network_guardian.db')
         self.db = DatabaseManager(db_path=db_path)
-        self.scanner = NetworkScanner()
         self.security = SecurityAnalyzer()
+        self.scanner = NetworkScanner(domain_intel=self.security.domain_intel)
         
         # API Configuration (Django Backend)
         self.api = SmartGuardianAPI()
@@ -54,6 +65,28 @@ class SmartNetworkGuardian:
         self.current_scan_results = {}
         self.monitoring_active = False
         
+        # Live packet capture (Linux, root)
+        self.capture_engine = None
+        self.packet_detectors = []
+        self.flow_table = None
+        self.heavy_hitters = None
+        self.capture_writer = None      # saves capture alerts/flows off the ring thread
+        
+        # Background table export (one at a time)
+        self.export_job = None
+        self.export_buttons = {}
+        
+        # Periodic database maintenance (skipped while the previous run is still going)
+        self.maintenance_active = True
+        self.maintenance_lock = threading.Lock()
+        
+        # Per-second interface counters (memory-mapped ring files)
+        try:
+            self.traffic_store = TrafficStore()
+        except Exception as e:
+            self.traffic_store = None
+            print(f"Error opening traffic store: {e}")
+        
         # Auto-start backend if needed
         self.auto_start_backend()
         
@@ -64,6 +97,7 @@ class SmartNetworkGuardian:
         
         # Start initial checks
         self.perform_startup_checks()
+        self.periodic_maintenance()
     
     def center_window(self):
         """توسيط النافذة على الشاشة"""
@@ -425,10 +459,11 @@ class SmartNetworkGuardian:
             command=self.refresh_devices,
             style='Accent.TButton').pack(side=tk.LEFT, padx=5)
         
-        ttk.Button(control_frame,
+        self.export_buttons['devices'] = ttk.Button(control_frame,
             text="📤 Export List",
             command=self.export_devices,
-            style='Accent.TButton').pack(side=tk.LEFT, padx=5)
+            style='Accent.TButton')
+        self.export_buttons['devices'].pack(side=tk.LEFT, padx=5)
 
         ttk.Button(control_frame,
             text="🗑️ Clear History",
@@ -478,6 +513,26 @@ class SmartNetworkGuardian:
             command=self.view_threats,
             style='Accent.TButton').pack(side=tk.LEFT, padx=5)
         
+        ttk.Button(control_frame,
+            text="📂 Analyze PCAP",
+            command=self.analyze_pcap,
+            style='Accent.TButton').pack(side=tk.LEFT, padx=5)
+        
+        ttk.Button(control_frame,
+            text="📥 Import CVE Feed",
+            command=self.import_cve_feed,
+            style='Accent.TButton').pack(side=tk.LEFT, padx=5)
+        
+        ttk.Button(control_frame,
+            text="🚫 Import Blocklist",
+            command=self.import_blocklist,
+            style='Accent.TButton').pack(side=tk.LEFT, padx=5)
+        
+        ttk.Button(control_frame,
+            text="🌐 Import Domain List",
+            command=self.import_domain_list,
+            style='Accent.TButton').pack(side=tk.LEFT, padx=5)
+        
         # Security Results
         results_frame = ttk.LabelFrame(tab, text=" Security Scan Results ", padding=15)
         results_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
@@ -506,6 +561,28 @@ class SmartNetworkGuardian:
             style='Accent.TButton')
         self.traffic_btn.pack(side=tk.LEFT, padx=5)
         
+        ttk.Label(control_frame,
+            text="Interface:",
+            style='Title.TLabel').pack(side=tk.LEFT, padx=(20, 5))
+        
+        self.traffic_iface = ttk.Combobox(control_frame,
+            values=self.traffic_store.interfaces() if self.traffic_store else [TOTAL],
+            state='readonly',
+            width=15)
+        self.traffic_iface.set(TOTAL)
+        self.traffic_iface.pack(side=tk.LEFT, padx=5)
+        self.traffic_iface.bind('<<ComboboxSelected>>', lambda e: self._draw_traffic_chart())
+        
+        # Throughput chart (last 2 minutes from the ring store)
+        chart_frame = ttk.LabelFrame(tab, text=" Throughput (Mbps) ", padding=15)
+        chart_frame.pack(fill=tk.X, padx=10, pady=5)
+        
+        self.traffic_chart = tk.Canvas(chart_frame,
+            height=160,
+            bg=self.colors['secondary'],
+            highlightthickness=0)
+        self.traffic_chart.pack(fill=tk.X)
+        
         # Traffic display
         traffic_frame = ttk.LabelFrame(tab, text=" Network Traffic ", padding=15)
         traffic_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
@@ -515,6 +592,17 @@ class SmartNetworkGuardian:
             fg=self.colors['info'],
             font=('Consolas', 9))
         self.traffic_text.pack(fill=tk.BOTH, expand=True)
+        
+        # Top talkers (live capture only)
+        talkers_frame = ttk.LabelFrame(tab, text=" Top Talkers ", padding=15)
+        talkers_frame.pack(fill=tk.X, padx=10, pady=5)
+        
+        columns = ('Type', 'Rank', 'Address / Port', 'Packets', 'Bytes', 'Share', 'Packets/s')
+        self.talkers_tree = ttk.Treeview(talkers_frame, columns=columns, show='headings', height=8)
+        for col in columns:
+            self.talkers_tree.heading(col, text=col)
+            self.talkers_tree.column(col, width=120)
+        self.talkers_tree.pack(fill=tk.X)
     
     def init_logs_tab(self):
         """تهيئة تبويب Logs"""
@@ -534,10 +622,11 @@ class SmartNetworkGuardian:
             command=self.clear_logs,
             style='Accent.TButton').pack(side=tk.LEFT, padx=5)
         
-        ttk.Button(control_frame,
+        self.export_buttons['activity_logs'] = ttk.Button(control_frame,
             text="📤 Export Logs",
             command=self.export_logs,
-            style='Accent.TButton').pack(side=tk.LEFT, padx=5)
+            style='Accent.TButton')
+        self.export_buttons['activity_logs'].pack(side=tk.LEFT, padx=5)
         
         # Filter
         ttk.Label(control_frame,
@@ -545,13 +634,53 @@ class SmartNetworkGuardian:
             style='Title.TLabel').pack(side=tk.LEFT, padx=(20, 5))
         
         self.log_filter = ttk.Combobox(control_frame,
-            values=['All', 'Info', 'Warning', 'Error', 'Security'],
+            values=['All', 'INFO', 'WARNING', 'ERROR', 'Security'],
             state='readonly',
             width=15)
         self.log_filter.current(0)
         self.log_filter.pack(side=tk.LEFT, padx=5)
         self.log_filter.bind('<<ComboboxSelected>>', lambda e: self.refresh_logs())
         
+        # Full-text search over logs and alert descriptions
+        search_frame = ttk.Frame(tab)
+        search_frame.pack(fill=tk.X, padx=10)
+        
+        ttk.Label(search_frame,
+            text="Search:",
+            style='Title.TLabel').pack(side=tk.LEFT, padx=5)
+        
+        self.log_search = ttk.Entry(search_frame, width=40)
+        self.log_search.pack(side=tk.LEFT, padx=5)
+        self.log_search.bind('<Return>', lambda e: self.refresh_logs())
+        
+        ttk.Button(search_frame,
+            text="🔍 Search",
+            command=self.refresh_logs,
+            style='Accent.TButton').pack(side=tk.LEFT, padx=5)
+        
+        ttk.Button(search_frame,
+            text="✖ Clear",
+            command=self.clear_log_search,
+            style='Accent.TButton').pack(side=tk.LEFT, padx=5)
+        
+        self.log_search_recent = tk.BooleanVar(value=False)
+        ttk.Checkbutton(search_frame,
+            text="Newest first",
+            variable=self.log_search_recent,
+            command=self.refresh_logs).pack(side=tk.LEFT, padx=5)
+        
+        self.log_page = 0
+        self.log_next_button = ttk.Button(search_frame,
+            text="Next ▶",
+            command=lambda: self.refresh_logs(self.log_page + 1),
+            state=tk.DISABLED)
+        self.log_next_button.pack(side=tk.RIGHT, padx=5)
+        self.log_prev_button = ttk.Button(search_frame,
+            text="◀ Prev",
+            command=lambda: self.refresh_logs(self.log_page - 1),
+            state=tk.DISABLED)
+        self.log_prev_button.pack(side=tk.RIGHT, padx=5)
+        
         # Logs display
         logs_frame = ttk.Frame(tab)
         logs_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
@@ -560,6 +689,7 @@ class SmartNetworkGuardian:
             bg=self.colors['secondary'],
             fg=self.colors['light'],
             font=('Consolas', 9))
+        self.logs_text.tag_config('match', foreground=self.colors['warning'])
         self.logs_text.pack(fill=tk.BOTH, expand=True)
     
     def init_settings_tab(self):
@@ -656,6 +786,23 @@ class SmartNetworkGuardian:
         """إجراء الفحوصات الأولية"""
         threading.Thread(target=self._startup_checks_thread, daemon=True).start()
     
+    def periodic_maintenance(self):
+        """صيانة قاعدة البيانات عند البدء ثم كل MAINTENANCE_INTERVAL_MS (بدون الحاجة لمراقبة الحركة)"""
+        if not self.maintenance_active:
+            return
+        if self.maintenance_lock.acquire(blocking=False):
+            threading.Thread(target=self._maintenance_thread, daemon=True).start()
+        self.root.after(MAINTENANCE_INTERVAL_MS, self.periodic_maintenance)
+    
+    def _maintenance_thread(self):
+        try:
+            # Devices not seen for an hour stop counting as active
+            self.db.expire_active_devices()
+            # Roll finished minutes up into the 1m/1h/1d tables and expire old raw rows and flows
+            self.db.compact_network_stats()
+        finally:
+            self.maintenance_lock.release()
+    
     def _startup_checks_thread(self):
         """فحوصات بدء التشغيل في Thread منفصل"""
         self.update_status("Performing startup checks...")
@@ -667,6 +814,10 @@ class SmartNetworkGuardian:
             self.root.after(0, lambda: self.local_ip_label.config(
                 text=network_info.get('local_ip', 'N/A')))
             
+            # This machine is the target of most alerts: correlate on the other party
+            if network_info.get('local_ip'):
+                self.db.correlator.ignore.add(network_info['local_ip'])
+            
             # Get public IP
             public_ip = self.scanner.get_public_ip()
             if public_ip:
@@ -681,6 +832,15 @@ class SmartNetworkGuardian:
         # Load initial devices
         self.refresh_devices()
         
+        # Train traffic anomaly baselines from the per-second ring store (same resolution
+        # as the live samples), or from the 5-second network_stats rows without it
+        detector = self.security.traffic_detector
+        trained = detector.backfill_from_store(self.traffic_store) if self.traffic_store else 0
+        if not trained:
+            trained = detector.backfill_from_db(self.db)
+        if trained:
+            self.log_activity("INFO", f"Traffic baselines trained from {trained} samples")
+        
         self.update_status("Startup checks completed")
     
     def update_dashboard_info(self, network_info):
@@ -703,9 +863,13 @@ class SmartNetworkGuardian:
         try:
             devices = self.scanner.scan_network()
             
-            # Save to database
-            for device in devices:
-                self.db.save_device(device)
+            # Save to database (one transaction)
+            self.db.save_devices(devices)
+            
+            # Known-bad addresses and host names on the network
+            for alert in self.security.threat_intel.check_devices(devices) + self.scanner.take_hostname_alerts():
+                self.db.save_security_alert(alert)
+                self.log_activity("Security", alert['description'])
             
             # Update UI
             self.root.after(0, lambda: self.refresh_devices())
@@ -943,17 +1107,24 @@ class SmartNetworkGuardian:
                 # Perform periodic scans
                 devices = self.scanner.scan_network()
                 
-                # Check for new devices
-                for device in devices:
-                    if self.db.is_new_device(device):
-                        self.log_activity("WARNING", f"New device detected: {device['ip']}")
-                        if self.alert_new_device.get():
-                            self.root.after(0, lambda d=device: messagebox.showwarning(
-                                "New Device", 
-                                f"New device detected!\nIP: {d['ip']}\nMAC: {d['mac']}"
-                            ))
+                # Save the whole scan at once; the upsert reports which devices are new
+                result = self.db.save_devices(devices)
                     
-                    self.db.save_device(device)
+                for device in result['new']:
+                    self.log_activity("WARNING", f"New device detected: {device['ip']}")
+                    for alert in self.security.threat_intel.check_devices([device]):
+                        self.db.save_security_alert(alert)
+                        self.log_activity("Security", alert['description'])
+                    if self.alert_new_device.get():
+                        self.root.after(0, lambda d=device: messagebox.showwarning(
+                            "New Device", 
+                            f"New device detected!\nIP: {d['ip']}\nMAC: {d['mac']}"
+                        ))
+                    
+                # Host names on the domain blocklist (resolved during the scan)
+                for alert in self.scanner.take_hostname_alerts():
+                    self.db.save_security_alert(alert)
+                    self.log_activity("Security", alert['description'])
                 
                 # Auto sync if connected
                 if self.api_connected:
@@ -993,26 +1164,51 @@ class SmartNetworkGuardian:
     
     def export_devices(self):
         """تصدير قائمة الأجهزة"""
+        self.export_table('devices', "Export Devices List")
+    
+    def export_table(self, table_name, title):
+        """تصدير جدول بالتدفق في الخلفية (الضغط مرة أخرى على الزر يلغي التصدير الجاري)"""
+        if self.export_job and self.export_job.running():
+            self.export_job.cancel()
+            self.update_status("Cancelling export...")
+            return
+        
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".csv",
+            filetypes=[("CSV files", "*.csv"), ("CSV (gzip)", "*.csv.gz"),
+                       ("NDJSON files", "*.ndjson"), ("NDJSON (gzip)", "*.ndjson.gz"),
+                       ("JSON files", "*.json"), ("All files", "*.*")],
+            title=title
+        )
+        if not file_path:
+            return
+        
+        button = self.export_buttons.get(table_name)
+        label = button.cget('text') if button else None
+        
+        def _progress(rows, total):
+            # Status bar only: update_status() would also log every chunk
+            if total:
+                message = f"Exporting {table_name}: {rows:,} / {total:,} rows ({rows / total:.0%})"
+                self.root.after(0, lambda: self.status_var.set(message))
+        
+        def _done(job):
+            def _finish():
+                if button:
+                    button.config(text=label)
+                if job.cancelled:
+                    self.update_status(f"Export of {table_name} cancelled")
+                elif job.error:
+                    messagebox.showerror("Export Error", f"Failed to export: {str(job.error)}")
+                else:
+                    messagebox.showinfo("Export", f"Successfully exported {job.rows:,} rows")
+                    self.update_status(f"{table_name} exported to {os.path.basename(job.path)}")
+            self.root.after(0, _finish)
+        
         try:
-            devices = self.db.get_all_devices()
-            if not devices:
-                messagebox.showwarning("Export", "No devices to export")
-                return
-            
-            file_path = filedialog.asksaveasfilename(
-                defaultextension=".csv",
-                filetypes=[("CSV files", "*.csv"), ("All files", "*.*")],
-                title="Export Devices List"
-            )
-            
-            if file_path:
-                with open(file_path, 'w', newline='', encoding='utf-8') as f:
-                    writer = csv.DictWriter(f, fieldnames=devices[0].keys())
-                    writer.writeheader()
-                    writer.writerows(devices)
-                
-                messagebox.showinfo("Export", f"Successfully exported {len(devices)} devices")
-                self.update_status("Devices list exported")
+            self.export_job = ExportJob(self.db, table_name, file_path, progress=_progress, done=_done).start()
+            if button:
+                button.config(text="⏹️ Cancel Export")
         except Exception as e:
             messagebox.showerror("Export Error", f"Failed to export: {str(e)}")
     
@@ -1040,11 +1236,28 @@ class SmartNetworkGuardian:
                 # Scan most common ports
                 results = self.security.scan_port_range(target, 20, 1024)
                 
+                # Known vulnerabilities (CVE) become security alerts
+                vulns = [v for port_info in results for v in port_info.get('vulnerabilities', [])]
+                for alert in vulnerability_alerts(vulns):
+                    self.db.save_security_alert(alert)
+                
                 def _update_ui():
                     if results:
                         for port_info in results:
                             self.security_results.insert(tk.END, 
                                 f"[OPEN] Port {port_info['port']} ({port_info['service']})\n", 'danger')
+                            if port_info.get('cert_cn'):
+                                self.security_results.insert(tk.END,
+                                    f"    TLS certificate: {port_info['cert_cn']}\n")
+                            if port_info.get('banner'):
+                                self.security_results.insert(tk.END,
+                                    f"    Banner: {port_info['banner'].splitlines()[0][:100]}\n")
+                            for vuln in port_info.get('vulnerabilities', [])[:10]:
+                                self.security_results.insert(tk.END,
+                                    f"    [{vuln['severity']}] {vuln['id']} - {vuln['description'][:100]}\n", 'danger')
+                        if not self.security.vuln_matcher.available:
+                            self.security_results.insert(tk.END,
+                                "\nNo CVE index loaded - use 'Import CVE Feed' to enable vulnerability matching.\n")
                     else:
                         self.security_results.insert(tk.END, "No common open ports found.\n", 'success')
                     
@@ -1057,6 +1270,120 @@ class SmartNetworkGuardian:
         
         threading.Thread(target=_scan_thread, daemon=True).start()
     
+    def analyze_pcap(self):
+        """تحليل ملف التقاط (pcap / pcapng)"""
+        file_path = filedialog.askopenfilename(
+            filetypes=[("Capture files", "*.pcap *.pcapng *.cap"), ("All files", "*.*")],
+            title="Open Capture File"
+        )
+        if not file_path:
+            return
+        
+        self.notebook.select(self.tabs['security'])
+        self.security_results.delete(1.0, tk.END)
+        self.security_results.insert(tk.END, f"Analyzing {os.path.basename(file_path)}...\n\n")
+        self.update_status("Analyzing capture file...")
+        
+        def _progress(packets, bytes_read, total_bytes):
+            percent = bytes_read * 100 // max(total_bytes, 1)
+            self.root.after(0, lambda: self.status_var.set(
+                f"Analyzing capture: {packets:,} packets ({percent}%)"))
+        
+        def _analyze_thread():
+            result = self.security.analyze_capture_file(file_path, db=self.db, progress=_progress)
+            
+            def _update_ui():
+                if result.get('error'):
+                    self.security_results.insert(tk.END, f"Error: {result['error']}\n")
+                self.security_results.insert(tk.END,
+                    f"Packets: {result['packets']:,} | Duration: {result['duration']:.1f}s "
+                    f"({result['packets_per_second']:,.0f} packets/s)\n\n")
+                
+                if result['alerts']:
+                    for alert in result['alerts']:
+                        self.security_results.insert(tk.END,
+                            f"[{alert['severity']}] {alert['type']}: {alert['description']}\n")
+                else:
+                    self.security_results.insert(tk.END, "✅ No suspicious patterns found\n")
+                
+                self.update_status(f"Capture analysis completed - {len(result['alerts'])} findings")
+            
+            self.root.after(0, _update_ui)
+        
+        threading.Thread(target=_analyze_thread, daemon=True).start()
+    
+    def import_cve_feed(self):
+        """استيراد ملف NVD JSON إلى فهرس الثغرات المحلي"""
+        file_paths = filedialog.askopenfilenames(
+            filetypes=[("NVD feeds", "*.json *.json.gz"), ("All files", "*.*")],
+            title="Import NVD CVE Feed"
+        )
+        if not file_paths:
+            return
+        
+        self.update_status("Importing CVE feed...")
+        
+        def _progress(count):
+            self.root.after(0, lambda: self.status_var.set(f"Importing CVE feed: {count:,} CVEs"))
+        
+        def _import_thread():
+            try:
+                count = self.security.vuln_matcher.import_feed(list(file_paths), progress=_progress)
+                self.update_status(f"CVE feed imported - {count:,} CVEs indexed")
+            except Exception as e:
+                self.update_status(f"CVE import error: {str(e)}")
+        
+        threading.Thread(target=_import_thread, daemon=True).start()
+    
+    def import_blocklist(self):
+        """استيراد قوائم حظر العناوين (IP / CIDR)"""
+        file_paths = filedialog.askopenfilenames(
+            filetypes=[("Blocklists", "*.txt *.netset *.ipset *.list"), ("All files", "*.*")],
+            title="Import IP Blocklists"
+        )
+        if not file_paths:
+            return
+        
+        self.update_status("Importing blocklists...")
+        
+        def _progress(count):
+            self.root.after(0, lambda: self.status_var.set(f"Importing blocklists: {count:,} entries"))
+        
+        def _import_thread():
+            try:
+                result = self.security.threat_intel.import_lists(list(file_paths), progress=_progress)
+                self.security.intel_detector.flush()
+                self.update_status(f"Blocklists imported - {result['entries']:,} entries, "
+                                   f"{result['intervals']:,} ranges")
+            except Exception as e:
+                self.update_status(f"Blocklist import error: {str(e)}")
+        
+        threading.Thread(target=_import_thread, daemon=True).start()
+    
+    def import_domain_list(self):
+        """استيراد قوائم حظر النطاقات (hosts / قوائم نصية)"""
+        file_paths = filedialog.askopenfilenames(
+            filetypes=[("Domain lists", "*.txt *.hosts *.list"), ("All files", "*.*")],
+            title="Import Domain Blocklists"
+        )
+        if not file_paths:
+            return
+        
+        self.update_status("Importing domain lists...")
+        
+        def _progress(count):
+            self.root.after(0, lambda: self.status_var.set(f"Importing domain lists: {count:,} entries"))
+        
+        def _import_thread():
+            try:
+                result = self.security.domain_intel.import_lists(list(file_paths), progress=_progress)
+                self.update_status(f"Domain lists imported - {result['domains']:,} domains "
+                                   f"from {result['entries']:,} entries")
+            except Exception as e:
+                self.update_status(f"Domain list import error: {str(e)}")
+        
+        threading.Thread(target=_import_thread, daemon=True).start()
+    
     def view_threats(self):
         """عرض التهديدات"""
         try:
@@ -1102,6 +1429,7 @@ class SmartNetworkGuardian:
         if getattr(self, 'traffic_monitor_active', False):
             self.traffic_monitor_active = False
             self.traffic_btn.config(text="▶️ Start Capture")
+            self._stop_packet_capture()
             self.update_status("Traffic monitoring stopped")
         else:
             self.traffic_monitor_active = True
@@ -1109,8 +1437,136 @@ class SmartNetworkGuardian:
             self.update_status("Traffic monitoring started")
             self.traffic_text.delete(1.0, tk.END)
             self.traffic_text.insert(tk.END, "Starting Traffic Monitor (Speed/Usage)...\n\n")
+            if self._start_packet_capture():
+                self.traffic_text.insert(tk.END, "Live packet capture enabled (TPACKET_V3 ring)\n\n")
             threading.Thread(target=self._traffic_monitor_thread, daemon=True).start()
+    
+    def _start_packet_capture(self):
+        """تشغيل الالتقاط الحي للحزم إذا كان مدعوماً"""
+        if self.capture_engine or not RingCapture.available():
+            return False
+        
+        try:
+            # The ring thread only enqueues; a worker does the database writes
+            self.capture_writer = LogQueue(self._write_capture_records, max_records=20000,
+                batch_size=200, interval=0.25, name='capture-writer')
+            self.flow_table = FlowTable(exporter=lambda flows: self.capture_writer.put(('flows', flows)))
+            self.heavy_hitters = HeavyHitterMonitor()
+            self.packet_detectors = (default_detectors(dns_monitor=self.security.dns_monitor,
+                                                       signature_engine=self.security.signature_engine,
+                                                       intel_detector=self.security.intel_detector)
+                                     + [self.flow_table, self.heavy_hitters])
+            self.capture_engine = RingCapture(bpf_filter="ip or arp")
+            # Idle flows are expired on the capture thread even when no packets arrive
+            self.capture_engine.start(self._on_capture_block, on_tick=self.flow_table.sweep)
+            self.log_activity("INFO", "Live packet capture started")
+            if not self.capture_engine.filter_applied:
+                self.log_activity("WARNING", "Capture filter not applied: every frame is decoded in user space")
+            return True
+        except Exception as e:
+            self.capture_engine = None
+            if self.capture_writer:
+                self.capture_writer.close()
+                self.capture_writer = None
+            self.log_activity("ERROR", f"Live capture unavailable: {str(e)}")
+            return False
+    
+    def _stop_packet_capture(self):
+        """إيقاف الالتقاط الحي"""
+        if self.capture_engine:
+            self.capture_engine.stop()
+            self.capture_engine = None
+            
+            # Export whatever is still being tracked
+            if self.flow_table:
+                self.flow_table.flush()
+                self.flow_table = None
+            if self.heavy_hitters:
+                self.heavy_hitters.flush()
+                self.db.save_top_talkers(self.heavy_hitters.snapshot_rows())
+                self.heavy_hitters = None
+            
+            # Write out everything the ring thread queued
+            if self.capture_writer:
+                self.capture_writer.close()
+                dropped = self.capture_writer.stats['dropped']
+                if dropped:
+                    self.log_activity("WARNING", f"Capture writer queue overflowed: {dropped} records dropped")
+                self.capture_writer = None
+    
+    def _on_capture_block(self, packets):
+        """معالجة كتلة من الحزم الملتقطة (Thread الالتقاط، بدون انتظار قاعدة البيانات)"""
+        for pkt in packets:
+            for detector in self.packet_detectors:
+                for alert in detector.process(pkt):
+                    self.capture_writer.put(('alert', alert))
+    
+    def _write_capture_records(self, records):
+        """حفظ تنبيهات وتدفقات الالتقاط دفعة واحدة (خيط capture-writer)"""
+        flows = []
+        for kind, item in records:
+            if kind == 'flows':
+                flows.extend(item)
+            else:
+                self.db.save_security_alert(item)
+                self.log_activity("Security", f"{item['type']}: {item['description']}")
+        if flows:
+            self.db.save_flows(flows)
 
+    def _draw_traffic_chart(self, seconds=120):
+        """رسم معدل الاستقبال/الإرسال لآخر دقيقتين من ملفات العينات الحلقية"""
+        if not self.traffic_store:
+            return
+        
+        canvas = self.traffic_chart
+        canvas.delete('all')
+        width = canvas.winfo_width() or 800
+        height = int(canvas['height'])
+        
+        interfaces = self.traffic_store.interfaces()
+        if tuple(interfaces) != tuple(self.traffic_iface['values']):
+            self.traffic_iface['values'] = interfaces
+        
+        now = time.time()
+        samples = self.traffic_store.range(self.traffic_iface.get() or TOTAL, now - seconds, None,
+                                           ('timestamp', 'rx_bytes', 'tx_bytes'))
+        if len(samples['timestamp']) < 2:
+            canvas.create_text(width // 2, height // 2, text="Waiting for samples...",
+                fill=self.colors['light'])
+            return
+        
+        rx = samples['rx_bytes'] * 8 / 1_000_000
+        tx = samples['tx_bytes'] * 8 / 1_000_000
+        peak = max(float(rx.max()), float(tx.max()), 0.001)
+        xs = (samples['timestamp'] - (now - seconds)) / seconds * (width - 10) + 5
+        
+        series = ((rx, self.colors['info'], 'Download'), (tx, self.colors['warning'], 'Upload'))
+        for row, (values, color, label) in enumerate(series):
+            ys = height - 5 - values / peak * (height - 25)
+            canvas.create_line(*[coord for point in zip(xs.tolist(), ys.tolist()) for coord in point],
+                fill=color, width=2)
+            canvas.create_text(width - 8, 4 + row * 14, anchor=tk.NE, text=label, fill=color)
+        
+        canvas.create_text(8, 4, anchor=tk.NW, fill=self.colors['light'],
+            text=f"Peak {peak:.2f} Mbps | Download {rx[-1]:.2f} | Upload {tx[-1]:.2f}")
+    
+    def _show_top_talkers(self, rows):
+        """عرض أكثر المستخدمين استهلاكاً في تبويب Traffic"""
+        for item in self.talkers_tree.get_children():
+            self.talkers_tree.delete(item)
+        
+        for dim in DIMENSIONS:
+            for row in [r for r in rows if r['dimension'] == dim][:5]:
+                self.talkers_tree.insert('', tk.END, values=(
+                    dim.title(),
+                    row['rank'],
+                    row['key'],
+                    f"{row['packets']:,}",
+                    self._format_bytes(row['bytes']),
+                    f"{row['share']:.1%}",
+                    f"{row['packet_rate']:,.0f}"
+                ))
+    
     def _format_bytes(self, size):
         power = 2**10
         n = 0
@@ -1122,6 +1578,9 @@ class SmartNetworkGuardian:
 
     def _traffic_monitor_thread(self):
         last_net_io = psutil.net_io_counters()
+        # Counters from a previous run would turn the whole pause into one sample
+        if self.traffic_store:
+            self.traffic_store.reset()
         tick = 0
         
         while getattr(self, 'traffic_monitor_active', False):
@@ -1129,29 +1588,67 @@ class SmartNetworkGuardian:
             tick += 1
             
             current_net_io = psutil.net_io_counters()
+            if self.traffic_store:
+                self.traffic_store.record(psutil.net_io_counters(pernic=True))
             
             bytes_sent = current_net_io.bytes_sent - last_net_io.bytes_sent
             bytes_recv = current_net_io.bytes_recv - last_net_io.bytes_recv
+            packets_sent = current_net_io.packets_sent - last_net_io.packets_sent
+            packets_recv = current_net_io.packets_recv - last_net_io.packets_recv
             
             last_net_io = current_net_io
             
+            # Feed the per-second sample to the anomaly detector
+            anomalies = self.security.traffic_detector.update({
+                'download_speed': (bytes_recv * 8) / 1_000_000,
+                'upload_speed': (bytes_sent * 8) / 1_000_000,
+                'packets_recv': packets_recv,
+                'packets_sent': packets_sent
+            })
+            
+            # Without live capture, watch inbound connections for scans
+            if not self.capture_engine and tick % 2 == 0:
+                anomalies += self.security.check_connection_attempts()
+            
+            for alert in anomalies:
+                self.db.save_security_alert(alert)
+                self.log_activity("Security", alert['description'])
+            
             # Update UI
             timestamp = datetime.now().strftime("%H:%M:%S")
             msg = f"[{timestamp}] Upload: {self._format_bytes(bytes_sent)}/s | Download: {self._format_bytes(bytes_recv)}/s\n"
+            for alert in anomalies:
+                msg += f"[{timestamp}] 🚨 {alert['description']}\n"
+            if self.capture_engine and tick % 5 == 0:
+                capture_stats = self.capture_engine.stats()
+                msg += (f"[{timestamp}] Capture: {capture_stats['packets']:,} packets | "
+                        f"Drops: {capture_stats['drops']:,} ({capture_stats['drop_rate']:.2%}) | "
+                        f"Flows: {len(self.flow_table or ()):,}\n")
             
             def _update():
                 self.traffic_text.insert(tk.END, msg)
                 self.traffic_text.see(tk.END)
+                self._draw_traffic_chart()
                 
             self.root.after(0, _update)
             
+            # Top talkers from the heavy-hitter monitor
+            if self.heavy_hitters and tick % 5 == 0:
+                rows = self.heavy_hitters.snapshot_rows()
+                self.root.after(0, lambda rows=rows: self._show_top_talkers(rows))
+                if tick % 60 == 0 and rows:
+                    self.db.save_top_talkers(rows)
+            
             # Save to DB every 5 seconds
             if tick % 5 == 0:
                 try:
                     # Get device counts
                     dev_stats = self.db.get_statistics()
                     
-                    # Convert to Mbps for DB (approx)
+                    # Convert to Mbps for DB (averaged over the 5 seconds when the ring store is available)
+                    if self.traffic_store:
+                        rates = self.traffic_store.rates(seconds=5)
+                        bytes_recv, bytes_sent = rates['rx_bytes'], rates['tx_bytes']
                     down_speed = (bytes_recv * 8) / 1_000_000
                     up_speed = (bytes_sent * 8) / 1_000_000
                     
@@ -1172,12 +1669,20 @@ class SmartNetworkGuardian:
                 except Exception as e:
                     print(f"Error saving stats: {e}")
     
-    def refresh_logs(self):
-        """تحديث السجلات"""
+    def refresh_logs(self, page=0):
+        """تحديث السجلات (أو نتائج البحث إن لم يكن مربع البحث فارغاً)"""
         self.logs_text.delete(1.0, tk.END)
         
         filter_type = self.log_filter.get()
-        logs = self.db.get_logs(filter_type if filter_type != 'All' else None)
+        level = filter_type if filter_type != 'All' else None
+        text = self.log_search.get().strip()
+        if text:
+            self.show_log_search(text, level, page)
+            return
+        
+        self.log_prev_button.config(state=tk.DISABLED)
+        self.log_next_button.config(state=tk.DISABLED)
+        logs = self.db.get_logs(level)
         
         for log in logs:
             timestamp = log.get('timestamp', '')
@@ -1186,6 +1691,41 @@ class SmartNetworkGuardian:
             
             self.logs_text.insert(tk.END, f"[{timestamp}] [{level}] {message}\n")
     
+    def show_log_search(self, text, level=None, page=0, page_size=100):
+        """عرض صفحة من نتائج البحث مع تمييز الكلمات المطابقة"""
+        # Alerts have severities, not log levels: a level filter searches logs only
+        found = self.db.search(text,
+            source='logs' if level else None,
+            level=level,
+            order='recent' if self.log_search_recent.get() else 'rank',
+            limit=page_size,
+            offset=page * page_size,
+            markers=('\x02', '\x03'))
+        results = found['results']
+        
+        self.log_page = page
+        self.log_prev_button.config(state=tk.NORMAL if page > 0 else tk.DISABLED)
+        self.log_next_button.config(state=tk.NORMAL if found['has_more'] else tk.DISABLED)
+        
+        if not results:
+            self.logs_text.insert(tk.END, f"No results for: {text}\n")
+            return
+        
+        first = page * page_size + 1
+        self.logs_text.insert(tk.END, f"Results {first}-{first + len(results) - 1} for: {text}\n\n")
+        for result in results:
+            kind = 'ALERT' if result['kind'] == 'alerts' else 'LOG'
+            self.logs_text.insert(tk.END, f"[{result['timestamp']}] [{result['level']}] [{kind}] ")
+            # Snippet text alternates plain / matched between the markers
+            for index, part in enumerate(re.split('[\x02\x03]', result['snippet'] or '')):
+                self.logs_text.insert(tk.END, part, 'match' if index % 2 else ())
+            self.logs_text.insert(tk.END, "\n")
+    
+    def clear_log_search(self):
+        """مسح مربع البحث والعودة لآخر السجلات"""
+        self.log_search.delete(0, tk.END)
+        self.refresh_logs()
+    
     def clear_logs(self):
         """مسح السجلات"""
         if messagebox.askyesno("Clear Logs", "Are you sure you want to clear all logs?"):
@@ -1195,28 +1735,7 @@ class SmartNetworkGuardian:
     
     def export_logs(self):
         """تصدير السجلات"""
-        try:
-            logs = self.db.get_logs(None)
-            if not logs:
-                messagebox.showwarning("Export", "No logs to export")
-                return
-            
-            file_path = filedialog.asksaveasfilename(
-                defaultextension=".csv",
-                filetypes=[("CSV files", "*.csv"), ("All files", "*.*")],
-                title="Export Activity Logs"
-            )
-            
-            if file_path:
-                with open(file_path, 'w', newline='', encoding='utf-8') as f:
-                    writer = csv.DictWriter(f, fieldnames=['id', 'timestamp', 'level', 'message'])
-                    writer.writeheader()
-                    writer.writerows(logs)
-                
-                messagebox.showinfo("Export", f"Successfully exported {len(logs)} logs")
-                self.update_status("Logs exported")
-        except Exception as e:
-            messagebox.showerror("Export Error", f"Failed to export: {str(e)}")
+        self.export_table('activity_logs', "Export Activity Logs")
     
     def test_backend_connection(self):
         """اختبار الاتصال بـ Backend"""
@@ -1347,6 +1866,11 @@ class SmartNetworkGuardian:
         """إغلاق آمن للتطبيق"""
         if messagebox.askyesno("Exit", "Are you sure you want to exit?"):
             self.monitoring_active = False
+            self.traffic_monitor_active = False
+            self.maintenance_active = False
+            self._stop_packet_capture()
+            if self.traffic_store:
+                self.traffic_store.flush()
             
             # إغلاق الـ Backend إذا قمنا بتشغيله
             if self.backend_process:
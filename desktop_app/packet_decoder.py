@@ -0,0 +1,362 @@
+"""
+Packet Header Decoder Module
+وحدة فك ترويسات الحزم
+
+الوظائف:
+- فك ترويسات Ethernet / VLAN / Linux SLL
+- فك ترويسات ARP و IPv4 و TCP و UDP و ICMP
+- قراءة مباشرة من memoryview بدون إنشاء كائنات Scapy
+- تحليل رسائل DNS الأساسية
+"""
+
+import socket
+import struct
+
+# Link types (pcap / pcapng)
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+
+# EtherTypes
+ETH_P_IP = 0x0800
+ETH_P_ARP = 0x0806
+ETH_P_8021Q = 0x8100
+
+# IP protocols
+PROTO_ICMP = 1
+PROTO_TCP = 6
+PROTO_UDP = 17
+
+# TCP flags
+TCP_FIN = 0x01
+TCP_SYN = 0x02
+TCP_RST = 0x04
+TCP_PSH = 0x08
+TCP_ACK = 0x10
+
+# Payload filter that inspects every TCP / UDP port: {proto: (only, skip)}
+# only: the only destination ports wanted (None = any), skip: source or
+# destination ports never wanted
+ALL_PAYLOAD = {PROTO_TCP: (None, frozenset()), PROTO_UDP: (None, frozenset())}
+
+_u16 = struct.Struct('!H').unpack_from
+_ipv4 = struct.Struct('!BBHHHBBHII').unpack_from
+_ports = struct.Struct('!HH').unpack_from
+_arp = struct.Struct('!HHBBH6sI6sI').unpack_from
+_dns_header = struct.Struct('!HHHHHH').unpack_from
+_dns_rr = struct.Struct('!HHIH').unpack_from
+
+
+class Packet:
+    """حزمة مفكوكة (ترويسات فقط)"""
+
+    __slots__ = ('ts', 'length', 'ethertype', 'proto',
+                 'src_ip', 'dst_ip', 'src_port', 'dst_port', 'tcp_flags',
+                 'src_mac', 'dst_mac', 'arp_op',
+                 'buf', 'payload_offset', 'payload_length')
+
+    def __init__(self, ts, length, ethertype):
+        self.ts = ts
+        self.length = length
+        self.ethertype = ethertype
+        self.proto = 0
+        self.src_ip = 0
+        self.dst_ip = 0
+        self.src_port = 0
+        self.dst_port = 0
+        self.tcp_flags = 0
+        self.src_mac = None
+        self.dst_mac = None
+        self.arp_op = 0
+        self.buf = None
+        self.payload_offset = 0
+        self.payload_length = 0
+
+    def payload(self):
+        """الحصول على البيانات (memoryview بدون نسخ)"""
+        if self.buf is None or not self.payload_length:
+            return memoryview(b'')
+        return memoryview(self.buf)[self.payload_offset:self.payload_offset + self.payload_length]
+
+    @property
+    def is_syn(self):
+        return self.proto == PROTO_TCP and (self.tcp_flags & (TCP_SYN | TCP_ACK)) == TCP_SYN
+
+
+def ip_to_str(ip):
+    """تحويل عنوان IPv4 من رقم إلى نص"""
+    return socket.inet_ntoa(ip.to_bytes(4, 'big'))
+
+
+def ip_to_int(ip):
+    """تحويل عنوان IPv4 من نص إلى رقم"""
+    return int.from_bytes(socket.inet_aton(ip), 'big')
+
+
+def mac_to_str(mac):
+    """تحويل MAC من bytes إلى نص"""
+    return ':'.join(f'{b:02x}' for b in mac)
+
+
+def payload_wanted(filters, proto, src_port, dst_port):
+    """هل يطلب فلتر المحتوى {proto: (only, skip)} حزمة بهذه المنافذ"""
+    entry = filters.get(proto)
+    if entry is None:
+        return False
+    only, skip = entry
+    if only is not None:
+        return dst_port in only
+    return src_port not in skip and dst_port not in skip
+
+
+def accept_frame(buf, offset, caplen, linktype, wants, payload_filters=None):
+    """
+    فحص سريع لنوع الإطار قبل فكه
+    wants: مجموعة من 'arp' و 'syn' و 'dns' و 'payload'
+    payload_filters: المنافذ التي يُطلب محتواها {proto: (only, skip)} (الافتراضي كل المنافذ)
+    حزم TCP / UDP بلا محتوى لا تُقبل من أجل 'payload'
+    """
+    if linktype == LINKTYPE_ETHERNET:
+        if caplen < 14:
+            return False
+        ethertype = _u16(buf, offset + 12)[0]
+        net = offset + 14
+        if ethertype == ETH_P_8021Q:
+            if caplen < 18:
+                return False
+            ethertype = _u16(buf, offset + 16)[0]
+            net += 4
+    elif linktype == LINKTYPE_LINUX_SLL:
+        if caplen < 16:
+            return False
+        ethertype = _u16(buf, offset + 14)[0]
+        net = offset + 16
+    elif linktype == LINKTYPE_RAW or linktype == LINKTYPE_IPV4:
+        ethertype = ETH_P_IP
+        net = offset
+    else:
+        return False
+
+    if ethertype == ETH_P_ARP:
+        return 'arp' in wants
+    if ethertype != ETH_P_IP or offset + caplen - net < 20:
+        return False
+
+    end = offset + caplen
+    proto = buf[net + 9]
+    l4 = net + (buf[net] & 0x0F) * 4
+    total = _u16(buf, net + 2)[0]
+    ip_end = min(end, net + total) if total else end
+    if 'payload' not in wants:
+        payload_filters = {}
+    elif payload_filters is None:
+        payload_filters = ALL_PAYLOAD
+
+    if proto == PROTO_TCP:
+        if l4 + 20 > end:
+            return False
+        if 'syn' in wants and buf[l4 + 13] & (TCP_SYN | TCP_ACK) == TCP_SYN:
+            return True
+        return (l4 + (buf[l4 + 12] >> 4) * 4 < ip_end
+                and payload_wanted(payload_filters, proto, *_ports(buf, l4)))
+    if proto == PROTO_UDP:
+        if l4 + 8 > end:
+            return False
+        src_port, dst_port = _ports(buf, l4)
+        if 'dns' in wants and (src_port == 53 or dst_port == 53):
+            return True
+        return l4 + 8 < ip_end and payload_wanted(payload_filters, proto, src_port, dst_port)
+    return False
+
+
+def decode_frame(buf, offset, caplen, wirelen, ts, linktype=LINKTYPE_ETHERNET):
+    """
+    فك ترويسات إطار واحد من buffer
+    يعيد Packet أو None إذا لم يكن الإطار IPv4 أو ARP
+    """
+    end = offset + caplen
+
+    if linktype == LINKTYPE_ETHERNET:
+        if caplen < 14:
+            return None
+        ethertype = _u16(buf, offset + 12)[0]
+        net = offset + 14
+        if ethertype == ETH_P_8021Q:
+            if caplen < 18:
+                return None
+            ethertype = _u16(buf, offset + 16)[0]
+            net += 4
+    elif linktype == LINKTYPE_LINUX_SLL:
+        if caplen < 16:
+            return None
+        ethertype = _u16(buf, offset + 14)[0]
+        net = offset + 16
+    elif linktype == LINKTYPE_RAW or linktype == LINKTYPE_IPV4:
+        ethertype = ETH_P_IP
+        net = offset
+    else:
+        return None
+
+    if ethertype == ETH_P_IP:
+        if end - net < 20:
+            return None
+        (ver_ihl, _tos, total_len, _ident, frag, _ttl, proto,
+         _csum, src_ip, dst_ip) = _ipv4(buf, net)
+        if ver_ihl >> 4 != 4:
+            return None
+
+        pkt = Packet(ts, wirelen, ethertype)
+        pkt.proto = proto
+        pkt.src_ip = src_ip
+        pkt.dst_ip = dst_ip
+
+        # Only the first fragment carries the transport header
+        if frag & 0x1FFF:
+            return pkt
+
+        l4 = net + (ver_ihl & 0x0F) * 4
+        ip_end = min(end, net + total_len) if total_len else end
+
+        if proto == PROTO_TCP:
+            if ip_end - l4 < 20:
+                return pkt
+            pkt.src_port, pkt.dst_port = _ports(buf, l4)
+            pkt.tcp_flags = buf[l4 + 13]
+            data = l4 + (buf[l4 + 12] >> 4) * 4
+        elif proto == PROTO_UDP:
+            if ip_end - l4 < 8:
+                return pkt
+            pkt.src_port, pkt.dst_port = _ports(buf, l4)
+            data = l4 + 8
+        else:
+            data = l4
+
+        if data < ip_end:
+            pkt.buf = buf
+            pkt.payload_offset = data
+            pkt.payload_length = ip_end - data
+        return pkt
+
+    if ethertype == ETH_P_ARP:
+        if end - net < 28:
+            return None
+        (hwtype, ptype, hlen, plen, op, sha, spa, tha, tpa) = _arp(buf, net)
+        if hlen != 6 or plen != 4:
+            return None
+
+        pkt = Packet(ts, wirelen, ethertype)
+        pkt.arp_op = op
+        pkt.src_mac = sha
+        pkt.dst_mac = tha
+        pkt.src_ip = spa
+        pkt.dst_ip = tpa
+        return pkt
+
+    return None
+
+
+def _read_name(buf, offset, end, start):
+    """قراءة اسم DNS مع دعم الضغط"""
+    labels = []
+    jumped = False
+    next_offset = offset
+    hops = 0
+
+    while offset < end:
+        length = buf[offset]
+        if length == 0:
+            offset += 1
+            break
+        if length & 0xC0 == 0xC0:
+            if offset + 1 >= end or hops > 16:
+                raise ValueError('Bad DNS pointer')
+            pointer = ((length & 0x3F) << 8) | buf[offset + 1]
+            if not jumped:
+                next_offset = offset + 2
+            jumped = True
+            offset = start + pointer
+            hops += 1
+            continue
+        offset += 1
+        labels.append(bytes(buf[offset:offset + length]).decode('ascii', 'replace').lower())
+        offset += length
+    else:
+        raise ValueError('Truncated DNS name')
+
+    if not jumped:
+        next_offset = offset
+    return '.'.join(labels), next_offset
+
+
+def parse_dns(buf, offset, length):
+    """
+    تحليل رسالة DNS
+    يعيد dict يحتوي على id و الأسئلة والإجابات (A / AAAA / CNAME)
+    وأسماء خوادم NS في قسم Authority
+    """
+    end = offset + length
+    if length < 12:
+        return None
+
+    try:
+        txid, flags, qdcount, ancount, nscount, _arcount = _dns_header(buf, offset)
+        pos = offset + 12
+
+        questions = []
+        for _ in range(min(qdcount, 8)):
+            name, pos = _read_name(buf, pos, end, offset)
+            if pos + 4 > end:
+                return None
+            qtype, _qclass = _ports(buf, pos)
+            pos += 4
+            questions.append((name, qtype))
+
+        answers = []
+        authority = []
+        for _ in range(min(ancount, 64)):
+            name, pos = _read_name(buf, pos, end, offset)
+            if pos + 10 > end:
+                break
+            rtype, _rclass, ttl, rdlength = _dns_rr(buf, pos)
+            pos += 10
+            if pos + rdlength > end:
+                break
+
+            if rtype == 1 and rdlength == 4:
+                value = socket.inet_ntoa(bytes(buf[pos:pos + 4]))
+            elif rtype == 28 and rdlength == 16:
+                value = socket.inet_ntop(socket.AF_INET6, bytes(buf[pos:pos + 16]))
+            elif rtype == 5:
+                value, _ = _read_name(buf, pos, end, offset)
+            else:
+                value = None
+
+            if value is not None:
+                answers.append((name, rtype, ttl, value))
+            pos += rdlength
+        else:
+            # Only reached when every answer was read, so pos is at the authority section
+            for _ in range(min(nscount, 16) if ancount <= 64 else 0):
+                _name, pos = _read_name(buf, pos, end, offset)
+                if pos + 10 > end:
+                    break
+                rtype, _rclass, _ttl, rdlength = _dns_rr(buf, pos)
+                pos += 10
+                if pos + rdlength > end:
+                    break
+                if rtype == 2:
+                    authority.append(_read_name(buf, pos, end, offset)[0])
+                pos += rdlength
+
+        return {
+            'id': txid,
+            'response': bool(flags & 0x8000),
+            'rcode': flags & 0x000F,
+            'questions': questions,
+            'answers': answers,
+            'authority': authority
+        }
+
+    except (ValueError, IndexError, struct.error):
+        return None
@@ -0,0 +1,495 @@
+"""
+Offline PCAP Analysis Module
+وحدة تحليل ملفات الالتقاط (PCAP) بدون اتصال
+
+الوظائف:
+- قراءة ملفات pcap و pcapng كبيرة عبر mmap بدون تحميلها للذاكرة
+- تحليل الترويسات عبر struct على memoryview (بدون كائنات Scapy)
+- تشغيل كاشفات ARP / Port Scan / DNS على تدفق الحزم
+- حفظ النتائج في جدول security_alerts
+"""
+
+import mmap
+import os
+import struct
+import time
+
+from packet_decoder import (
+    decode_frame, accept_frame, ALL_PAYLOAD, LINKTYPE_ETHERNET, ETH_P_IP, ETH_P_ARP,
+    ETH_P_8021Q, PROTO_TCP, PROTO_UDP
+)
+from detectors import default_detectors
+
+PCAP_MAGIC_US = 0xA1B2C3D4
+PCAP_MAGIC_NS = 0xA1B23C4D
+PCAPNG_SHB = 0x0A0D0D0A
+PCAPNG_BYTE_ORDER = 0x1A2B3C4D
+
+PCAPNG_IDB = 0x00000001
+PCAPNG_SPB = 0x00000003
+PCAPNG_EPB = 0x00000006
+
+# Offline analysis throughput target (packets/s) checked by the benchmark
+TARGET_PACKETS_PER_SECOND = 1_000_000
+
+
+class PcapFile:
+    """قارئ ملفات pcap / pcapng عبر mmap"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._mmap = None
+        self.buf = None
+        self.format = None
+        self.linktype = LINKTYPE_ETHERNET
+        self.size = os.path.getsize(path)
+        self.packets_read = 0
+
+        if self.size < 24:
+            self.close()
+            raise ValueError(f"Not a capture file: {path}")
+
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.buf = memoryview(self._mmap)
+        self._detect_format()
+
+    def _detect_format(self):
+        magic_le = struct.unpack_from('<I', self.buf, 0)[0]
+        magic_be = struct.unpack_from('>I', self.buf, 0)[0]
+
+        if magic_le == PCAPNG_SHB:
+            self.format = 'pcapng'
+            return
+
+        for endian, magic in (('<', magic_le), ('>', magic_be)):
+            if magic in (PCAP_MAGIC_US, PCAP_MAGIC_NS):
+                self.format = 'pcap'
+                self.endian = endian
+                self.ts_scale = 1e-9 if magic == PCAP_MAGIC_NS else 1e-6
+                self.linktype = struct.unpack_from(endian + 'I', self.buf, 20)[0] & 0x0FFFFFFF
+                return
+
+        self.close()
+        raise ValueError(f"Unsupported capture format: {self.path}")
+
+    def records(self, wants=None, progress=None, payload_filters=None):
+        """
+        المرور على السجلات
+        يعيد (timestamp, linktype, offset, caplen, wirelen) لكل حزمة
+        wants: مجموعة اختيارية من ('arp', 'syn', 'dns', 'payload') لتخطي الحزم غير المطلوبة مبكراً
+        payload_filters: منافذ 'payload' المطلوبة {proto: (only, skip)} (الافتراضي كل المنافذ)
+        progress: دالة اختيارية تستقبل (packets, bytes_read, total_bytes)
+        """
+        if self.format == 'pcap':
+            return self._pcap_records(wants, progress, payload_filters)
+        return self._pcapng_records(wants, progress, payload_filters)
+
+    def _pcap_records(self, wants, progress, payload_filters):
+        buf = self.buf
+        size = self.size
+        header = struct.Struct(self.endian + 'IIII').unpack_from
+        scale = self.ts_scale
+        linktype = self.linktype
+        offset = 24
+        count = 0
+
+        prefilter = wants is not None and linktype == LINKTYPE_ETHERNET
+        want_arp = prefilter and 'arp' in wants
+        want_syn = prefilter and 'syn' in wants
+        want_dns = prefilter and 'dns' in wants
+        filters = {}
+        if prefilter and 'payload' in wants:
+            filters = ALL_PAYLOAD if payload_filters is None else payload_filters
+        tcp_payload = PROTO_TCP in filters
+        tcp_only, tcp_skip = filters.get(PROTO_TCP, (None, ()))
+        udp_payload = PROTO_UDP in filters
+        udp_only, udp_skip = filters.get(PROTO_UDP, (None, ()))
+
+        while offset + 16 <= size:
+            sec, frac, caplen, wirelen = header(buf, offset)
+            offset += 16
+            end = offset + caplen
+            if end > size:
+                break
+
+            count += 1
+            if progress and not count & 0xFFFFF:
+                progress(count, offset, size)
+
+            # Inlined accept_frame() for plain Ethernet: this loop is the hot path.
+            # Only SYNs, DNS and frames carrying payload on an inspected port pass
+            if prefilter and caplen >= 34:
+                ethertype = (buf[offset + 12] << 8) | buf[offset + 13]
+                if ethertype == ETH_P_IP:
+                    proto = buf[offset + 23]
+                    l4 = offset + 14 + (buf[offset + 14] & 0x0F) * 4
+                    if proto == PROTO_TCP:
+                        if l4 + 20 > end:
+                            offset = end
+                            continue
+                        if not (want_syn and buf[l4 + 13] & 0x12 == 0x02):
+                            if not tcp_payload:
+                                offset = end
+                                continue
+                            total = (buf[offset + 16] << 8) | buf[offset + 17]
+                            if l4 + (buf[l4 + 12] >> 4) * 4 >= (min(end, offset + 14 + total) if total else end):
+                                offset = end
+                                continue
+                            dport = (buf[l4 + 2] << 8) | buf[l4 + 3]
+                            if (dport not in tcp_only if tcp_only is not None
+                                    else dport in tcp_skip or (buf[l4] << 8) | buf[l4 + 1] in tcp_skip):
+                                offset = end
+                                continue
+                    elif proto == PROTO_UDP:
+                        if l4 + 8 > end:
+                            offset = end
+                            continue
+                        sport = (buf[l4] << 8) | buf[l4 + 1]
+                        dport = (buf[l4 + 2] << 8) | buf[l4 + 3]
+                        if not (want_dns and (sport == 53 or dport == 53)):
+                            if not udp_payload:
+                                offset = end
+                                continue
+                            total = (buf[offset + 16] << 8) | buf[offset + 17]
+                            if l4 + 8 >= (min(end, offset + 14 + total) if total else end):
+                                offset = end
+                                continue
+                            if (dport not in udp_only if udp_only is not None
+                                    else dport in udp_skip or sport in udp_skip):
+                                offset = end
+                                continue
+                    else:
+                        offset = end
+                        continue
+                elif ethertype == ETH_P_ARP:
+                    if not want_arp:
+                        offset = end
+                        continue
+                elif ethertype != ETH_P_8021Q:
+                    offset = end
+                    continue
+
+            yield sec + frac * scale, linktype, offset, caplen, wirelen
+            offset = end
+
+        self.packets_read = count
+
+    def _pcapng_records(self, wants, progress, payload_filters):
+        buf = self.buf
+        size = self.size
+        offset = 0
+        endian = '<'
+        interfaces = []
+        count = 0
+
+        while offset + 12 <= size:
+            block_type = struct.unpack_from(endian + 'I', buf, offset)[0]
+
+            if block_type == PCAPNG_SHB:
+                # Section header decides byte order for the whole section
+                magic = struct.unpack_from('<I', buf, offset + 8)[0]
+                endian = '<' if magic == PCAPNG_BYTE_ORDER else '>'
+                interfaces = []
+
+            block_len = struct.unpack_from(endian + 'I', buf, offset + 4)[0]
+            if block_len < 12 or offset + block_len > size:
+                break
+            body = offset + 8
+            record = None
+
+            if block_type == PCAPNG_EPB:
+                iface, ts_high, ts_low, caplen, wirelen = struct.unpack_from(endian + 'IIIII', buf, body)
+                linktype, scale = interfaces[iface] if iface < len(interfaces) else (LINKTYPE_ETHERNET, 1e-6)
+                record = (((ts_high << 32) | ts_low) * scale, linktype, body + 20, caplen, wirelen)
+
+            elif block_type == PCAPNG_SPB:
+                wirelen = struct.unpack_from(endian + 'I', buf, body)[0]
+                caplen = min(wirelen, block_len - 16)
+                linktype, scale = interfaces[0] if interfaces else (LINKTYPE_ETHERNET, 1e-6)
+                record = (0.0, linktype, body + 4, caplen, wirelen)
+
+            elif block_type == PCAPNG_IDB:
+                linktype = struct.unpack_from(endian + 'H', buf, body)[0]
+                interfaces.append((linktype, self._idb_ts_scale(body + 8, offset + block_len - 4, endian)))
+
+            offset += block_len
+
+            if record is not None:
+                count += 1
+                if progress and not count & 0xFFFFF:
+                    progress(count, offset, size)
+                if wants is None or accept_frame(buf, record[2], record[3], record[1], wants, payload_filters):
+                    yield record
+
+        self.packets_read = count
+
+    def _idb_ts_scale(self, offset, end, endian):
+        """قراءة دقة الطابع الزمني (if_tsresol) من خيارات الواجهة"""
+        while offset + 4 <= end:
+            code, length = struct.unpack_from(endian + 'HH', self.buf, offset)
+            if code == 0:
+                break
+            if code == 9 and length >= 1:
+                resol = self.buf[offset + 4]
+                if resol & 0x80:
+                    return 2.0 ** -(resol & 0x7F)
+                return 10.0 ** -resol
+            offset += 4 + ((length + 3) & ~3)
+        return 1e-6
+
+    def close(self):
+        """إغلاق الملف وتحرير الـ mmap"""
+        if self.buf is not None:
+            self.buf.release()
+            self.buf = None
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def merge_payload_filters(first, second):
+    """دمج فلترَي محتوى {proto: (only, skip)}: الحزمة مطلوبة إن طلبها أيّ منهما"""
+    if first is None:
+        return second
+    merged = dict(first)
+    for proto, (only, skip) in second.items():
+        if proto not in merged:
+            merged[proto] = (only, skip)
+            continue
+        other_only, other_skip = merged[proto]
+        if only is not None and other_only is not None:
+            merged[proto] = (only | other_only, frozenset())
+        elif only is None and other_only is None:
+            merged[proto] = (None, skip & other_skip)
+        else:
+            # One wants any port outside its skip set, the other a few more ports
+            ports, skip = (only, other_skip) if only is not None else (other_only, skip)
+            merged[proto] = (None, skip - ports)
+    return merged
+
+
+class OfflineAnalyzer:
+    """تحليل ملف التقاط وتشغيل الكاشفات عليه"""
+
+    def __init__(self, db=None, detectors=None):
+        self.db = db
+        self.detectors = detectors if detectors is not None else default_detectors()
+
+    def analyze(self, path, progress=None):
+        """
+        تحليل ملف pcap / pcapng
+        progress: دالة اختيارية تستقبل (packets, bytes_read, total_bytes)
+        """
+        summary = {
+            'file': path,
+            'packets': 0,
+            'decoded': 0,
+            'skipped': 0,
+            'alerts': [],
+            'duration': 0.0,
+            'packets_per_second': 0.0
+        }
+
+        start = time.perf_counter()
+        detectors = [d.process for d in self.detectors]
+        alerts = summary['alerts']
+        decoded = 0
+        passed = 0
+
+        # Let the reader skip frames that no detector consumes
+        wants = set()
+        payload_filters = None
+        for detector in self.detectors:
+            needs = getattr(detector, 'needs', ('all',))
+            wants.update(needs)
+            if 'payload' in needs:
+                payload_filter = getattr(detector, 'payload_filter', None)
+                payload_filters = merge_payload_filters(
+                    payload_filters, payload_filter() if payload_filter else ALL_PAYLOAD)
+        if 'all' in wants:
+            wants = None
+
+        try:
+            with PcapFile(path) as pcap:
+                buf = pcap.buf
+                for ts, linktype, offset, caplen, wirelen in pcap.records(wants, progress, payload_filters):
+                    passed += 1
+                    pkt = decode_frame(buf, offset, caplen, wirelen, ts, linktype)
+                    if pkt is not None:
+                        decoded += 1
+                        for process in detectors:
+                            found = process(pkt)
+                            if found:
+                                alerts.extend(found)
+
+                summary['packets'] = pcap.packets_read
+                # Frames the prefilter dropped before decoding
+                summary['skipped'] = pcap.packets_read - passed
+
+                for detector in self.detectors:
+                    alerts.extend(detector.flush())
+
+        except Exception as e:
+            print(f"Error analyzing capture: {e}")
+            summary['error'] = str(e)
+
+        summary['decoded'] = decoded
+        summary['duration'] = time.perf_counter() - start
+        if summary['duration'] > 0:
+            summary['packets_per_second'] = summary['packets'] / summary['duration']
+
+        if self.db:
+            for alert in alerts:
+                alert = dict(alert, description=f"[PCAP {os.path.basename(path)}] {alert['description']}")
+                self.db.save_security_alert(alert)
+
+        return summary
+
+
+# Synthetic traffic mix: (share, frame kind)
+SYNTHETIC_MIX = (
+    (0.35, 'tcp_data'),     # HTTP / TLS segments carrying payload
+    (0.31, 'tcp_ack'),      # bare ACKs
+    (0.03, 'tcp_syn'),      # connection attempts (a few from one scanning host)
+    (0.18, 'udp_data'),     # QUIC / NTP / syslog
+    (0.06, 'dns'),          # query + response pairs (about 12% of frames)
+    (0.04, 'arp'),
+    (0.03, 'icmp'),
+)
+
+
+def write_synthetic_pcap(path, count, seed=1):
+    """
+    إنشاء ملف pcap تجريبي بمزيج بروتوكولات واقعي (لاختبار الأداء)
+    المزيج في SYNTHETIC_MIX؛ الحزم تحمل بيانات فعلية وتتوزع على عدة أجهزة ومنافذ
+    """
+    import random
+
+    rng = random.Random(seed)
+    hosts = [0x0A000000 | i for i in range(2, 60)]
+    servers = [0x5DB8D822, 0x8EFAB80E, 0x68109C1A, 0xACD9A84E]
+
+    def ether(ethertype):
+        return b'\x00\x11\x22\x33\x44\x55' + b'\x66\x77\x88\x99\xaa\xbb' + struct.pack('!H', ethertype)
+
+    def ipv4(proto, src, dst, payload):
+        return struct.pack('!BBHHHBBHII', 0x45, 0, 20 + len(payload), 0, 0, 64, proto, 0, src, dst) + payload
+
+    def tcp(src, dst, sport, dport, flags, payload=b''):
+        return ether(0x0800) + ipv4(6, src, dst, struct.pack('!HHIIBBHHH', sport, dport, 1, 1, 0x50, flags,
+                                                              1024, 0, 0) + payload)
+
+    def udp(src, dst, sport, dport, payload):
+        return ether(0x0800) + ipv4(17, src, dst, struct.pack('!HHHH', sport, dport, 8 + len(payload), 0) + payload)
+
+    def dns(i):
+        # A query and its response, written back to back
+        name = b'\x03www' + bytes([len(f'site{i}')]) + f'site{i}'.encode() + b'\x03com\x00\x00\x01\x00\x01'
+        client, port = rng.choice(hosts), 40000 + rng.randrange(20000)
+        answer = b'\xc0\x0c\x00\x01\x00\x01\x00\x00\x01\x2c\x00\x04' + struct.pack('!I', servers[i % len(servers)])
+        return [udp(client, 0x0A000001, port, 53, struct.pack('!HHHHHH', i, 0x0100, 1, 0, 0, 0) + name),
+                udp(0x0A000001, client, 53, port, struct.pack('!HHHHHH', i, 0x8180, 1, 1, 0, 0) + name + answer)]
+
+    requests = [f"GET /page{i}.html HTTP/1.1\r\nHost: site{i}.com\r\nUser-Agent: Mozilla/5.0\r\n\r\n".encode()
+                for i in range(20)]
+
+    def build(kind):
+        host, server = rng.choice(hosts), rng.choice(servers)
+        port = 50000 + rng.randrange(2000)
+        if kind == 'tcp_data':
+            if rng.random() < 0.3:
+                return tcp(host, server, port, 80, 0x18, rng.choice(requests))
+            payload = rng.randbytes(rng.choice((120, 400, 1200)))
+            return tcp(server, host, 443, port, 0x18, b'\x17\x03\x03' + payload)
+        if kind == 'tcp_ack':
+            return tcp(host, server, port, 443, 0x10)
+        if kind == 'tcp_syn':
+            if rng.random() < 0.2:
+                return tcp(0x0A000063, host, 40000, rng.randint(1, 1024), 0x02)
+            return tcp(host, server, port, rng.choice((80, 443)), 0x02)
+        if kind == 'udp_data':
+            dport, size = rng.choice(((443, 1200), (443, 300), (123, 48), (514, 150)))
+            return udp(host, server, port, dport, rng.randbytes(size))
+        if kind == 'dns':
+            return dns(rng.randrange(500))      # counts as two frames
+        if kind == 'arp':
+            return ether(0x0806) + struct.pack('!HHBBH6sI6sI', 1, 0x0800, 6, 4, rng.choice((1, 2)),
+                                               b'\x02\x00' + struct.pack('!I', host), host, b'\x00' * 6, 0x0A000001)
+        return ether(0x0800) + ipv4(1, host, server, b'\x08\x00\x00\x00' + rng.randbytes(60))
+
+    # A pool of distinct frames per kind, drawn in the SYNTHETIC_MIX proportions
+    pools = {kind: [build(kind) for _ in range(512)] for _, kind in SYNTHETIC_MIX}
+    kinds = rng.choices([kind for _, kind in SYNTHETIC_MIX], [share for share, _ in SYNTHETIC_MIX], k=count)
+
+    with open(path, 'wb') as f:
+        f.write(struct.pack('<IHHiIII', PCAP_MAGIC_US, 2, 4, 0, 0, 65535, LINKTYPE_ETHERNET))
+        written = 0
+        for kind in kinds:
+            item = rng.choice(pools[kind])
+            for frame in (item if isinstance(item, list) else (item,)):
+                if written == count:
+                    return
+                f.write(struct.pack('<IIII', written // 1000, written % 1000 * 1000, len(frame), len(frame)))
+                f.write(frame)
+                written += 1
+
+
+# Test the module
+if __name__ == "__main__":
+    import argparse
+    import sys
+    import tempfile
+
+    parser = argparse.ArgumentParser(description="Offline PCAP analysis")
+    parser.add_argument('capture', nargs='?', help="pcap / pcapng file")
+    parser.add_argument('--db', help="Store findings in this database")
+    parser.add_argument('--flows', action='store_true',
+                        help="Aggregate flows and export them to --db")
+    parser.add_argument('--benchmark', type=int, metavar='N',
+                        help="Benchmark on N synthetic packets")
+    args = parser.parse_args()
+
+    benchmark = bool(args.benchmark or not args.capture)
+    if benchmark:
+        count = args.benchmark or 1_000_000
+        path = os.path.join(tempfile.gettempdir(), 'guardian_bench.pcap')
+        print(f"Writing {count} synthetic packets to {path}...")
+        write_synthetic_pcap(path, count)
+        args.capture = path
+
+    db = None
+    if args.db:
+        from database import DatabaseManager
+        db = DatabaseManager(args.db)
+
+    detectors = default_detectors()
+    if args.flows and db:
+        from flow_table import FlowTable
+        detectors.append(FlowTable(exporter=db.save_flows))
+
+    result = OfflineAnalyzer(db=db, detectors=detectors).analyze(args.capture)
+    print(f"Packets: {result['packets']:,} (decoded {result['decoded']:,}, "
+          f"skipped by the prefilter {result['skipped']:,})")
+    print(f"Duration: {result['duration']:.2f}s - {result['packets_per_second']:,.0f} packets/s")
+    print(f"Alerts: {len(result['alerts'])}")
+    for alert in result['alerts'][:20]:
+        print(f"  [{alert['severity']}] {alert['type']}: {alert['description']}")
+
+    if db:
+        db.close()
+
+    # The benchmark fails visibly when it misses the throughput target
+    if benchmark:
+        missed = result['packets_per_second'] < TARGET_PACKETS_PER_SECOND
+        print(f"Target {TARGET_PACKETS_PER_SECOND:,} packets/s: {'MISSED' if missed else 'met'}")
+        sys.exit(1 if missed else 0)
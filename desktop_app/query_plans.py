@@ -0,0 +1,259 @@
+"""
+Query Plan Check Module
+وحدة فحص خطط الاستعلامات (EXPLAIN QUERY PLAN)
+
+الوظائف:
+- إنشاء قاعدة بيانات كبيرة ببيانات تجريبية
+- تشغيل كل دوال DatabaseManager وتسجيل أوامر SQL التي تنفذها
+- فحص خطة كل أمر والفشل إذا لجأ أي منها إلى مسح جدول كامل
+"""
+
+import argparse
+import os
+import random
+import re
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from database import DatabaseManager
+from exporter import EXPORT_TABLES
+
+_EXPORTS = '|'.join(EXPORT_TABLES)
+
+# Statements that read a whole table by design (counts and exports of the
+# whitelisted tables, "clear all", loading the device index, the whole stats
+# history for anomaly training, the statistics counters rebuild and FTS5
+# reading its own small config table)
+EXPECTED_SCANS = [
+    re.compile(rf'^SELECT COUNT\(\*\) FROM ({_EXPORTS})$'),
+    re.compile(rf'^SELECT \* FROM ({_EXPORTS})$'),
+    re.compile(r'^DELETE FROM (activity_logs|devices)$'),
+    re.compile(r'^SELECT [\w, ]+ FROM devices$'),
+    re.compile(r'^SELECT .+ FROM network_stats ORDER BY timestamp ASC$'),
+    re.compile(r'^UPDATE stats_counters SET .+ WHERE id = 1$'),
+    re.compile(r"^SELECT k, v FROM 'main'\.'\w+_fts_config'$"),
+]
+_LIMITED = re.compile(r'\bLIMIT \d+$')
+
+# Public methods exercise() does not call directly: the lifecycle (run by the
+# constructor and check_query_plans itself) and correlate_alert, which only runs
+# inside save_security_alert's write transaction
+NOT_EXERCISED = {'connect', 'create_tables', 'migrate', 'load_devices', 'close', 'correlate_alert'}
+
+_PLANNED = re.compile(r'^\s*(SELECT|UPDATE|DELETE|WITH)\b', re.IGNORECASE)
+_SPACES = re.compile(r'\s+')
+
+
+def seed(db, scale=1.0):
+    """ملء قاعدة البيانات ببيانات تجريبية بحجم سجل طويل (scale يصغّر الأحجام)"""
+    random.seed(7)
+    devices, logs, alerts, stats, scans = (int(n * scale) for n in (5000, 100000, 30000, 50000, 5000))
+    now = datetime.now()
+
+    def ts(max_days=90):
+        return (now - timedelta(seconds=random.randint(0, max_days * 86400))).strftime('%Y-%m-%d %H:%M:%S')
+
+    def _seed(conn):
+        conn.executemany('''
+            INSERT INTO devices (ip, mac, hostname, vendor, status, first_seen, last_seen)
+            VALUES (?, ?, ?, 'Unknown', 'Active', ?, ?)
+        ''', [(f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}",
+               '02:00:00:%02x:%02x:%02x' % (i >> 16 & 255, i >> 8 & 255, i & 255),
+               f"host-{i}", ts(), ts(7)) for i in range(devices)])
+        conn.executemany('''
+            INSERT INTO activity_logs (timestamp, level, message, source) VALUES (?, ?, ?, 'seed')
+        ''', [(ts(), random.choice(['INFO', 'WARNING', 'ERROR', 'Security']), f"event {i}")
+              for i in range(logs)])
+        conn.executemany('''
+            INSERT INTO security_alerts
+            (timestamp, alert_type, severity, description, source_ip, status, resolved, fingerprint, occurrences, last_seen)
+            VALUES (?, 'Port Scan', ?, ?, ?, ?, ?, ?, 1, ?)
+        ''', [(ts(), random.choice(['Low', 'Medium', 'High', 'Critical']), f"alert {i}", f"10.0.0.{i % 250}",
+               status, int(status == 'Resolved'), f"{i:064x}", ts())
+              for i, status in ((i, random.choice(['New', 'Synced', 'Resolved'])) for i in range(alerts))])
+        conn.executemany('''
+            INSERT INTO network_stats (timestamp, total_devices, active_devices, download_speed, upload_speed)
+            VALUES (?, ?, ?, ?, ?)
+        ''', [(ts(), 50, 40, random.random() * 100, random.random() * 20) for _ in range(stats)])
+        conn.executemany('''
+            INSERT INTO scan_history (timestamp, scan_type, duration, devices_found, status) VALUES (?, 'Quick', 1.0, 10, 'Done')
+        ''', [(ts(),) for _ in range(scans)])
+        conn.executemany('''
+            INSERT INTO incidents (id, title, severity, status, first_seen, last_seen, alert_count, entities)
+            VALUES (?, 'Port Scan', 'High', ?, ?, ?, 1, '10.0.0.1')
+        ''', [(i + 1, random.choice(['Open', 'Resolved']), ts(), ts()) for i in range(alerts // 10)])
+        conn.executemany('INSERT INTO incident_alerts (incident_id, alert_id) VALUES (?, ?)',
+                         [(i // 10 + 1, i + 1) for i in range(alerts)])
+        conn.execute('ANALYZE')
+
+    db.pool.write(_seed)
+    db.load_devices()
+
+
+class _Recorder:
+    """يمرّر الاستدعاءات إلى DatabaseManager ويسجّل أسماء الدوال المستدعاة"""
+
+    def __init__(self, db):
+        self._db = db
+        self.called = set()
+
+    def __getattr__(self, name):
+        self.called.add(name)
+        return getattr(self._db, name)
+
+
+def unexercised(called):
+    """دوال DatabaseManager العامة التي لم يستدعها exercise()"""
+    public = {name for name, value in vars(DatabaseManager).items()
+              if callable(value) and not name.startswith('_')}
+    return sorted(public - NOT_EXERCISED - called)
+
+
+def exercise(db):
+    """استدعاء كل دوال DatabaseManager مرة واحدة"""
+    device = {'ip': '10.0.0.5', 'mac': '02:00:00:00:00:05', 'hostname': 'host-5'}
+    db.save_devices([device, {'ip': '192.168.50.1', 'mac': 'Unknown'}])
+    db.save_device(device)
+    db.get_all_devices()
+    db.get_device('10.0.0.5')
+    db.is_new_device(device)
+    db.is_new_device({'ip': '10.0.0.6'})
+    db.mark_device_trusted('10.0.0.5')
+    db.get_device_index_stats()
+    db.log_activity('INFO', 'plan check')
+    db.get_logs()
+    db.get_logs('Security')
+    db.search('event 42')
+    db.search('10.0.0.9', source='alerts', order='recent')
+    db.search('event', source='logs', level='Security', offset=50)
+    db.load_open_alerts()
+    alert = {'type': 'Port Scan', 'severity': 'High', 'description': 'Port scan from 10.0.0.9',
+             'source_ip': '10.0.0.9', 'target_ip': '10.0.0.1'}
+    db.save_security_alert(alert)
+    db.save_security_alert(alert)
+    db.load_open_incidents()
+    db.get_incidents()
+    db.get_incidents(status=None)
+    db.resolve_incident(1)
+    db.get_security_alerts()
+    db.get_security_alerts(status=None)
+    db.resolve_alert(1)
+    db.mark_alert_synced(2)
+    db.save_network_stats({'total_devices': 1})
+    db.get_network_stats()
+    for tier in ('raw', '1m', '1h', '1d'):
+        db.get_network_stats(hours=24, tier=tier)
+    db.compact_network_stats()
+    db.get_network_stats_series(['download_speed'], hours=24)
+    db.get_network_stats_series(['download_speed'])
+    for _ in db.iter_network_stats_series(['download_speed', 'upload_speed'], hours=24):
+        pass
+    db.save_flows([{'proto': 6, 'src_ip': '10.0.0.1', 'src_port': 1, 'dst_ip': '10.0.0.2', 'dst_port': 2,
+                    'packets': 1, 'bytes': 60, 'first_seen': 0.0, 'last_seen': 1.0, 'tcp_flags': 2,
+                    'end_reason': 'fin'}])
+    db.save_top_talkers([{'dimension': 'src_ip', 'rank': 1, 'key': '10.0.0.1', 'packets': 1, 'bytes': 60,
+                          'share': 1.0, 'packet_rate': 1.0}])
+    db.get_top_talkers()
+    db.save_scan_history({'type': 'Quick', 'duration': 1.0, 'devices_found': 1})
+    db.get_scan_history()
+    db.save_setting('plan_check', '1')
+    db.get_setting('plan_check')
+    db.expire_active_devices()
+    db.get_statistics()
+    db.check_statistics()
+    db.rebuild_statistics()
+    db.export_data('settings')
+    db.count_rows('activity_logs')
+    for _ in db.iter_table('scan_history', chunk_size=1000)[1]:
+        pass
+    db.rebuild_search_index()
+    db.clear_logs()
+    db.clear_devices()
+
+
+def full_scans(sql, plan):
+    """
+    خطوات الخطة التي تمسح جدولاً كاملاً
+    المرور على فهرس بالترتيب مع LIMIT يتوقف مبكراً فلا يُعد مسحاً كاملاً
+    """
+    limited = _LIMITED.search(sql) is not None
+    return [detail for _, _, _, detail in plan
+            if detail.startswith('SCAN ') and ' VIRTUAL TABLE ' not in detail
+            and not detail.startswith('SCAN CONSTANT ROW')
+            and not (limited and ' USING ' in detail and 'INDEX' in detail)]
+
+
+def check_query_plans(db_path=None, verbose=False, scale=1.0):
+    """
+    فحص خطط كل استعلامات DatabaseManager على قاعدة بيانات كبيرة
+    (على نسخة من db_path إن أُعطي، وإلا على قاعدة بيانات تجريبية)
+    يعيد قائمة (الأمر, خطوات المسح الكامل) للاستعلامات المخالفة
+    والدوال العامة التي لم تُفحص
+    """
+    # Always checked on a scratch copy: exercise() writes
+    source = db_path
+    db_path = os.path.join(tempfile.gettempdir(), f'guardian_plans_{os.getpid()}.db')
+    if source is not None:
+        with sqlite3.connect(source) as src, sqlite3.connect(db_path) as dst:
+            src.backup(dst)
+
+    db = DatabaseManager(db_path)
+    try:
+        if source is None:
+            seed(db, scale)
+
+        statements = []
+        recorder = _Recorder(db)
+        db.pool.set_trace_callback(statements.append)
+        exercise(recorder)
+        db.pool.set_trace_callback(None)
+
+        # A new method must be added to exercise() or its queries go unchecked
+        failures = [(f'DatabaseManager.{name}()', ['not called by exercise()'])
+                    for name in unexercised(recorder.called)]
+
+        conn = sqlite3.connect(db_path)
+        seen = set()
+        for sql in statements:
+            sql = _SPACES.sub(' ', sql).strip()
+            if sql in seen or not _PLANNED.match(sql):
+                continue
+            seen.add(sql)
+            plan = conn.execute(f'EXPLAIN QUERY PLAN {sql}').fetchall()
+            scans = full_scans(sql, plan)
+            expected = any(p.match(sql) for p in EXPECTED_SCANS)
+            if verbose:
+                mark = 'SCAN' if scans and not expected else 'ok'
+                print(f"[{mark}] {sql[:100]}")
+                for _, _, _, detail in plan:
+                    print(f"        {detail}")
+            if scans and not expected:
+                failures.append((sql, scans))
+        conn.close()
+        return failures
+
+    finally:
+        db.close()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+
+
+# Test the module
+if __name__ == "__main__":
+    import sys
+
+    parser = argparse.ArgumentParser(description='Check DatabaseManager queries for full table scans')
+    parser.add_argument('db_path', nargs='?', help='database to check a copy of (default: seeded test data)')
+    parser.add_argument('-v', '--verbose', action='store_true', help='print every query plan')
+    parser.add_argument('--scale', type=float, default=1.0, help='size factor for the seeded test data')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    failures = check_query_plans(args.db_path, verbose=args.verbose, scale=args.scale)
+    for sql, scans in failures:
+        print(f"FAIL: {sql}\n    {'; '.join(scans)}")
+    print(f"{len(failures)} failures ({time.perf_counter() - start:.1f}s)")
+    sys.exit(1 if failures else 0)
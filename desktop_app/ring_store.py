@@ -0,0 +1,330 @@
+"""
+Ring Store Module
+وحدة تخزين عينات حركة المرور (كل ثانية) في ملفات حلقية عمودية
+
+الوظائف:
+- ملف حلقي محجوز مسبقاً لكل واجهة شبكة، عبر mmap
+- أعمدة بعرض ثابت متوافقة مع NumPy (الوقت، بايتات/حزم/أخطاء/مفقودات الاستقبال والإرسال)
+- إضافة عينة بزمن ثابت O(1): الأقدم يُكتب فوقه عند الامتلاء
+- قراءة مدى زمني كعروض (views) على الملف بدون نسخ
+"""
+
+import mmap
+import os
+import re
+import struct
+import time
+
+import numpy as np
+
+DEFAULT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'traffic_ring')
+DEFAULT_CAPACITY = 86400        # one day of per-second samples
+
+MAGIC = b'NGRS'
+VERSION = 1
+# magic, version, column count, capacity, samples written (ever)
+HEADER = struct.Struct('<4sHHQQ')
+_COUNT_OFFSET = 16
+DATA_OFFSET = 4096              # columns start on a page boundary
+
+COLUMNS = (
+    ('timestamp', np.float64),
+    ('rx_bytes', np.uint64),
+    ('tx_bytes', np.uint64),
+    ('rx_packets', np.uint64),
+    ('tx_packets', np.uint64),
+    ('rx_errors', np.uint64),
+    ('tx_errors', np.uint64),
+    ('rx_drops', np.uint64),
+    ('tx_drops', np.uint64),
+)
+COLUMN_NAMES = tuple(name for name, _ in COLUMNS)
+
+# psutil snetio field for every counter column
+COUNTER_FIELDS = {
+    'rx_bytes': 'bytes_recv',
+    'tx_bytes': 'bytes_sent',
+    'rx_packets': 'packets_recv',
+    'tx_packets': 'packets_sent',
+    'rx_errors': 'errin',
+    'tx_errors': 'errout',
+    'rx_drops': 'dropin',
+    'tx_drops': 'dropout',
+}
+
+TOTAL = 'total'
+_UNSAFE = re.compile(r'[^\w.-]')
+
+
+class RingFile:
+    """ملف حلقي واحد: عمود لكل مقياس، كل عمود capacity خانة بعرض 8 بايت"""
+
+    def __init__(self, path, capacity=DEFAULT_CAPACITY):
+        if not os.path.exists(path):
+            self._create(path, capacity)
+
+        self.path = path
+        self._file = open(path, 'r+b')
+        self.mm = mmap.mmap(self._file.fileno(), 0)
+        magic, version, columns, capacity, _ = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC or version != VERSION or columns != len(COLUMNS):
+            self.close()
+            raise ValueError(f"Not a traffic ring file: {path}")
+
+        # An existing file keeps the capacity it was created with
+        self.capacity = capacity
+        self._count = np.frombuffer(self.mm, dtype=np.uint64, count=1, offset=_COUNT_OFFSET)
+        self.columns = {}
+        for index, (name, dtype) in enumerate(COLUMNS):
+            self.columns[name] = np.frombuffer(self.mm, dtype=dtype, count=capacity,
+                                               offset=DATA_OFFSET + index * capacity * 8)
+
+    @staticmethod
+    def _create(path, capacity):
+        # Written under a temporary name so a crash never leaves a half-sized ring behind
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, len(COLUMNS), capacity, 0))
+            f.truncate(DATA_OFFSET + len(COLUMNS) * capacity * 8)
+        os.replace(tmp_path, path)
+
+    def __len__(self):
+        return min(int(self._count[0]), self.capacity)
+
+    @property
+    def written(self):
+        """عدد العينات المكتوبة منذ إنشاء الملف"""
+        return int(self._count[0])
+
+    def append(self, timestamp, values):
+        """إضافة عينة (الأعمدة غير الموجودة في values تُكتب صفراً)"""
+        count = int(self._count[0])
+        slot = count % self.capacity
+        self.columns['timestamp'][slot] = timestamp
+        for name in COLUMN_NAMES[1:]:
+            self.columns[name][slot] = values.get(name, 0)
+        # Published last: a reader never sees a slot before its values
+        self._count[0] = count + 1
+
+    def _segments(self):
+        """الأجزاء المادية بالترتيب الزمني: [(بداية, نهاية)] (جزءان بعد الالتفاف)"""
+        count = int(self._count[0])
+        if count <= self.capacity:
+            return [(0, count)]
+        head = count % self.capacity
+        return [(head, self.capacity), (0, head)] if head else [(0, self.capacity)]
+
+    def range(self, start=None, end=None, columns=COLUMN_NAMES):
+        """
+        العينات ذات الوقت في [start, end) كقاموس عمود -> مصفوفة
+        النتيجة عروض على الملف بدون نسخ، إلا إذا عبر المدى نقطة الالتفاف (نسخة واحدة)
+        """
+        timestamps = self.columns['timestamp']
+        pieces = []
+        for low, high in self._segments():
+            segment = timestamps[low:high]
+            first = low + (0 if start is None else int(np.searchsorted(segment, start, 'left')))
+            last = low + (len(segment) if end is None else int(np.searchsorted(segment, end, 'left')))
+            if first < last:
+                pieces.append((first, last))
+
+        if not pieces:
+            return {name: self.columns[name][:0] for name in columns}
+        if len(pieces) == 1:
+            first, last = pieces[0]
+            return {name: self.columns[name][first:last] for name in columns}
+        return {name: np.concatenate([self.columns[name][first:last] for first, last in pieces])
+                for name in columns}
+
+    def flush(self):
+        self.mm.flush()
+
+    def close(self):
+        # Views must go before the map can be closed
+        self.columns = {}
+        self._count = None
+        try:
+            self.mm.close()
+        except BufferError:
+            pass        # a caller still holds a range view; the map closes with it
+        self._file.close()
+
+
+class TrafficStore:
+    """ملف حلقي لكل واجهة + ملف 'total' لمجموع الواجهات"""
+
+    def __init__(self, directory=DEFAULT_DIR, capacity=DEFAULT_CAPACITY):
+        self.directory = directory
+        self.capacity = capacity
+        self.rings = {}
+        self._last = {}         # interface -> (timestamp, previous cumulative counters)
+        os.makedirs(directory, exist_ok=True)
+        for name in sorted(os.listdir(directory)):
+            if name.endswith('.ring'):
+                self._open(name[:-len('.ring')])
+
+    def _open(self, interface):
+        # Keyed by the file name so "Ethernet 2" maps to the ring reopened as "Ethernet_2"
+        key = _UNSAFE.sub('_', interface)
+        ring = self.rings.get(key)
+        if ring is None:
+            ring = self.rings[key] = RingFile(os.path.join(self.directory, key + '.ring'), self.capacity)
+        return ring
+
+    def interfaces(self):
+        return sorted(self.rings)
+
+    def reset(self):
+        """نسيان خط الأساس (عند بدء المراقبة): الاستدعاء التالي لـ record يحفظه فقط"""
+        self._last = {}
+
+    def record(self, counters, timestamp=None):
+        """
+        تسجيل عينة من عدادات الواجهات التراكمية
+        counters: {interface: كائن بحقول psutil.net_io_counters(pernic=True)}
+        يُخزَّن الفرق منذ العينة السابقة لكل ثانية؛ أول استدعاء يحفظ خط الأساس فقط
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        total = dict.fromkeys(COUNTER_FIELDS, 0)
+        recorded = False
+        for interface, snapshot in counters.items():
+            current = {column: getattr(snapshot, field, 0) for column, field in COUNTER_FIELDS.items()}
+            last = self._last.get(interface)
+            self._last[interface] = (timestamp, current)
+            if last is None:
+                continue
+            since, previous = last
+
+            # A counter that went backwards (interface reset) restarts from zero;
+            # a late sample stores the average second of the gap, not its sum
+            elapsed = max(timestamp - since, 1.0)
+            delta = {column: round((value - previous[column] if value >= previous[column] else value) / elapsed)
+                     for column, value in current.items()}
+            self._open(interface).append(timestamp, delta)
+            for column, value in delta.items():
+                total[column] += value
+            recorded = True
+
+        if recorded:
+            self._open(TOTAL).append(timestamp, total)
+        return recorded
+
+    def range(self, interface=TOTAL, start=None, end=None, columns=COLUMN_NAMES):
+        ring = self.rings.get(_UNSAFE.sub('_', interface))
+        if ring is None:
+            return {name: np.zeros(0, dtype=dtype) for name, dtype in COLUMNS if name in columns}
+        return ring.range(start, end, columns)
+
+    def rates(self, interface=TOTAL, seconds=5, now=None):
+        """متوسط البايت/الحزمة في الثانية لكل عداد خلال آخر seconds ثانية"""
+        now = time.time() if now is None else now
+        # Each sample covers the second before its timestamp
+        samples = self.range(interface, now - seconds + 0.5, None, COUNTER_FIELDS)
+        return {column: float(values.sum()) / seconds for column, values in samples.items()}
+
+    def flush(self):
+        for ring in self.rings.values():
+            ring.flush()
+
+    def close(self):
+        for ring in self.rings.values():
+            ring.close()
+        self.rings = {}
+
+
+def benchmark(samples=200000, window=3600):
+    """مقارنة سرعة الإدخال وقراءة مدى زمني: الملف الحلقي مقابل جدول network_stats"""
+    import sqlite3
+    import tempfile
+
+    directory = tempfile.mkdtemp(prefix='guardian_ring_')
+    db_path = os.path.join(directory, 'bench.db')
+    start = time.time() - samples
+    rows = [(start + i, 1500 * (i % 97), 300 * (i % 89), i % 97, i % 89) for i in range(samples)]
+    results = {}
+
+    ring = RingFile(os.path.join(directory, 'bench.ring'), capacity=samples)
+    began = time.perf_counter()
+    for ts, rx, tx, rx_packets, tx_packets in rows:
+        ring.append(ts, {'rx_bytes': rx, 'tx_bytes': tx, 'rx_packets': rx_packets, 'tx_packets': tx_packets})
+    results['ring_ingest'] = samples / (time.perf_counter() - began)
+
+    conn = sqlite3.connect(db_path)
+    conn.execute('''CREATE TABLE network_stats (id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TIMESTAMP,
+                    total_devices INTEGER, active_devices INTEGER, download_speed REAL, upload_speed REAL,
+                    bandwidth_usage REAL, packet_loss REAL, latency REAL)''')
+    conn.execute('CREATE INDEX idx_network_stats_timestamp ON network_stats (timestamp)')
+    stamp = lambda ts: time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(ts))
+    began = time.perf_counter()
+    with conn:
+        for ts, rx, tx, _, _ in rows:
+            conn.execute('INSERT INTO network_stats (timestamp, download_speed, upload_speed) VALUES (?, ?, ?)',
+                         (stamp(ts), rx, tx))
+    results['sqlite_ingest'] = samples / (time.perf_counter() - began)
+
+    # What save_network_stats() pays today: one commit per sample
+    began = time.perf_counter()
+    for ts, rx, tx, _, _ in rows[:2000]:
+        with conn:
+            conn.execute('INSERT INTO network_stats (timestamp, download_speed, upload_speed) VALUES (?, ?, ?)',
+                         (stamp(ts), rx, tx))
+    results['sqlite_commit_ingest'] = 2000 / (time.perf_counter() - began)
+
+    # Last `window` seconds, repeated, with the columns a chart needs
+    low, high = start + samples - window, start + samples
+    repeats = 200
+    began = time.perf_counter()
+    for _ in range(repeats):
+        data = ring.range(low, high, ('timestamp', 'rx_bytes', 'tx_bytes'))
+        float(data['rx_bytes'].sum())
+    results['ring_scan_ms'] = (time.perf_counter() - began) / repeats * 1e3
+
+    began = time.perf_counter()
+    for _ in range(repeats):
+        fetched = conn.execute('SELECT timestamp, download_speed, upload_speed FROM network_stats '
+                               'WHERE timestamp >= ? AND timestamp < ?', (stamp(low), stamp(high))).fetchall()
+        sum(row[1] for row in fetched)
+    results['sqlite_scan_ms'] = (time.perf_counter() - began) / repeats * 1e3
+
+    conn.close()
+    ring.close()
+    results['ring_bytes'] = os.path.getsize(os.path.join(directory, 'bench.ring'))
+    results['sqlite_bytes'] = os.path.getsize(db_path)
+    for name in os.listdir(directory):
+        os.remove(os.path.join(directory, name))
+    os.rmdir(directory)
+    return results
+
+
+# Test the module
+if __name__ == "__main__":
+    import tempfile
+    from collections import namedtuple
+
+    Counters = namedtuple('Counters', 'bytes_sent bytes_recv packets_sent packets_recv errin errout dropin dropout')
+    directory = tempfile.mkdtemp(prefix='guardian_traffic_')
+    store = TrafficStore(directory, capacity=100)
+
+    # 150 samples into a 100-slot ring: the range read crosses the wrap point
+    now = time.time()
+    for i in range(151):
+        store.record({'eth0': Counters(i * 300, i * 1500, i * 3, i * 10, 0, 0, 0, 0),
+                      'lo': Counters(i * 64, i * 64, i, i, 0, 0, 0, 0)}, timestamp=now - 150 + i)
+    window = store.range(TOTAL, now - 10, now + 1)
+    print(f"Interfaces: {store.interfaces()}, ring holds {len(store.rings[TOTAL])} of "
+          f"{store.rings[TOTAL].written} samples")
+    print(f"Last 10s: {len(window['timestamp'])} samples, rx {int(window['rx_bytes'].sum()):,} bytes, "
+          f"rx rate {store.rates(seconds=5, now=now)['rx_bytes']:,.0f} B/s")
+    store.close()
+    for name in os.listdir(directory):
+        os.remove(os.path.join(directory, name))
+    os.rmdir(directory)
+
+    results = benchmark()
+    print(f"Ingest: ring {results['ring_ingest']:,.0f} samples/s vs network_stats "
+          f"{results['sqlite_ingest']:,.0f} rows/s (one transaction), "
+          f"{results['sqlite_commit_ingest']:,.0f} rows/s (commit per row)")
+    print(f"Last hour scan: ring {results['ring_scan_ms']:.3f} ms vs network_stats "
+          f"{results['sqlite_scan_ms']:.2f} ms")
+    print(f"Size: ring {results['ring_bytes'] / 1e6:.1f} MB (preallocated) vs network_stats "
+          f"{results['sqlite_bytes'] / 1e6:.1f} MB")
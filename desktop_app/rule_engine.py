@@ -0,0 +1,285 @@
+"""
+Security Rule Engine Module
+وحدة محرك القواعد الأمنية
+
+الوظائف:
+- تحميل القواعد من ملف security_rules.json (شروط، خطورة، وزن في التقييم)
+- ترجمة الشروط إلى دوال مرة واحدة عند التحميل
+- جدول توزيع حسب نوع الحدث: كل حدث يقيّم القواعد الخاصة به فقط
+- إعادة التحميل تلقائياً عند تغيّر الملف
+- حساب درجة الأمان (مشترك بين تطبيق سطح المكتب والـ Backend)
+"""
+
+import json
+import operator
+import os
+import re
+import threading
+import time
+
+DEFAULT_RULES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'security_rules.json')
+
+_COMPARISONS = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+    'in': lambda a, b: a in b,
+    'not_in': lambda a, b: a not in b,
+    'contains': lambda a, b: b in a,
+}
+
+
+class Match:
+    """قاعدة مطابقة لحدث"""
+
+    __slots__ = ('rule_id', 'level', 'severity', 'weight', 'message')
+
+    def __init__(self, rule_id, level, severity, weight, message):
+        self.rule_id = rule_id
+        self.level = level
+        self.severity = severity
+        self.weight = weight
+        self.message = message
+
+    def as_dict(self):
+        return {
+            'rule_id': self.rule_id,
+            'level': self.level,
+            'severity': self.severity,
+            'weight': self.weight,
+            'message': self.message
+        }
+
+
+class _FormatFields(dict):
+    def __missing__(self, key):
+        return '{' + key + '}'
+
+
+class CompiledRule:
+    """قاعدة مترجمة إلى دالة شرط"""
+
+    __slots__ = ('id', 'event', 'level', 'severity', 'weight', 'message', 'test')
+
+    def __init__(self, rule, settings, severity_weights):
+        self.id = rule['id']
+        self.event = rule['event']
+        self.level = rule.get('level', 'warning')
+        self.severity = rule.get('severity', 'Medium')
+        self.message = rule.get('message', self.id)
+
+        weight = rule.get('weight', 0)
+        # "severity": the weight follows the event's own severity
+        self.weight = None if weight == 'severity' else float(weight)
+        if self.weight is None and not severity_weights:
+            raise ValueError(f"Rule {self.id}: severity weights are not defined")
+
+        self.test = _compile_condition(rule.get('when'), settings)
+
+    def weight_for(self, event, severity_weights):
+        if self.weight is not None:
+            return self.weight
+        severity = str(event.get('severity', self.severity)).title()
+        return severity_weights.get(severity, 0)
+
+
+def _resolve(value, settings):
+    """القيم التي تبدأ بـ $ تشير إلى settings"""
+    if isinstance(value, str) and value.startswith('$'):
+        return settings[value[1:]]
+    return value
+
+
+def _compile_condition(condition, settings):
+    """ترجمة الشرط (dict) إلى دالة تستقبل الحدث"""
+    if condition is None:
+        return lambda event: True
+
+    if 'all' in condition:
+        tests = [_compile_condition(c, settings) for c in condition['all']]
+        return lambda event: all(test(event) for test in tests)
+    if 'any' in condition:
+        tests = [_compile_condition(c, settings) for c in condition['any']]
+        return lambda event: any(test(event) for test in tests)
+    if 'not' in condition:
+        test = _compile_condition(condition['not'], settings)
+        return lambda event: not test(event)
+
+    field = condition['field']
+    op = condition.get('op', '==')
+
+    if op == 'exists':
+        return lambda event: event.get(field) is not None
+    if op == 'not_empty':
+        return lambda event: bool(event.get(field))
+    if op == 'empty':
+        return lambda event: not event.get(field)
+    if op == 'matches':
+        pattern = re.compile(_resolve(condition['value'], settings))
+        return lambda event: pattern.search(str(event.get(field, ''))) is not None
+
+    compare = _COMPARISONS.get(op)
+    if compare is None:
+        raise ValueError(f"Unknown operator: {op}")
+    value = _resolve(condition.get('value'), settings)
+    if op in ('in', 'not_in') and isinstance(value, list):
+        value = frozenset(value)
+
+    def test(event):
+        actual = event.get(field)
+        if actual is None:
+            return False
+        try:
+            return compare(actual, value)
+        except TypeError:
+            return False
+    return test
+
+
+class RuleEngine:
+    """محرك القواعد مع جدول توزيع حسب نوع الحدث"""
+
+    def __init__(self, path=DEFAULT_RULES, check_interval=2.0):
+        self.path = path
+        self.check_interval = check_interval
+        self.settings = {}
+        self.severity_weights = {}
+        self.status_thresholds = []
+        self.dispatch = {}      # event type -> [CompiledRule]
+        self.mtime = None
+        self.last_check = 0.0
+        self.generation = 0
+        self._lock = threading.Lock()
+        self.reload()
+
+    def reload(self):
+        """تحميل الملف وترجمة القواعد (يبقى الإصدار السابق عند الخطأ)"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+
+            settings = data.get('settings', {})
+            severity_weights = {k.title(): float(v) for k, v in data.get('severity_weights', {}).items()}
+            dispatch = {}
+            for rule in data.get('rules', []):
+                if rule.get('enabled', True):
+                    compiled = CompiledRule(rule, settings, severity_weights)
+                    dispatch.setdefault(compiled.event, []).append(compiled)
+
+            thresholds = sorted(((float(limit), status) for limit, status in data.get('status_thresholds', [])),
+                                reverse=True)
+
+            # Swap everything at once so readers never see a half-loaded set
+            with self._lock:
+                self.settings = settings
+                self.severity_weights = severity_weights
+                self.status_thresholds = thresholds
+                self.dispatch = dispatch
+                self.mtime = os.stat(self.path).st_mtime
+                self.generation += 1
+            return True
+
+        except Exception as e:
+            print(f"Error loading security rules: {e}")
+            return False
+
+    def maybe_reload(self):
+        """إعادة التحميل إذا تغيّر الملف (بحد أقصى مرة كل check_interval)"""
+        now = time.monotonic()
+        if now - self.last_check < self.check_interval:
+            return False
+        self.last_check = now
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return False
+        return mtime != self.mtime and self.reload()
+
+    def evaluate(self, event_type, event):
+        """تقييم حدث واحد مقابل قواعده فقط"""
+        self.maybe_reload()
+        rules = self.dispatch.get(event_type)
+        if not rules:
+            return []
+
+        matches = []
+        fields = None
+        for rule in rules:
+            if not rule.test(event):
+                continue
+            if fields is None:
+                fields = _FormatFields(event)
+            severity = rule.severity
+            if rule.weight is None:
+                severity = str(event.get('severity', severity)).title()
+            matches.append(Match(
+                rule.id,
+                rule.level,
+                severity,
+                rule.weight_for(event, self.severity_weights),
+                rule.message.format_map(fields)
+            ))
+        return matches
+
+    def severity_weight(self, severity):
+        """وزن الخطورة في حساب الدرجة"""
+        self.maybe_reload()
+        return self.severity_weights.get(str(severity).title(), 0)
+
+    def alert_deduction(self, severity_counts, resolved=False):
+        """
+        مجموع خصم التنبيهات من الدرجة
+        severity_counts: {'High': 3, 'low': 1, ...}
+        """
+        total = 0.0
+        for severity, count in severity_counts.items():
+            for match in self.evaluate('security_alert', {'severity': severity, 'resolved': resolved}):
+                total += match.weight * count
+        return total
+
+    def security_score(self, severity_counts):
+        """درجة الأمان (0-100) من عدد التنبيهات غير المحلولة حسب الخطورة"""
+        return max(0, 100 - self.alert_deduction(severity_counts))
+
+    def status_for(self, score):
+        """الحالة النصية حسب الدرجة"""
+        for limit, status in self.status_thresholds:
+            if score >= limit:
+                return status
+        return self.status_thresholds[-1][1] if self.status_thresholds else 'Unknown'
+
+
+_shared_engine = None
+_shared_lock = threading.Lock()
+
+
+def get_engine(path=DEFAULT_RULES):
+    """محرك مشترك لكل العملية (يُترجم مرة واحدة)"""
+    global _shared_engine
+    with _shared_lock:
+        if _shared_engine is None or _shared_engine.path != path:
+            _shared_engine = RuleEngine(path)
+        return _shared_engine
+
+
+# Test the module
+if __name__ == "__main__":
+    engine = get_engine()
+    print(f"Loaded rules for events: {', '.join(sorted(engine.dispatch))}")
+
+    for match in engine.evaluate('open_ports', {'dangerous': [23, 445], 'dangerous_list': '23, 445', 'count': 14}):
+        print(f"  [{match.level}] -{match.weight:.0f} {match.message}")
+    for match in engine.evaluate('firewall', {'enabled': False}):
+        print(f"  [{match.level}] -{match.weight:.0f} {match.message}")
+
+    counts = {'Critical': 1, 'High': 2, 'Low': 3}
+    score = engine.security_score(counts)
+    print(f"Score for {counts}: {score:.0f} ({engine.status_for(score)})")
+
+    start = time.perf_counter()
+    for _ in range(100000):
+        engine.evaluate('firewall', {'enabled': True})
+    print(f"{100000 / (time.perf_counter() - start):,.0f} events/s")
@@ -15,6 +15,7 @@ import platform
 import re
 import uuid
 import requests
+from collections import deque
 from datetime import datetime
 import psutil
 import logging
@@ -23,11 +24,15 @@ logging.getLogger("scapy.runtime").setLevel(logging.ERROR)
 import scapy.all as scapy
 from mac_vendor_lookup import MacLookup
 
+from domain_intel import DomainIntel
+
 
 class NetworkScanner:
-    def __init__(self):
+    def __init__(self, domain_intel=None):
         self.mac_lookup = MacLookup()
         self.os_type = platform.system()
+        self.domain_intel = domain_intel or DomainIntel()
+        self.hostname_alerts = deque(maxlen=1000)
     
     def get_network_info(self):
         """الحصول على معلومات الشبكة الأساسية"""
@@ -234,9 +239,19 @@ class NetworkScanner:
         """الحصول على Hostname من IP"""
         try:
             hostname = socket.gethostbyaddr(ip)[0]
-            return hostname
         except:
             return "Unknown"
+        
+        # Resolved names are checked against the domain blocklist
+        self.hostname_alerts.extend(self.domain_intel.check_hostname(hostname, ip))
+        return hostname
+    
+    def take_hostname_alerts(self):
+        """تنبيهات أسماء الأجهزة المدرجة في قائمة حظر النطاقات منذ آخر استدعاء"""
+        alerts = []
+        while self.hostname_alerts:
+            alerts.append(self.hostname_alerts.popleft())
+        return alerts
     
     def get_vendor(self, mac):
         """الحصول على Vendor من MAC Address"""
@@ -0,0 +1,114 @@
+"""
+Search Index Module
+وحدة البحث النصي الكامل (FTS5)
+
+الوظائف:
+- جداول FTS5 بمحتوى خارجي لسجل النشاطات والتنبيهات الأمنية (بدون نسخ النص)
+- Triggers تبقي الفهرس متزامناً مع كل إضافة وحذف وتعديل
+- تحويل نص المستخدم إلى استعلام FTS5 آمن (عناوين IP و MAC والعبارات)
+- ترتيب النتائج حسب الصلة (bm25) بأوزان لكل عمود
+"""
+
+import re
+
+# source -> (content table, fts table, indexed columns, bm25 weight per column)
+SEARCH_SOURCES = {
+    'logs': ('activity_logs', 'activity_logs_fts', ('message', 'source', 'details'), (10.0, 2.0, 1.0)),
+    'alerts': ('security_alerts', 'security_alerts_fts',
+               ('description', 'alert_type', 'source_ip', 'target_ip', 'notes'), (10.0, 5.0, 4.0, 4.0, 1.0)),
+}
+
+# IPs and MACs are split on '.' and ':' and matched as phrases of adjacent tokens
+TOKENIZER = 'unicode61 remove_diacritics 2'
+
+_TERM = re.compile(r'"([^"]*)"|(\S+)')
+_WORD = re.compile(r'\w')
+
+
+def search_schema():
+    """أوامر إنشاء جداول البحث والـ Triggers وبناء الفهرس من الصفوف الموجودة"""
+    statements = []
+    for table, fts, columns, weights in SEARCH_SOURCES.values():
+        names = ', '.join(columns)
+        new = ', '.join(f'new.{column}' for column in columns)
+        old = ', '.join(f'old.{column}' for column in columns)
+        delete = f"INSERT INTO {fts} ({fts}, rowid, {names}) VALUES ('delete', old.id, {old});"
+        insert = f"INSERT INTO {fts} (rowid, {names}) VALUES (new.id, {new});"
+        statements += [
+            f'''CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+                   {names}, content='{table}', content_rowid='id', tokenize='{TOKENIZER}')''',
+            f'CREATE TRIGGER IF NOT EXISTS trg_{fts}_insert AFTER INSERT ON {table} BEGIN {insert} END',
+            f'CREATE TRIGGER IF NOT EXISTS trg_{fts}_delete AFTER DELETE ON {table} BEGIN {delete} END',
+            # Alert updates mostly touch occurrences/status, which are not indexed
+            f'CREATE TRIGGER IF NOT EXISTS trg_{fts}_update AFTER UPDATE OF {names} ON {table} '
+            f'BEGIN {delete} {insert} END',
+            f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')",
+            # ORDER BY rank uses these column weights
+            f"INSERT INTO {fts} ({fts}, rank) VALUES ('rank', 'bm25({', '.join(map(str, weights))})')",
+        ]
+    return statements
+
+
+def fts_query(text):
+    """
+    تحويل نص البحث إلى استعلام FTS5 لا يفسّر رموز المستخدم كمعاملات
+    كل كلمة (أو "عبارة بين علامتي تنصيص") شرط مستقل، و * في آخر الكلمة بحث بالبادئة
+    يعيد '' إن لم يبقَ ما يُبحث عنه
+    """
+    terms = []
+    for phrase, word in _TERM.findall(text or ''):
+        term = phrase or word
+        prefix = not phrase and term.endswith('*')
+        term = term.rstrip('*') if prefix else term
+        # Pure punctuation tokenizes to nothing and would be an empty phrase
+        if not _WORD.search(term):
+            continue
+        terms.append('"{}"{}'.format(term.replace('"', '""'), '*' if prefix else ''))
+    return ' '.join(terms)
+
+
+# Test the module
+if __name__ == "__main__":
+    import random
+    import sqlite3
+    import time
+
+    conn = sqlite3.connect(':memory:')
+    conn.execute('''CREATE TABLE activity_logs (id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TIMESTAMP,
+                    level TEXT NOT NULL, message TEXT NOT NULL, source TEXT, details TEXT)''')
+    conn.execute('''CREATE TABLE security_alerts (id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TIMESTAMP,
+                    alert_type TEXT, severity TEXT, description TEXT, source_ip TEXT, target_ip TEXT, notes TEXT)''')
+    for statement in search_schema():
+        conn.execute(statement)
+
+    random.seed(3)
+    words = ['scan', 'device', 'connected', 'port', 'blocked', 'timeout', 'dns', 'query', 'arp', 'reply']
+    rows = 1_000_000
+    began = time.perf_counter()
+    conn.executemany('INSERT INTO activity_logs (timestamp, level, message) VALUES (?, ?, ?)',
+                     ((f'2026-01-01 00:00:{i % 60:02d}', 'INFO',
+                       f"{' '.join(random.sample(words, 3))} 10.{i % 7}.{i % 251}.{i % 253} "
+                       f"mac 02:00:00:{i % 256:02x}:{i // 256 % 256:02x}:{i // 65536 % 256:02x}")
+                      for i in range(rows)))
+    conn.commit()
+    print(f"{rows:,} rows inserted and indexed in {time.perf_counter() - began:.1f}s")
+
+    for text in ('10.3.17.120', '02:00:00:07:01:00', 'arp reply', 'timeo*', '"dns query" blocked'):
+        query = fts_query(text)
+        began = time.perf_counter()
+        found = conn.execute('''
+            SELECT l.id, snippet(activity_logs_fts, -1, '[', ']', '…', 8) FROM activity_logs_fts
+            JOIN activity_logs l ON l.id = activity_logs_fts.rowid
+            WHERE activity_logs_fts MATCH ? ORDER BY rank LIMIT 20
+        ''', (query,)).fetchall()
+        fts_ms = (time.perf_counter() - began) * 1e3
+        began = time.perf_counter()
+        conn.execute("SELECT id FROM activity_logs WHERE message LIKE ? LIMIT 20",
+                     (f"%{text.strip('*').strip(chr(34))}%",)).fetchall()
+        like_ms = (time.perf_counter() - began) * 1e3
+        print(f"{text!r:22} -> {query!r:30} {len(found):2} hits, FTS {fts_ms:6.1f} ms, LIKE {like_ms:6.1f} ms"
+              + (f"  e.g. {found[0][1]}" if found else ''))
+
+    conn.execute('DELETE FROM activity_logs WHERE id <= 1000')
+    conn.execute("INSERT INTO activity_logs_fts (activity_logs_fts, rank) VALUES ('integrity-check', 1)")
+    print(f"Empty query: {fts_query(' -- * ')!r}; index consistent after delete")
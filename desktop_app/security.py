@@ -16,27 +16,57 @@ import platform
 import re
 from datetime import datetime
 import hashlib
+import time
+
+import psutil
+
+from alert_pipeline import canonical_json
+from anomaly import TrafficAnomalyDetector
+from banner_grabber import BannerGrabber, classify
+from dns_monitor import DnsMonitor, system_resolvers
+from domain_intel import DomainIntel
+from pcap_analysis import OfflineAnalyzer
+from rule_engine import get_engine
+from scan_detector import ScanDetector
+from signatures import SignatureEngine
+from threat_intel import ThreatIntel, ThreatIntelDetector
+from vuln_matcher import VulnerabilityMatcher, vulnerability_alerts
 
 
 class SecurityAnalyzer:
     def __init__(self):
         self.os_type = platform.system()
-        self.security_rules = self.load_security_rules()
+        self.rule_engine = get_engine()
         self.threat_database = {}
+        self.traffic_detector = TrafficAnomalyDetector()
+        self.scan_detector = ScanDetector()
+        self.domain_intel = DomainIntel()
+        self.dns_monitor = DnsMonitor(domain_intel=self.domain_intel)
+        self.signature_engine = SignatureEngine()
+        self.vuln_matcher = VulnerabilityMatcher()
+        self.banner_grabber = BannerGrabber()
+        self.threat_intel = ThreatIntel()
+        self.intel_detector = ThreatIntelDetector(self.threat_intel)
+        self.scanned_services = {}      # ip -> open ports with banners (last port scan)
+    
+    @property
+    def security_rules(self):
+        """إعدادات القواعد الحالية (من security_rules.json)"""
+        return self.load_security_rules()
     
     def load_security_rules(self):
         """تحميل قواعد الأمان"""
-        return {
-            'dangerous_ports': [23, 135, 139, 445, 1433, 3389, 5900],
-            'safe_ports': [80, 443, 22, 21],
-            'max_open_ports': 10,
-            'suspicious_patterns': [
-                'rapid_connection_attempts',
-                'port_scanning',
-                'arp_poisoning',
-                'dns_spoofing'
-            ]
-        }
+        self.rule_engine.maybe_reload()
+        return self.rule_engine.settings
+    
+    def _apply_rules(self, results, event_type, event):
+        """تقييم حدث وإضافة نتائجه إلى الفحص"""
+        for match in self.rule_engine.evaluate(event_type, event):
+            if match.level == 'alert':
+                results['alerts'].append(match.message)
+            elif match.level == 'warning':
+                results['warnings'].append(match.message)
+            results['score'] -= match.weight
     
     def quick_security_check(self):
         """فحص أمني سريع"""
@@ -51,54 +81,35 @@ class SecurityAnalyzer:
         
         # Check 1: Open Ports
         open_ports = self.check_common_ports()
-        if open_ports['dangerous']:
-            results['alerts'].append(
-                f"⚠️ Dangerous ports open: {', '.join(map(str, open_ports['dangerous']))}"
-            )
-            results['score'] -= 20
-            results['status'] = 'At Risk'
-        
-        if len(open_ports['all']) > self.security_rules['max_open_ports']:
-            results['warnings'].append(
-                f"⚠️ Too many open ports: {len(open_ports['all'])}"
-            )
-            results['score'] -= 10
+        self._apply_rules(results, 'open_ports', dict(
+            open_ports,
+            dangerous_list=', '.join(map(str, open_ports['dangerous']))
+        ))
         
         # Check 2: Firewall Status
         firewall_status = self.check_firewall_status()
-        if not firewall_status['enabled']:
-            results['alerts'].append("🔥 Firewall is disabled!")
-            results['score'] -= 30
-            results['status'] = 'Critical'
+        self._apply_rules(results, 'firewall', firewall_status)
         
         # Check 3: Network Configuration
         network_check = self.check_network_configuration()
-        if network_check['issues']:
-            for issue in network_check['issues']:
-                results['warnings'].append(f"⚠️ {issue}")
-            results['score'] -= 5 * len(network_check['issues'])
+        for issue in network_check['issues']:
+            self._apply_rules(results, 'network_issue', {'issue': issue})
         
         # Check 4: Known Vulnerabilities
         vuln_check = self.check_known_vulnerabilities()
-        if vuln_check['found']:
-            results['alerts'].append(
-                f"🚨 Potential vulnerabilities detected: {len(vuln_check['vulnerabilities'])}"
-            )
-            results['score'] -= 15
+        self._apply_rules(results, 'vulnerabilities', dict(
+            vuln_check,
+            count=len(vuln_check['vulnerabilities'])
+        ))
+        
+        results['score'] = max(0, int(results['score']))
         
         # Generate recommendations
         if results['score'] < 100:
             results['recommendations'] = self.generate_recommendations(results)
         
         # Final status based on score
-        if results['score'] >= 80:
-            results['status'] = 'Safe'
-        elif results['score'] >= 60:
-            results['status'] = 'Warning'
-        elif results['score'] >= 40:
-            results['status'] = 'At Risk'
-        else:
-            results['status'] = 'Critical'
+        results['status'] = self.rule_engine.status_for(results['score'])
         
         return results
     
@@ -107,6 +118,7 @@ class SecurityAnalyzer:
         try:
             all_ports = []
             dangerous_ports = []
+            dangerous = set(self.security_rules['dangerous_ports'])
             
             # Common ports to check
             ports_to_check = [
@@ -122,7 +134,7 @@ class SecurityAnalyzer:
                 
                 if result == 0:
                     all_ports.append(port)
-                    if port in self.security_rules['dangerous_ports']:
+                    if port in dangerous:
                         dangerous_ports.append(port)
                 
                 sock.close()
@@ -147,22 +159,40 @@ class SecurityAnalyzer:
                 result = sock.connect_ex((target, port))
                 
                 if result == 0:
-                    service = self.identify_service(port)
                     open_ports.append({
+                        'ip': target,
                         'port': port,
-                        'service': service,
                         'state': 'open'
                     })
                 
                 sock.close()
             
+            # Fingerprint the open ports concurrently (cached per ip/port)
+            fingerprints = self.banner_grabber.grab_many((target, p['port']) for p in open_ports)
+            for port_info, fingerprint in zip(open_ports, fingerprints):
+                port_info['banner'] = fingerprint['banner']
+                port_info['tls'] = fingerprint['tls']
+                port_info['cert_cn'] = fingerprint['cert_cn']
+                port_info['service'] = fingerprint['service'] or self.identify_service(port_info['port'])
+            
+            # Match the banners against the local CVE index
+            for vuln in self.vuln_matcher.match_services(open_ports):
+                for port_info in open_ports:
+                    if port_info['port'] == vuln['port']:
+                        port_info.setdefault('vulnerabilities', []).append(vuln)
+            
+            self.scanned_services[target] = open_ports
             return open_ports
         except Exception as e:
             print(f"Error scanning port range: {e}")
             return []
     
-    def identify_service(self, port):
-        """تحديد الخدمة التي تعمل على منفذ معين"""
+    def identify_service(self, port, banner=None):
+        """تحديد الخدمة التي تعمل على منفذ معين (من الـ Banner إن وُجد)"""
+        service = classify(banner)
+        if service:
+            return service
+        
         common_services = {
             20: 'FTP-Data',
             21: 'FTP',
@@ -273,13 +303,30 @@ class SecurityAnalyzer:
     def check_dns_security(self):
         """فحص أمان DNS"""
         try:
-            # Check for DNS leak
-            # In production, this would test against known DNS servers
+            issues = []
+            dns_servers = system_resolvers()
+            if not dns_servers:
+                issues.append("No DNS servers configured")
+            
+            # Findings from observed DNS traffic (live capture)
+            summary = self.dns_monitor.summary()
+            counters = summary['counters']
+            for server in summary['unexpected_resolvers']:
+                issues.append(f"DNS answers received from unexpected resolver {server}")
+            if counters['conflicts']:
+                issues.append(f"Conflicting DNS answers detected ({counters['conflicts']})")
+            if counters['poisoning']:
+                issues.append(f"Possible DNS cache poisoning ({counters['poisoning']})")
+            if counters['unsolicited']:
+                issues.append(f"Unsolicited DNS responses ({counters['unsolicited']})")
+            if counters['blocked_domains']:
+                issues.append(f"Lookups of blocklisted domains ({counters['blocked_domains']})")
             
             return {
-                'secure': True,
-                'issues': [],
-                'dns_servers': []
+                'secure': not issues,
+                'issues': issues,
+                'dns_servers': dns_servers,
+                'observed_resolvers': summary['observed_resolvers']
             }
         except:
             return {
@@ -288,18 +335,29 @@ class SecurityAnalyzer:
                 'dns_servers': []
             }
     
-    def check_known_vulnerabilities(self):
-        """فحص الثغرات المعروفة"""
+    def check_known_vulnerabilities(self, services=None):
+        """
+        فحص الثغرات المعروفة
+        services: خدمات بـ Banner (افتراضياً: نتائج آخر فحص منافذ لكل الأجهزة)
+        """
         vulnerabilities = []
         
         try:
+            # Match service banners against the offline CVE index
+            if services is None:
+                services = [s for ports in self.scanned_services.values() for s in ports]
+            service_vulns = self.vuln_matcher.match_services(services)
+            for vuln in service_vulns:
+                vulnerabilities.append({
+                    'id': vuln['id'],
+                    'severity': vuln['severity'],
+                    'description': f"{vuln['product']} {vuln['version']} on {vuln['ip']}:{vuln['port']} - {vuln['description']}",
+                    'recommendation': f"Update {vuln['product']} on {vuln['ip']}"
+                })
+
             # Check OS version for known vulnerabilities
             os_info = platform.platform()
-            
-            # Check for outdated software (simulated)
-            # In production, this would check against CVE database
-            
-            # Example checks
+
             if "Windows" in os_info:
                 # Check Windows version
                 if "Windows-7" in os_info or "Windows-XP" in os_info:
@@ -313,12 +371,13 @@ class SecurityAnalyzer:
             return {
                 'found': len(vulnerabilities) > 0,
                 'vulnerabilities': vulnerabilities,
-                'count': len(vulnerabilities)
+                'count': len(vulnerabilities),
+                'alerts': vulnerability_alerts(service_vulns)
             }
         
         except Exception as e:
             print(f"Error checking vulnerabilities: {e}")
-            return {'found': False, 'vulnerabilities': [], 'count': 0}
+            return {'found': False, 'vulnerabilities': [], 'count': 0, 'alerts': []}
     
     def detect_arp_spoofing(self, network_devices):
         """كشف ARP Spoofing"""
@@ -358,7 +417,19 @@ class SecurityAnalyzer:
         suspicious_patterns = []
         
         try:
-            # Check for port scanning
+            # Check for port scanning / sweeps from observed connection attempts
+            # Each item: (source_ip, target_ip, port) or (source_ip, target_ip, port, timestamp)
+            for attempt in traffic_data.get('connections', ()):
+                src, dst, port = attempt[:3]
+                ts = attempt[3] if len(attempt) > 3 else time.time()
+                for alert in self.scan_detector.observe(src, dst, port, ts):
+                    suspicious_patterns.append({
+                        'type': alert['type'],
+                        'severity': alert['severity'],
+                        'details': alert['description'],
+                        'source_ip': alert['source_ip']
+                    })
+            
             if 'connection_attempts' in traffic_data:
                 if traffic_data['connection_attempts'] > 50:
                     suspicious_patterns.append({
@@ -386,6 +457,66 @@ class SecurityAnalyzer:
             print(f"Error analyzing traffic: {e}")
             return {'suspicious': False, 'patterns': [], 'count': 0}
     
+    def scan_payload(self, data):
+        """فحص محتوى (bytes) بالتواقيع وإرجاع التطابقات"""
+        try:
+            self.signature_engine.maybe_reload()
+            found, _ = self.signature_engine.scan(data)
+            return [{
+                'id': signature.id,
+                'name': signature.name,
+                'type': signature.alert_type,
+                'severity': signature.severity
+            } for signature in found]
+        except Exception as e:
+            print(f"Error scanning payload: {e}")
+            return []
+    
+    def check_connection_attempts(self):
+        """
+        رصد محاولات الاتصال الواردة من جدول اتصالات النظام
+        (بديل عن الالتقاط الحي عند عدم توفره)
+        ومطابقة العناوين البعيدة مع قائمة الحظر
+        """
+        alerts = []
+        
+        try:
+            connections = psutil.net_connections(kind='tcp')
+            listening = {c.laddr.port for c in connections if c.status == psutil.CONN_LISTEN}
+            now = time.time()
+            
+            check_intel = self.threat_intel.count > 0
+            if check_intel:
+                self.threat_intel.maybe_reload()
+            
+            for conn in connections:
+                if not conn.raddr:
+                    continue
+                
+                src = conn.raddr.ip.replace('::ffff:', '')
+                dst = conn.laddr.ip.replace('::ffff:', '')
+                if ':' in src or ':' in dst:
+                    continue
+                
+                # Every remote peer (inbound or outbound) against the blocklist
+                if check_intel:
+                    alerts += self.intel_detector.observe(src, dst, now, 'Connection with')
+                
+                if conn.laddr.port not in listening:
+                    continue
+                if conn.status not in (psutil.CONN_SYN_RECV, psutil.CONN_ESTABLISHED):
+                    continue
+                alerts += self.scan_detector.observe(src, dst, conn.laddr.port, now)
+        
+        except Exception as e:
+            print(f"Error reading connections: {e}")
+        
+        return alerts
+    
+    def analyze_capture_file(self, path, db=None, progress=None):
+        """تحليل ملف pcap / pcapng بحثاً عن الأنماط المشبوهة"""
+        return OfflineAnalyzer(db=db).analyze(path, progress=progress)
+    
     def generate_security_report(self, scan_results):
         """إنشاء تقرير أمني شامل"""
         report = {
@@ -465,8 +596,8 @@ class SecurityAnalyzer:
         return recommendations
     
     def create_security_hash(self, data):
-        """إنشاء hash للبيانات الأمنية"""
-        return hashlib.sha256(str(data).encode()).hexdigest()
+        """إنشاء hash للبيانات الأمنية (تمثيل JSON ثابت بمفاتيح مرتبة)"""
+        return hashlib.sha256(canonical_json(data).encode('utf-8')).hexdigest()
 
 
 # Test the module
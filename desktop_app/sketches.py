@@ -0,0 +1,223 @@
+"""
+Probabilistic Sketches Module
+وحدة الهياكل الاحتمالية (Sketches)
+
+الوظائف:
+- HyperLogLog لتقدير عدد العناصر المميزة بذاكرة ثابتة
+- Count-Min Sketch لتقدير التكرارات بذاكرة ثابتة
+- Space-Saving لتتبع العناصر الأكثر تكراراً (Top-K) بذاكرة ثابتة
+- دالة خلط (Hash) سريعة للأرقام الصحيحة
+"""
+
+import heapq
+import math
+from array import array
+
+_MASK64 = (1 << 64) - 1
+
+
+def mix64(value, seed=0):
+    """خلط رقم صحيح إلى 64 بت (SplitMix64 finalizer)"""
+    z = (value + seed * 0x9E3779B97F4A7C15 + 0x9E3779B97F4A7C15) & _MASK64
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return z ^ (z >> 31)
+
+
+class HyperLogLog:
+    """تقدير عدد العناصر المميزة (الخطأ ≈ 1.04 / sqrt(2^p))"""
+
+    __slots__ = ('p', 'm', 'registers')
+
+    def __init__(self, p=7):
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(self.m)
+
+    def add(self, value):
+        """
+        إضافة عنصر (رقم صحيح)
+        يعيد True إذا تغيّر أحد السجلات (أي قد يتغير التقدير)
+        """
+        return self.add_hash(mix64(value))
+
+    def add_hash(self, h):
+        """إضافة قيمة مخلوطة مسبقاً (لإعادة استخدام نفس الـ hash في عدة sketches)"""
+        index = h >> (64 - self.p)
+        rest = h & ((1 << (64 - self.p)) - 1)
+        rank = (64 - self.p) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+            return True
+        return False
+
+    def count(self):
+        return estimate(self.registers)
+
+    def clear(self):
+        self.registers = bytearray(self.m)
+
+
+def estimate(registers):
+    """تقدير العدد من سجلات HyperLogLog"""
+    m = len(registers)
+    alpha = 0.7213 / (1 + 1.079 / m) if m >= 128 else {16: 0.673, 32: 0.697, 64: 0.709}.get(m, 0.7213)
+    total = 0.0
+    zeros = 0
+    for r in registers:
+        total += 2.0 ** -r
+        if r == 0:
+            zeros += 1
+    raw = alpha * m * m / total
+
+    # Linear counting is far more accurate for small cardinalities
+    if raw <= 2.5 * m and zeros:
+        return m * math.log(m / zeros)
+    return raw
+
+
+def union_count(sketches):
+    """تقدير عدد العناصر المميزة في اتحاد عدة HyperLogLog"""
+    sketches = [s.registers for s in sketches]
+    if not sketches:
+        return 0.0
+    if len(sketches) == 1:
+        return estimate(sketches[0])
+    return estimate(bytes(map(max, *sketches)))
+
+
+class CountMinSketch:
+    """تقدير تكرار العناصر (تقدير أعلى فقط، لا يقل عن القيمة الحقيقية)"""
+
+    __slots__ = ('width', 'depth', 'table', 'total')
+
+    def __init__(self, width=2048, depth=4):
+        self.width = width
+        self.depth = depth
+        self.table = array('I', bytes(4 * width * depth))
+        self.total = 0
+
+    def _cells(self, value):
+        h = mix64(value)
+        h1 = h & 0xFFFFFFFF
+        h2 = (h >> 32) | 1
+        width = self.width
+        return [row * width + (h1 + row * h2) % width for row in range(self.depth)]
+
+    def add(self, value, count=1):
+        """إضافة عنصر ويعيد التقدير الجديد لتكراره"""
+        table = self.table
+        result = None
+        for cell in self._cells(value):
+            current = table[cell] + count
+            if current > 0xFFFFFFFF:
+                current = 0xFFFFFFFF
+            table[cell] = current
+            if result is None or current < result:
+                result = current
+        self.total += count
+        return result
+
+    def query(self, value):
+        table = self.table
+        return min(table[cell] for cell in self._cells(value))
+
+    def clear(self):
+        self.table = array('I', bytes(4 * self.width * self.depth))
+        self.total = 0
+
+
+class SpaceSaving:
+    """
+    تتبع أثقل K عنصر (Space-Saving) مع أوزان
+    كل عنصر يحمل (العدد, الحد الأعلى للخطأ)
+    """
+
+    __slots__ = ('capacity', 'counts', 'errors', 'heap', 'total')
+
+    def __init__(self, capacity=128):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self.heap = []      # lazy min-heap of (count, key); stale entries are skipped
+        self.total = 0
+
+    def __len__(self):
+        return len(self.counts)
+
+    def add(self, key, weight=1):
+        counts = self.counts
+        self.total += weight
+
+        count = counts.get(key)
+        if count is not None:
+            counts[key] = count + weight
+            return
+
+        if len(counts) < self.capacity:
+            counts[key] = weight
+            self.errors[key] = 0
+            heapq.heappush(self.heap, (weight, key))
+            return
+
+        # Replace the current minimum; the newcomer inherits its count as error
+        heap = self.heap
+        while True:
+            min_count, min_key = heap[0]
+            current = counts.get(min_key)
+            if current == min_count:
+                break
+            heapq.heappop(heap)
+            if current is not None:
+                heapq.heappush(heap, (current, min_key))
+
+        heapq.heappop(heap)
+        del counts[min_key]
+        del self.errors[min_key]
+        counts[key] = min_count + weight
+        self.errors[key] = min_count
+        heapq.heappush(heap, (min_count + weight, key))
+
+    def top(self, count=10):
+        """أثقل العناصر: قائمة (key, count, error)"""
+        ranked = heapq.nlargest(count, self.counts.items(), key=lambda item: item[1])
+        return [(key, value, self.errors[key]) for key, value in ranked]
+
+    def clear(self):
+        self.counts = {}
+        self.errors = {}
+        self.heap = []
+        self.total = 0
+
+
+# Test the module
+if __name__ == "__main__":
+    import random
+    import time
+
+    for true_count in (10, 50, 200, 1000, 10000, 100000):
+        hll = HyperLogLog(p=7)
+        for value in random.sample(range(1 << 40), true_count):
+            hll.add(value)
+        print(f"HLL p=7: true={true_count:>6} estimate={hll.count():>9.0f} ({len(hll.registers)} bytes)")
+
+    cms = CountMinSketch()
+    heavy = 42
+    for _ in range(5000):
+        cms.add(heavy)
+    for _ in range(200000):
+        cms.add(random.getrandbits(32))
+    print(f"CMS: heavy true=5000 estimate={cms.query(heavy)} "
+          f"({len(cms.table) * cms.table.itemsize // 1024} KB)")
+
+    # Zipf-like stream: a few heavy keys among many light ones
+    summary = SpaceSaving(capacity=64)
+    for _ in range(300000):
+        summary.add(int(random.paretovariate(1.2)) if random.random() < 0.5 else random.getrandbits(24))
+    print("SpaceSaving top-5:", [(k, c) for k, c, _ in summary.top(5)])
+
+    start = time.perf_counter()
+    hll = HyperLogLog()
+    for i in range(200000):
+        hll.add(i)
+    print(f"HLL add: {200000 / (time.perf_counter() - start):,.0f} ops/s")
@@ -0,0 +1,250 @@
+"""
+Stats Rollup Module
+وحدة تجميع إحصائيات الشبكة زمنياً والاحتفاظ بها
+
+الوظائف:
+- جداول تجميع للدقيقة والساعة واليوم (min/max/avg/p95 لكل مقياس)
+- ضاغط دوري يجمّع الفترات المكتملة فقط بدءاً من آخر فترة محفوظة
+- حذف البيانات الخام والمجمّعة بعد مدة احتفاظ قابلة للضبط
+- اختيار المستوى المناسب تلقائياً حسب المدى الزمني للاستعلام
+"""
+
+import time
+from datetime import datetime, timezone
+
+METRICS = ('total_devices', 'active_devices', 'download_speed', 'upload_speed',
+           'bandwidth_usage', 'packet_loss', 'latency')
+AGGREGATES = ('min', 'max', 'avg', 'p95')
+
+# (name, table, bucket seconds, default retention in hours; None = keep forever)
+TIERS = (
+    ('raw', 'network_stats', 5, 48),
+    ('1m', 'network_stats_1m', 60, 14 * 24),
+    ('1h', 'network_stats_1h', 3600, 400 * 24),
+    ('1d', 'network_stats_1d', 86400, None),
+)
+TIER_TABLES = {name: table for name, table, _, _ in TIERS}
+
+# Span of source rows rolled up per compaction step (bucket aligned)
+STEP_SECONDS = {'1m': 86400, '1h': 30 * 86400, '1d': 366 * 86400}
+
+TS_FORMAT = '%Y-%m-%d %H:%M:%S'     # CURRENT_TIMESTAMP (UTC)
+
+
+def rollup_columns():
+    """أسماء أعمدة التجميع بالترتيب: <metric>_<min|max|avg|p95>"""
+    return [f'{metric}_{agg}' for metric in METRICS for agg in AGGREGATES]
+
+
+def rollup_schema():
+    """أوامر إنشاء جداول التجميع"""
+    columns = ',\n'.join(f'    {column} REAL' for column in rollup_columns())
+    return [f'''
+        CREATE TABLE IF NOT EXISTS {table} (
+            bucket TIMESTAMP PRIMARY KEY,
+            samples INTEGER,
+        {columns}
+        ) WITHOUT ROWID
+    ''' for name, table, _, _ in TIERS if name != 'raw']
+
+
+def select_tier(hours, retention=None, max_points=1500):
+    """أدق مستوى ما زال يحتفظ بآخر hours ساعة بعدد نقاط لا يتجاوز max_points"""
+    retention = retention or {}
+    for name, _, size, default_hours in TIERS:
+        keep = retention.get(name, default_hours)
+        if (keep is None or hours <= keep) and hours * 3600 / size <= max_points:
+            return name
+    return TIERS[-1][0]
+
+
+def _ts(epoch):
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime(TS_FORMAT)
+
+
+def _epoch(text):
+    # Rows written through Django carry microseconds and may use 'T'
+    value = datetime.strptime(str(text)[:19].replace('T', ' '), TS_FORMAT)
+    return int(value.replace(tzinfo=timezone.utc).timestamp())
+
+
+def aggregate(rows, size, raw):
+    """
+    تجميع صفوف مرتبة زمنياً في فترات طولها size ثانية
+    الصف الخام: (epoch, <metrics>)
+    صف التجميع: (epoch, samples, <metric>_min, _max, _avg, _p95 ...)
+    فوق مستوى الدقيقة تكون p95 تقريبية: p95 لقيم p95 للفترات الأصغر
+    """
+    # The backend imports this module for select_tier() only
+    import numpy as np
+
+    data = np.array(rows, dtype=np.float64)     # NULL -> nan
+    buckets = data[:, 0].astype(np.int64) // size * size
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    group = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, len(data)]))
+    weights = np.ones(len(data)) if raw else np.nan_to_num(data[:, 1], nan=1.0)
+
+    columns = [np.add.reduceat(weights, starts)]
+    for index in range(len(METRICS)):
+        if raw:
+            low = high = mean = tail = data[:, 1 + index]
+        else:
+            low, high, mean, tail = (data[:, 2 + 4 * index + k] for k in range(4))
+
+        valid = ~np.isnan(mean)
+        total = np.add.reduceat(np.where(valid, weights, 0.0), starts)
+        weighted = np.add.reduceat(np.where(valid, mean * weights, 0.0), starts)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            avg = np.where(total > 0, weighted / total, np.nan)
+
+        # Nearest-rank p95 per bucket: sort by (bucket, value), nan sorts last
+        ranked = tail[np.lexsort((tail, group))]
+        count = np.add.reduceat((~np.isnan(tail)).astype(np.int64), starts)
+        rank = starts + np.maximum(np.ceil(count * 0.95).astype(np.int64) - 1, 0)
+        p95 = np.where(count > 0, ranked[rank], np.nan)
+
+        columns += [np.fmin.reduceat(low, starts), np.fmax.reduceat(high, starts), avg, p95]
+
+    matrix = np.column_stack(columns).tolist()
+    return [(_ts(int(bucket)), *[None if value != value else value for value in row])
+            for bucket, row in zip(buckets[starts], matrix)]
+
+
+class StatsRollup:
+    """ضاغط جداول التجميع؛ كل الدوال تعمل على اتصال الكتابة"""
+
+    def __init__(self, retention=None):
+        self.retention = {name: hours for name, _, _, hours in TIERS}
+        self.retention.update(retention or {})
+        self.stats = {'runs': 0, 'buckets': 0, 'expired': 0}
+
+    def _source_query(self, name, table):
+        if name == 'raw':
+            return (f"SELECT CAST(strftime('%s', timestamp) AS INTEGER), {', '.join(METRICS)} "
+                    f"FROM {table} WHERE timestamp >= ? AND timestamp < ? ORDER BY timestamp")
+        return (f"SELECT CAST(strftime('%s', bucket) AS INTEGER), samples, {', '.join(rollup_columns())} "
+                f"FROM {table} WHERE bucket >= ? AND bucket < ? ORDER BY bucket")
+
+    def _compact_step(self, conn, source, target, now):
+        """تجميع نافذة واحدة من المستوى source في target؛ يعيد (عدد الفترات, هل بقي المزيد)"""
+        src_name, src_table, src_size, _ = source
+        name, table, size, _ = target
+        src_time = 'timestamp' if src_name == 'raw' else 'bucket'
+        end = int(now) // size * size       # complete buckets only
+        if src_name != 'raw':
+            # ...whose source buckets are all rolled up already
+            src_last = conn.execute(f'SELECT MAX(bucket) FROM {src_table}').fetchone()[0]
+            if src_last is None:
+                return 0, False
+            end = min(end, (_epoch(src_last) + src_size) // size * size)
+
+        last = conn.execute(f'SELECT MAX(bucket) FROM {table}').fetchone()[0]
+        if last is None:
+            first = conn.execute(f'SELECT MIN({src_time}) FROM {src_table}').fetchone()[0]
+            if first is None:
+                return 0, False
+            start = _epoch(first) // size * size
+        else:
+            start = _epoch(last) + size
+        if start >= end:
+            return 0, False
+
+        query = self._source_query(src_name, src_table)
+        stop = min(start + STEP_SECONDS[name], end)
+        rows = conn.execute(query, (_ts(start), _ts(stop))).fetchall()
+        if not rows:
+            # Skip a gap (agent switched off) straight to the next stored sample
+            following = conn.execute(f'SELECT MIN({src_time}) FROM {src_table} WHERE {src_time} >= ?',
+                                     (_ts(stop),)).fetchone()[0]
+            if following is None:
+                return 0, False
+            start = _epoch(following) // size * size
+            if start >= end:
+                return 0, False
+            stop = min(start + STEP_SECONDS[name], end)
+            rows = conn.execute(query, (_ts(start), _ts(stop))).fetchall()
+
+        buckets = aggregate(rows, size, raw=src_name == 'raw')
+        columns = ['bucket', 'samples'] + rollup_columns()
+        conn.executemany(f'''
+            INSERT OR REPLACE INTO {table} ({', '.join(columns)})
+            VALUES ({', '.join('?' * len(columns))})
+        ''', buckets)
+        return len(buckets), stop < end
+
+    def compact(self, conn, now=None):
+        """
+        خطوة ضغط واحدة لكل مستوى ثم حذف ما تجاوز مدة الاحتفاظ
+        يعيد {'buckets', 'expired', 'pending'}؛ pending يعني وجود نوافذ متأخرة لخطوة أخرى
+        """
+        now = time.time() if now is None else now
+        written, pending = 0, False
+        for source, target in zip(TIERS, TIERS[1:]):
+            count, more = self._compact_step(conn, source, target, now)
+            written += count
+            pending = pending or more
+        expired = self.expire(conn, now)
+
+        self.stats['runs'] += 1
+        self.stats['buckets'] += written
+        self.stats['expired'] += expired
+        return {'buckets': written, 'expired': expired, 'pending': pending}
+
+    def expire(self, conn, now=None):
+        """حذف الصفوف الأقدم من مدة الاحتفاظ (دون حذف ما لم يُجمَّع بعد في المستوى التالي)"""
+        now = time.time() if now is None else now
+        expired = 0
+        for index, (name, table, _, _) in enumerate(TIERS):
+            hours = self.retention.get(name)
+            if not hours:
+                continue
+            cutoff = now - hours * 3600
+            if index + 1 < len(TIERS):
+                _, next_table, next_size, _ = TIERS[index + 1]
+                rolled = conn.execute(f'SELECT MAX(bucket) FROM {next_table}').fetchone()[0]
+                if rolled is None:
+                    continue
+                cutoff = min(cutoff, _epoch(rolled) + next_size)
+            column = 'timestamp' if name == 'raw' else 'bucket'
+            expired += conn.execute(f'DELETE FROM {table} WHERE {column} < ?', (_ts(cutoff),)).rowcount
+        return expired
+
+
+# Test the module
+if __name__ == "__main__":
+    import random
+    import sqlite3
+
+    conn = sqlite3.connect(':memory:')
+    conn.execute(f'''CREATE TABLE network_stats (id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TIMESTAMP,
+                     {', '.join(f'{metric} REAL' for metric in METRICS)})''')
+    conn.execute('CREATE INDEX idx_network_stats_timestamp ON network_stats (timestamp)')
+    for statement in rollup_schema():
+        conn.execute(statement)
+
+    # 30 days of one sample every 5 seconds
+    now = int(time.time())
+    start = now - 30 * 86400
+    random.seed(1)
+    conn.executemany(f'INSERT INTO network_stats (timestamp, {", ".join(METRICS)}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                     [(_ts(t), 50, random.randint(10, 40), random.random() * 100, random.random() * 20,
+                       random.random() * 120, 0.0, random.random() * 30) for t in range(start, now, 5)])
+    raw_rows = conn.execute('SELECT COUNT(*) FROM network_stats').fetchone()[0]
+
+    rollup = StatsRollup()
+    began = time.perf_counter()
+    steps = 0
+    while True:
+        steps += 1
+        if not rollup.compact(conn, now)['pending']:
+            break
+    elapsed = time.perf_counter() - began
+
+    print(f"{raw_rows:,} raw rows compacted in {elapsed:.2f}s ({steps} steps), "
+          f"{rollup.stats['expired']:,} raw rows expired")
+    for name, table, _, _ in TIERS:
+        print(f"  {name:>3}: {conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]:,} rows")
+    for hours in (1, 6, 24, 24 * 7, 24 * 90):
+        print(f"  last {hours}h -> {select_tier(hours, rollup.retention)}")
+    print(conn.execute('SELECT bucket, samples, download_speed_min, download_speed_avg, download_speed_p95, '
+                       'download_speed_max FROM network_stats_1d ORDER BY bucket DESC LIMIT 1').fetchone())
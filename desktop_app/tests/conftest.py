@@ -0,0 +1,21 @@
+"""
+Test configuration
+إعداد الاختبارات: وحدات desktop_app مسطحة وتُستورد بأسمائها مباشرة
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def db(tmp_path):
+    """قاعدة بيانات جديدة (كل الترحيلات مطبقة) تُغلق بعد الاختبار"""
+    from database import DatabaseManager
+
+    manager = DatabaseManager(str(tmp_path / 'test.db'))
+    yield manager
+    manager.close()
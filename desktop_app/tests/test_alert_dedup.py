@@ -0,0 +1,82 @@
+"""اختبارات دمج التنبيهات المتكررة"""
+
+import threading
+
+from alert_pipeline import fingerprint, normalize_details
+from database import DatabaseManager
+
+
+def _alert(description='Port scan detected: 14 ports in 60 s', severity='Medium', **extra):
+    alert = {'type': 'Port Scan', 'severity': severity, 'description': description,
+             'source_ip': '10.0.0.66', 'target_ip': '10.0.0.1'}
+    alert.update(extra)
+    return alert
+
+
+def _rows(db):
+    return db.pool.reader().execute(
+        'SELECT id, severity, occurrences, resolved FROM security_alerts ORDER BY id').fetchall()
+
+
+def test_fingerprint_ignores_volatile_parts():
+    assert fingerprint(_alert()) == fingerprint(_alert('⚠️  Port scan detected: 51 ports in 30 s'))
+    assert normalize_details('CVE-2021-44228 on port 8080 (v2.4.49)') == 'cve-2021-44228 on port 8080 (v2.4.49)'
+    assert fingerprint(_alert()) != fingerprint(_alert(target_ip='10.0.0.2'))
+    assert fingerprint(_alert()) != fingerprint(_alert(type='Host Sweep'))
+
+
+def test_repeat_merges_and_escalates(db):
+    assert db.save_security_alert(_alert())
+    assert db.save_security_alert(_alert('Port scan detected: 200 ports in 5 s', severity='High'))
+    assert db.save_security_alert(_alert(severity='Low'))
+    [(_, severity, occurrences, resolved)] = _rows(db)
+    assert (severity, occurrences, resolved) == ('High', 3, 0)
+    assert db.open_alerts.stats == {'new': 1, 'merged': 2}
+
+
+def test_resolved_alert_opens_a_new_row(db):
+    db.save_security_alert(_alert())
+    alert_id = _rows(db)[0][0]
+    db.resolve_alert(alert_id)
+    db.save_security_alert(_alert())
+    assert [(occurrences, resolved) for _, _, occurrences, resolved in _rows(db)] == [(1, 1), (1, 0)]
+
+
+def test_resolve_and_repeats_from_other_threads(db):
+    db.save_security_alert(_alert())
+    alert_id = _rows(db)[0][0]
+    savers = [threading.Thread(target=db.save_security_alert, args=(_alert(),)) for _ in range(20)]
+    for thread in savers[:10]:
+        thread.start()
+    db.resolve_alert(alert_id)
+    for thread in savers[10:]:
+        thread.start()
+    for thread in savers:
+        thread.join()
+
+    # Repeats merged before the resolve; the ones after it share one new open row
+    rows = _rows(db)
+    assert sum(occurrences for _, _, occurrences, _ in rows) == 21
+    assert [resolved for _, _, _, resolved in rows] == [1, 0]
+    open_ids = [i for i, _, _, resolved in rows if not resolved]
+    assert [i for i, _ in db.open_alerts.alerts.values()] == open_ids
+
+
+def test_resolved_elsewhere_opens_a_new_row(db):
+    db.save_security_alert(_alert())
+    # e.g. resolved from the web dashboard: the in-memory index still has it
+    db.pool.execute('UPDATE security_alerts SET resolved = 1')
+    db.save_security_alert(_alert())
+    assert [resolved for _, _, _, resolved in _rows(db)] == [1, 0]
+
+
+def test_open_alerts_survive_restart(tmp_path):
+    path = str(tmp_path / 'restart.db')
+    db = DatabaseManager(path)
+    db.save_security_alert(_alert())
+    db.close()
+
+    db = DatabaseManager(path)
+    db.save_security_alert(_alert())
+    assert [occurrences for _, _, occurrences, _ in _rows(db)] == [2]
+    db.close()
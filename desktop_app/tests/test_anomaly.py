@@ -0,0 +1,51 @@
+"""اختبارات تدريب خطوط الأساس لكاشف الشذوذ"""
+
+import numpy as np
+
+from anomaly import BackfillMoments, MetricBaseline, TrafficAnomalyDetector
+
+
+def _baseline(chunks, alpha=0.05):
+    moments = BackfillMoments(alpha)
+    for hours, values in chunks:
+        moments.add(hours, values)
+    baseline = MetricBaseline(alpha)
+    moments.apply(baseline, var_scale=5)
+    return baseline
+
+
+def test_chunked_moments_match_one_pass():
+    rng = np.random.default_rng(1)
+    hours = np.repeat(np.arange(24), 50)
+    values = 5 + rng.normal(0, 1, len(hours))
+
+    whole = _baseline([(hours, values)])
+    chunked = _baseline([(hours[i:i + 37], values[i:i + 37]) for i in range(0, len(values), 37)])
+
+    assert chunked.count == whole.count == len(values)
+    assert np.isclose(chunked.mean, whole.mean)
+    assert np.isclose(chunked.var, whole.var)
+    assert np.allclose(chunked.hour_mean, whole.hour_mean)
+    assert np.allclose(chunked.hour_var, whole.hour_var)
+
+
+def test_backfill_from_db_streams_the_history(db, monkeypatch):
+    assert TrafficAnomalyDetector().backfill_from_db(db) == 0
+    rows = [{'download_speed': 10.0 + n % 3, 'upload_speed': 1.0} for n in range(12)]
+    for row in rows:
+        db.save_network_stats(row)
+
+    chunk_sizes = []
+    iterate = db.iter_network_stats_series
+
+    def _chunks(columns, hours=None):
+        for chunk in iterate(columns, hours, chunk_size=5):
+            chunk_sizes.append(len(chunk))
+            yield chunk
+
+    monkeypatch.setattr(db, 'iter_network_stats_series', _chunks)
+    detector = TrafficAnomalyDetector()
+    assert detector.backfill_from_db(db) == 12
+    assert chunk_sizes == [5, 5, 2]
+    assert 10.0 < detector.baselines['download_speed'].mean < 12.0
+    assert detector.baselines['upload_speed'].var == 0.0
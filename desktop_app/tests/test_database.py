@@ -0,0 +1,109 @@
+"""اختبارات مخطط قاعدة البيانات: الترحيلات وحفظ الأجهزة (UPSERT)"""
+
+import sqlite3
+
+from database import MIGRATIONS, DatabaseManager
+
+
+class _LegacyWriter:
+    """create_tables() على اتصال عادي: جداول الإصدار 0 بدون أي ترحيل"""
+
+    def __init__(self, conn):
+        self.pool = self
+        self.conn = conn
+
+    def write(self, fn):
+        return fn(self.conn)
+
+
+def _legacy_database(path):
+    conn = sqlite3.connect(path)
+    DatabaseManager.create_tables(_LegacyWriter(conn))
+    conn.executemany('''
+        INSERT INTO devices (ip, mac, hostname, status, first_seen, last_seen, is_trusted)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', [
+        ('10.0.0.5', 'AA-BB-CC-00-00-01', 'old', 'Inactive', '2026-01-01', '2026-01-02', 1),
+        ('10.0.0.6', 'aa:bb:cc:00:00:01', 'new', 'Active', '2026-02-01', '2026-02-02', 0),
+        ('10.0.0.7', 'unknown', 'a', 'Active', '2026-02-01', '2026-02-01', 0),
+        ('10.0.0.8', '', 'b', 'Active', '2026-02-01', '2026-02-01', 0),
+    ])
+    conn.execute('''
+        INSERT INTO security_alerts (timestamp, alert_type, severity, description)
+        VALUES ('2026-02-03 10:00:00', 'Port Scan', 'High', 'legacy alert')
+    ''')
+    conn.commit()
+    conn.close()
+
+
+def test_migrations_upgrade_a_legacy_database(tmp_path):
+    path = str(tmp_path / 'legacy.db')
+    _legacy_database(path)
+
+    db = DatabaseManager(path)
+    reader = db.pool.reader()
+    assert reader.execute('PRAGMA user_version').fetchone()[0] == len(MIGRATIONS)
+
+    # Duplicate MACs folded into the most recent row, keeping the earliest first_seen
+    rows = reader.execute('SELECT ip, mac, hostname, first_seen, is_trusted FROM devices ORDER BY ip').fetchall()
+    assert rows == [
+        ('10.0.0.6', 'aa:bb:cc:00:00:01', 'new', '2026-01-01', 1),
+        ('10.0.0.7', None, 'a', '2026-02-01', 0),
+        ('10.0.0.8', None, 'b', '2026-02-01', 0),
+    ]
+    assert reader.execute('SELECT occurrences, last_seen FROM security_alerts').fetchone() == \
+        (1, '2026-02-03 10:00:00')
+    assert db.get_statistics()['total_devices'] == 3
+    db.close()
+
+    # Reopening applies nothing twice
+    db = DatabaseManager(path)
+    assert db.pool.reader().execute('SELECT COUNT(*) FROM devices').fetchone()[0] == 3
+    db.close()
+
+
+def test_save_devices_upserts_by_mac(db):
+    first = db.save_devices([
+        {'ip': '10.0.0.5', 'mac': 'AA-BB-CC-00-00-01', 'hostname': 'laptop'},
+        {'ip': '10.0.0.9', 'mac': 'unknown', 'hostname': 'printer'},
+    ])
+    assert (len(first['new']), len(first['updated'])) == (2, 0)
+
+    # New IP for the same MAC, and the MAC-less device again by IP
+    second = db.save_devices([
+        {'ip': '10.0.0.6', 'mac': 'aa:bb:cc:00:00:01', 'hostname': 'laptop'},
+        {'ip': '10.0.0.9', 'mac': None, 'hostname': 'printer', 'status': 'Inactive'},
+        {'ip': '10.0.0.10', 'mac': 'aa:bb:cc:00:00:02'},
+    ])
+    assert (len(second['new']), len(second['updated'])) == (1, 2)
+
+    rows = db.pool.reader().execute('SELECT ip, mac, status FROM devices ORDER BY id').fetchall()
+    assert rows == [('10.0.0.6', 'aa:bb:cc:00:00:01', 'Active'),
+                    ('10.0.0.9', None, 'Inactive'),
+                    ('10.0.0.10', 'aa:bb:cc:00:00:02', 'Active')]
+    assert db.is_new_device({'ip': '10.0.0.11', 'mac': 'aa:bb:cc:00:00:03'})
+    assert not db.is_new_device({'ip': '10.0.0.11', 'mac': 'AA-BB-CC-00-00-02'})
+
+
+def test_last_sighting_in_a_scan_wins(db):
+    result = db.save_devices([{'ip': '10.0.0.5', 'mac': 'aa:bb:cc:00:00:01'},
+                              {'ip': '10.0.0.6', 'mac': 'AA:BB:CC:00:00:01'}])
+    assert len(result['new']) == 1
+    assert db.pool.reader().execute('SELECT ip FROM devices').fetchall() == [('10.0.0.6',)]
+
+
+def test_device_list_is_served_from_the_index(db):
+    db.save_devices([{'ip': '10.0.0.5', 'mac': '02:00:00:00:00:05'}])
+    writes = db.pool.stats['writes']
+    assert [d['ip'] for d in db.get_all_devices()] == ['10.0.0.5']
+    assert db.pool.stats['writes'] == writes
+
+    # A row written by another connection (the backend) shows up after the next maintenance write
+    other = sqlite3.connect(db.db_path)
+    other.execute("INSERT INTO devices (ip, mac, status, last_seen) VALUES ('10.0.0.6', '02:00:00:00:00:06', 'Active', ?)",
+                  ('2000-01-01T00:00:00',))
+    other.commit()
+    other.close()
+    assert len(db.get_all_devices()) == 1
+    assert db.expire_active_devices() == 1
+    assert {d['ip']: d['status'] for d in db.get_all_devices()} == {'10.0.0.5': 'Active', '10.0.0.6': 'Inactive'}
@@ -0,0 +1,87 @@
+"""اختبارات طبقة الاتصالات (خيط الكتابة و SAVEPOINT لكل عملية)"""
+
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from db_connection import ConnectionManager
+
+
+@pytest.fixture
+def pool(tmp_path):
+    manager = ConnectionManager(str(tmp_path / 'pool.db'))
+    manager.execute('CREATE TABLE items (id INTEGER PRIMARY KEY, value TEXT)')
+    yield manager
+    manager.close()
+
+
+def _values(pool):
+    return [row[0] for row in pool.reader().execute('SELECT value FROM items ORDER BY id')]
+
+
+def test_failed_job_only_rolls_back_its_savepoint(pool):
+    release = threading.Event()
+
+    def insert(value, fail=False):
+        def _job(conn):
+            conn.execute('INSERT INTO items (value) VALUES (?)', (value,))
+            if fail:
+                raise ValueError(value)
+        return _job
+
+    # Hold the writer so the next three jobs are grouped into one transaction
+    started = threading.Event()
+    blocker = threading.Thread(target=pool.write, args=(lambda conn: started.set() or release.wait(5),))
+    blocker.start()
+    started.wait(5)
+    transactions = pool.stats['transactions']
+
+    errors = []
+
+    def submit(job):
+        try:
+            pool.write(job)
+        except ValueError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=submit, args=(job,))
+               for job in (insert('a'), insert('b', fail=True), insert('c'))]
+    for thread in threads:
+        thread.start()
+        # Keep the queue order deterministic
+        while pool._queue.qsize() < threads.index(thread) + 1:
+            time.sleep(0.001)
+    release.set()
+    for thread in threads + [blocker]:
+        thread.join()
+
+    assert _values(pool) == ['a', 'c']
+    assert errors == ['b']
+    assert pool.stats['transactions'] - transactions == 2
+
+
+def test_nested_write_joins_the_current_transaction(pool):
+    def outer(conn):
+        conn.execute("INSERT INTO items (value) VALUES ('outer')")
+        pool.write(lambda inner: inner.execute("INSERT INTO items (value) VALUES ('inner')"))
+        raise RuntimeError('undo both')
+
+    with pytest.raises(RuntimeError):
+        pool.write(outer)
+    assert _values(pool) == []
+
+
+def test_writes_are_visible_to_readers_on_return(pool):
+    _, row_id = pool.execute('INSERT INTO items (value) VALUES (?)', ('x',))
+    assert pool.reader().execute('SELECT value FROM items WHERE id = ?', (row_id,)).fetchone() == ('x',)
+    assert pool.reader().execute('PRAGMA journal_mode').fetchone() == ('wal',)
+
+
+def test_write_after_close_raises(tmp_path):
+    manager = ConnectionManager(str(tmp_path / 'closed.db'))
+    manager.close()
+    with pytest.raises(sqlite3.ProgrammingError):
+        manager.execute('CREATE TABLE t (x)')
+    manager.close()
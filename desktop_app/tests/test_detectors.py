@@ -0,0 +1,32 @@
+"""اختبارات كاشف ARP Spoofing"""
+
+from detectors import ArpSpoofDetector
+from packet_decoder import ETH_P_ARP, Packet
+
+
+def _arp(ip, mac):
+    pkt = Packet(0.0, 42, ETH_P_ARP)
+    pkt.src_ip, pkt.src_mac, pkt.dst_ip = ip, mac, 0x0A000001
+    return pkt
+
+
+def test_ip_moving_to_another_mac_alerts_once():
+    detector = ArpSpoofDetector()
+    assert detector.process(_arp(0x0A000005, b'\x02\x00\x00\x00\x00\x01')) == []
+    [alert] = detector.process(_arp(0x0A000005, b'\x02\x00\x00\x00\x00\x02'))
+    assert alert['type'] == 'ARP Spoofing'
+    assert detector.process(_arp(0x0A000005, b'\x02\x00\x00\x00\x00\x02')) == []
+    assert list(detector.mac_ips) == [b'\x02\x00\x00\x00\x00\x02']
+
+
+def test_mac_table_stays_bounded_under_churn():
+    detector = ArpSpoofDetector(max_entries=100)
+    for n in range(5000):
+        detector.process(_arp(0x0A000000 + n, n.to_bytes(6, 'big')))
+    assert len(detector.bindings) == 100
+    assert len(detector.mac_ips) == 100
+
+    # Rebinding every IP to new MACs empties the old MACs' entries
+    for n in range(4900, 5000):
+        detector.process(_arp(0x0A000000 + n, (n + 10000).to_bytes(6, 'big')))
+    assert len(detector.mac_ips) == 100
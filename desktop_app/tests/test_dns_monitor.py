@@ -0,0 +1,81 @@
+"""اختبارات مراقبة DNS"""
+
+import struct
+
+from dns_monitor import DnsMonitor
+from packet_decoder import ETH_P_IP, PROTO_UDP, Packet, ip_to_int
+
+
+def _name(name):
+    return b''.join(bytes([len(label)]) + label.encode() for label in name.split('.')) + b'\x00'
+
+
+def _message(txid, name, addresses=(), ttl=300, cname=None, query=False):
+    records = []
+    owner = b'\xc0\x0c'
+    if cname:
+        records.append(owner + struct.pack('!HHIH', 5, 1, ttl, len(_name(cname))) + _name(cname))
+        owner = _name(cname)
+    for address in addresses:
+        records.append(owner + struct.pack('!HHIH', 1, 1, ttl, 4) + bytes(map(int, address.split('.'))))
+    flags = 0x0100 if query else 0x8180
+    return (struct.pack('!HHHHHH', txid, flags, 1, len(records), 0, 0)
+            + _name(name) + struct.pack('!HH', 1, 1) + b''.join(records))
+
+
+def _packet(ts, src, dst, payload, client_port=40000):
+    pkt = Packet(ts, len(payload) + 42, ETH_P_IP)
+    pkt.proto = PROTO_UDP
+    pkt.src_ip, pkt.dst_ip = ip_to_int(src), ip_to_int(dst)
+    pkt.src_port, pkt.dst_port = (client_port, 53) if dst == '192.168.1.1' else (53, client_port)
+    pkt.buf, pkt.payload_offset, pkt.payload_length = payload, 0, len(payload)
+    return pkt
+
+
+def _monitor(**kwargs):
+    return DnsMonitor(resolvers=['192.168.1.1'], local_clients=['192.168.1.10'], **kwargs)
+
+
+def _answer(monitor, ts, txid, **kwargs):
+    return monitor.process(_packet(ts, '192.168.1.1', '192.168.1.10',
+                                   _message(txid, 'site.example', **kwargs), 40000 + txid))
+
+
+def test_clients_are_evicted_least_recently_active():
+    monitor = _monitor(max_pending=2)
+    for ts, client in enumerate(('192.168.1.10', '192.168.1.11', '192.168.1.10', '192.168.1.12')):
+        monitor.process(_packet(float(ts), client, '192.168.1.1', _message(ts, 'a.example', query=True)))
+    assert set(monitor.clients) == {ip_to_int('192.168.1.10'), ip_to_int('192.168.1.12')}
+
+
+def test_unexpected_resolver_only_for_local_clients():
+    monitor = _monitor()
+    payload = _message(1, 'mail.example', ['10.1.1.1'])
+    gateway = _packet(1.0, '10.0.0.1', '192.168.1.50', payload)
+    assert monitor.process(gateway) == []
+    local = _packet(2.0, '203.0.113.5', '192.168.1.10', payload)
+    assert [alert['type'] for alert in monitor.process(local)] == ['Unexpected DNS Resolver']
+    assert monitor.summary()['unexpected_resolvers'] == ['203.0.113.5']
+
+
+def test_cdn_rotation_is_not_poisoning():
+    monitor = _monitor()
+    assert _answer(monitor, 10.0, 1, addresses=['198.51.100.1'], ttl=120, cname='edge.cdn.example') == []
+    # Disjoint set, same delegation, TTL still counting down
+    assert _answer(monitor, 40.0, 2, addresses=['198.51.100.2'], ttl=60, cname='edge.cdn.example') == []
+    assert monitor.counters['rotations'] == 1
+
+
+def test_fresh_ttl_before_expiry_is_poisoning():
+    monitor = _monitor()
+    _answer(monitor, 10.0, 1, addresses=['93.184.216.34'], ttl=300)
+    alerts = _answer(monitor, 40.0, 2, addresses=['6.6.6.6'], ttl=300)
+    assert [alert['type'] for alert in alerts] == ['DNS Cache Poisoning']
+
+
+def test_changed_delegation_is_poisoning():
+    monitor = _monitor()
+    _answer(monitor, 10.0, 1, addresses=['198.51.100.1'], ttl=120, cname='edge.cdn.example')
+    alerts = _answer(monitor, 40.0, 2, addresses=['6.6.6.6'], ttl=60, cname='evil.example')
+    assert [alert['type'] for alert in alerts] == ['DNS Cache Poisoning']
+    assert 'evil.example' in alerts[0]['description']
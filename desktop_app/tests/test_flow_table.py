@@ -0,0 +1,58 @@
+"""اختبارات جدول التدفقات"""
+
+from flow_table import END_EVICTED, END_IDLE, FLOW_BYTES, FlowTable, flow_key, split_flow_key
+
+
+def _key(n):
+    return flow_key(6, 0x0A000000 + n, 40000 + n, 0x0A000001, 443)
+
+
+def test_flow_key_round_trip():
+    assert split_flow_key(flow_key(17, 0x0A000002, 5353, 0xE00000FB, 53)) == (17, 0x0A000002, 5353, 0xE00000FB, 53)
+
+
+def test_packets_accumulate_per_flow():
+    table = FlowTable()
+    table.update(_key(1), 1.0, 60, 0x02)
+    table.update(_key(1), 2.0, 1500, 0x10)
+    table.update(_key(2), 2.0, 100)
+    slot = table.flows[_key(1)]
+    assert len(table) == 2
+    assert (table.packets[slot], table.bytes[slot], table.tcp_flags[slot]) == (2, 1560, 0x12)
+
+
+def test_lru_eviction_exports_least_recent():
+    exported = []
+    table = FlowTable(max_flows=2, exporter=exported.extend, export_batch=1)
+    table.update(_key(1), 1.0, 60)
+    table.update(_key(2), 1.0, 60)
+    table.update(_key(1), 1.5, 60)      # key 2 is now least recently used
+    table.update(_key(3), 2.0, 60)
+    assert set(table.flows) == {_key(1), _key(3)}
+    assert [(f['src_port'], f['end_reason']) for f in exported] == [(40002, END_EVICTED)]
+
+
+def test_max_bytes_caps_flow_count():
+    assert FlowTable(max_bytes=100 * FLOW_BYTES).max_flows == 100
+    assert FlowTable(max_flows=10, max_bytes=1 << 30).max_flows == 10
+
+
+def test_sweep_expires_idle_flows_without_packets():
+    exported = []
+    table = FlowTable(idle_timeout=60, exporter=exported.extend, export_batch=1000)
+    table.update(_key(1), 1000.0, 60)
+    table.update(_key(2), 1050.0, 60)
+
+    # No packets arrive: only the timer-driven sweep can expire and export
+    assert table.sweep(1055.0) == 0
+    assert table.sweep(1070.0) == 1
+    assert [(f['src_port'], f['end_reason']) for f in exported] == [(40001, END_IDLE)]
+    assert list(table.flows) == [_key(2)]
+
+
+def test_sweep_is_rate_limited():
+    table = FlowTable(idle_timeout=1, sweep_interval=10)
+    table.update(_key(1), 100.0, 60)
+    table.update(_key(2), 105.0, 60)
+    assert table.sweep(109.0) == 0      # within sweep_interval of the sweep at t=100
+    assert table.sweep(116.0) == 2
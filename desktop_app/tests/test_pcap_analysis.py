@@ -0,0 +1,71 @@
+"""اختبارات الفلتر المسبق لتحليل ملفات الالتقاط"""
+
+import json
+
+from packet_decoder import ALL_PAYLOAD, PROTO_TCP, PROTO_UDP, accept_frame
+from pcap_analysis import OfflineAnalyzer, PcapFile, merge_payload_filters, write_synthetic_pcap
+from signatures import ENCRYPTED_PORTS, PayloadInspector, SignatureEngine
+
+
+def _inspector(tmp_path, rules):
+    path = tmp_path / 'signatures.json'
+    path.write_text(json.dumps({'signatures': rules}))
+    return PayloadInspector(SignatureEngine(str(path)))
+
+
+def _all_records(pcap):
+    return [(offset, caplen) for _, _, offset, caplen, _ in pcap.records()]
+
+
+def test_inlined_prefilter_matches_accept_frame(tmp_path):
+    path = str(tmp_path / 'mix.pcap')
+    write_synthetic_pcap(path, 5000)
+    filters = {PROTO_TCP: (None, ENCRYPTED_PORTS), PROTO_UDP: (frozenset({514}), frozenset())}
+    with PcapFile(path) as pcap:
+        for wants, payload_filters in (({'arp', 'syn', 'dns', 'payload'}, None),
+                                       ({'arp', 'syn', 'dns', 'payload'}, filters),
+                                       ({'syn', 'payload'}, {PROTO_UDP: (None, frozenset())}),
+                                       ({'dns'}, None)):
+            expected = [offset for offset, caplen in _all_records(pcap)
+                        if accept_frame(pcap.buf, offset, caplen, pcap.linktype, wants, payload_filters)]
+            passed = [offset for _, _, offset, _, _ in pcap.records(wants, payload_filters=payload_filters)]
+            assert passed == expected
+            assert 0 < len(passed) < pcap.packets_read
+
+
+def test_payload_inspection_skips_encrypted_and_empty_segments(tmp_path):
+    path = str(tmp_path / 'mix.pcap')
+    write_synthetic_pcap(path, 20000)
+    everything = OfflineAnalyzer(detectors=[_inspector(tmp_path, [{'id': 'A', 'pattern': 'GET /'}])])
+    result = everything.analyze(path)
+    # Bare ACKs, TLS/QUIC on 443, ICMP and ARP never reach the decoder
+    assert result['skipped'] > result['packets'] // 2
+
+    web_only = OfflineAnalyzer(detectors=[_inspector(tmp_path, [
+        {'id': 'A', 'pattern': 'GET /', 'proto': 'tcp', 'ports': [80]}])])
+    scoped = web_only.analyze(path)
+    assert scoped['decoded'] < result['decoded']
+    assert [d.counters['skipped'] for d in web_only.detectors] == [0]
+
+
+def test_engine_payload_filters(tmp_path):
+    inspector = _inspector(tmp_path, [{'id': 'ANY', 'pattern': '${jndi:'},
+                                      {'id': 'TLS', 'pattern': 'x', 'proto': 'tcp', 'ports': [443]}])
+    tcp_only, tcp_skip = inspector.payload_filter()[PROTO_TCP]
+    assert tcp_only is None and 443 not in tcp_skip and 993 in tcp_skip
+    assert inspector.payload_filter()[PROTO_UDP] == (None, ENCRYPTED_PORTS)
+
+    telnet = _inspector(tmp_path, [{'id': 'TEL', 'pattern': 'login: root', 'proto': 'tcp', 'ports': [23]}])
+    assert telnet.payload_filter() == {PROTO_TCP: (frozenset({23}), ENCRYPTED_PORTS)}
+
+
+def test_merge_payload_filters():
+    skip = frozenset({443, 993})
+    assert merge_payload_filters(None, ALL_PAYLOAD) == ALL_PAYLOAD
+    assert merge_payload_filters({PROTO_TCP: (frozenset({23}), skip)},
+                                 {PROTO_TCP: (frozenset({80}), skip)}) == {PROTO_TCP: (frozenset({23, 80}), frozenset())}
+    assert merge_payload_filters({PROTO_TCP: (None, skip)},
+                                 {PROTO_TCP: (frozenset({443}), frozenset())}) == {PROTO_TCP: (None, frozenset({993}))}
+    assert merge_payload_filters({PROTO_TCP: (None, skip)},
+                                 {PROTO_UDP: (None, frozenset())}) == {PROTO_TCP: (None, skip),
+                                                                       PROTO_UDP: (None, frozenset())}
@@ -0,0 +1,20 @@
+"""اختبار خطط الاستعلامات: لا مسح كامل لجدول خارج القائمة المتوقعة"""
+
+from database import DatabaseManager
+from query_plans import EXPECTED_SCANS, check_query_plans, unexercised
+
+
+def test_no_query_falls_back_to_a_table_scan():
+    assert check_query_plans(scale=0.05) == []
+
+
+def test_new_public_method_must_be_exercised(monkeypatch):
+    monkeypatch.setattr(DatabaseManager, 'purge_everything', lambda self: None, raising=False)
+    assert unexercised({'get_logs'}).count('purge_everything') == 1
+
+
+def test_expected_scans_are_limited_to_known_tables():
+    assert any(p.match('SELECT COUNT(*) FROM devices') for p in EXPECTED_SCANS)
+    assert not any(p.match('SELECT COUNT(*) FROM activity_logs_fts_data') for p in EXPECTED_SCANS)
+    assert not any(p.match('SELECT * FROM stats_counters') for p in EXPECTED_SCANS)
+    assert not any(p.match('DELETE FROM security_alerts') for p in EXPECTED_SCANS)
@@ -0,0 +1,36 @@
+"""اختبارات تخزين عينات حركة المرور"""
+
+from collections import namedtuple
+
+from ring_store import TOTAL, TrafficStore
+
+Counters = namedtuple('Counters', 'bytes_sent bytes_recv packets_sent packets_recv errin errout dropin dropout')
+
+
+def _counters(rx_bytes, tx_bytes=0):
+    return {'eth0': Counters(tx_bytes, rx_bytes, 0, 0, 0, 0, 0, 0)}
+
+
+def test_gap_between_samples_is_averaged(tmp_path):
+    store = TrafficStore(str(tmp_path), capacity=100)
+    store.record(_counters(0), timestamp=1000)
+    store.record(_counters(1000), timestamp=1001)
+    # Monitoring paused for 10 minutes without reset(): 600 s of traffic in one sample
+    store.record(_counters(1000 + 600 * 2000), timestamp=1601)
+
+    assert store.range(TOTAL)['rx_bytes'].tolist() == [1000, 2000]
+    assert store.rates(seconds=5, now=1601)['rx_bytes'] == 2000 / 5
+    store.close()
+
+
+def test_reset_starts_from_a_new_baseline(tmp_path):
+    store = TrafficStore(str(tmp_path), capacity=100)
+    store.record(_counters(0), timestamp=1000)
+    store.record(_counters(1000), timestamp=1001)
+
+    store.reset()
+    assert not store.record(_counters(5_000_000), timestamp=1601)
+    store.record(_counters(5_003_000), timestamp=1602)
+    assert store.range('eth0')['rx_bytes'].tolist() == [1000, 3000]
+    assert store.rates(seconds=5, now=1602)['rx_bytes'] == 3000 / 5
+    store.close()
@@ -0,0 +1,60 @@
+"""اختبارات البحث النصي الكامل: الترتيب والصفحات ودمج المصدرين"""
+
+
+def _logs(db, messages, level='INFO'):
+    for message in messages:
+        db.log_activity(level, message)
+
+
+def _ids(found):
+    return [(r['kind'], r['id']) for r in found['results']]
+
+
+def test_pages_cover_every_match_once(db):
+    _logs(db, [f'device {n} connected' for n in range(25)])
+    _logs(db, ['unrelated line'])
+
+    pages = [db.search('connected', source='logs', limit=10, offset=offset) for offset in (0, 10, 20)]
+    assert [len(p['results']) for p in pages] == [10, 10, 5]
+    assert [p['has_more'] for p in pages] == [True, True, False]
+    seen = sum((_ids(p) for p in pages), [])
+    assert len(set(seen)) == 25
+    ranks = [r['rank'] for p in pages for r in p['results']]
+    assert ranks == sorted(ranks)
+
+
+def test_best_match_ranks_first_regardless_of_age(db):
+    _logs(db, ['timeout timeout timeout'])
+    _logs(db, [f'request {n} to the update server ended after a long timeout' for n in range(300)])
+
+    found = db.search('timeout', source='logs', limit=5)
+    assert found['results'][0]['message'] == 'timeout timeout timeout'
+    assert db.search('timeout', source='logs', order='recent', limit=1)['results'][0]['message'].startswith('request 299')
+
+
+def test_sources_are_interleaved_not_merged_on_raw_scores(db):
+    # Short log lines score far better than the long alert descriptions
+    _logs(db, [f'blocked {n}' for n in range(6)])
+    for n in range(3):
+        db.save_security_alert({'type': 'Firewall', 'severity': 'High', 'source_ip': f'10.0.0.{n}',
+                                'target_ip': '10.0.0.1',
+                                'description': 'outbound connection to a known malicious host was blocked '
+                                               f'by policy rule {n} after repeated attempts'})
+
+    found = db.search('blocked', limit=6)
+    assert [kind for kind, _ in _ids(found)][:6] == ['logs', 'alerts'] * 3
+    assert found['has_more']
+
+    # Paging the merged list repeats nothing and ends with the remaining logs
+    rest = db.search('blocked', limit=6, offset=6)
+    assert [kind for kind, _ in _ids(rest)] == ['logs'] * 3
+    assert not rest['has_more']
+    assert not set(_ids(found)) & set(_ids(rest))
+
+
+def test_level_filter_and_empty_query(db):
+    _logs(db, ['port scan from 10.0.0.9'], level='Security')
+    _logs(db, ['port scan finished'])
+    found = db.search('port scan', source='logs', level='Security')
+    assert [r['message'] for r in found['results']] == ['port scan from 10.0.0.9']
+    assert db.search(' -- * ') == {'results': [], 'has_more': False}
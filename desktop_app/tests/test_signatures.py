@@ -0,0 +1,102 @@
+"""اختبارات محرك التواقيع"""
+
+import json
+import random
+import time
+
+from packet_decoder import PROTO_TCP, PROTO_UDP
+from signatures import MIN_SCALING, AhoCorasick, SignatureEngine
+
+
+def _naive(patterns, data):
+    data = data.lower()
+    return sorted((i + len(p), k) for k, p in enumerate(patterns)
+                  for i in range(len(data)) if data.startswith(p.lower(), i))
+
+
+def test_automaton_matches_naive_search():
+    rng = random.Random(3)
+    for _ in range(2000):
+        patterns = [bytes(rng.choice(b'abAB') for _ in range(rng.randint(1, 7))) for _ in range(rng.randint(1, 8))]
+        data = bytes(rng.choice(b'abABc') for _ in range(rng.randint(0, 40)))
+        assert sorted(AhoCorasick(patterns).scan(data)[0]) == _naive(patterns, data)
+
+
+def test_state_carries_matches_across_segments():
+    rng = random.Random(4)
+    for _ in range(2000):
+        patterns = [bytes(rng.choice(b'abAB') for _ in range(rng.randint(1, 7))) for _ in range(rng.randint(1, 8))]
+        data = bytes(rng.choice(b'abABc') for _ in range(rng.randint(0, 40)))
+        automaton = AhoCorasick(patterns)
+        found, state, previous = [], 0, 0
+        for cut in sorted(rng.randint(0, len(data)) for _ in range(3)) + [len(data)]:
+            matches, state = automaton.scan(data[previous:cut], state)
+            found += [(end + previous, index) for end, index in matches]
+            previous = cut
+        assert sorted(found) == _naive(patterns, data)
+
+
+def test_large_sets_use_the_gram_prefilter():
+    rng = random.Random(5)
+    for _ in range(40):
+        patterns = [bytes(rng.choice(b'abcdefgHIJ') for _ in range(rng.randint(3, 9))) for _ in range(300)]
+        automaton = AhoCorasick(patterns)
+        assert automaton.prefilter is None and automaton.grams is not None
+        data = bytes(rng.choice(b'abcdefghijxyz\x00') for _ in range(rng.randint(0, 300)))
+        found, state, previous = [], 0, 0
+        for cut in sorted(rng.randint(0, len(data)) for _ in range(3)) + [len(data)]:
+            matches, state = automaton.scan(data[previous:cut], state)
+            found += [(end + previous, index) for end, index in matches]
+            previous = cut
+        assert sorted(found) == _naive(patterns, data)
+        assert sorted(automaton.scan(data)[0]) == _naive(patterns, data)
+
+
+def test_throughput_does_not_fall_with_the_signature_count():
+    # Holds for payload that rarely starts a signature; payload that starts one
+    # at nearly every byte still runs the Python loop everywhere (~12 MB/s)
+    rng = random.Random(1)
+    text = bytes(range(32, 127))
+    payload = b''.join(bytes(rng.choices(text, k=512)) + rng.randbytes(512) for _ in range(256))
+    throughput = []
+    for count in (10, 2000):
+        automaton = AhoCorasick([bytes(rng.choices(text, k=rng.randint(6, 16))) for _ in range(count)])
+        elapsed = float('inf')
+        for _ in range(3):
+            start = time.perf_counter()
+            automaton.scan(payload)
+            elapsed = min(elapsed, time.perf_counter() - start)
+        throughput.append(len(payload) / elapsed)
+    assert throughput[1] >= MIN_SCALING * throughput[0]
+
+
+def _engine(tmp_path, rules):
+    path = tmp_path / 'signatures.json'
+    path.write_text(json.dumps({'signatures': rules}))
+    return SignatureEngine(str(path))
+
+
+def test_case_sensitive_signatures_are_verified(tmp_path):
+    engine = _engine(tmp_path, [{'id': 'A', 'pattern': '/bin/sh -i'},
+                                {'id': 'B', 'pattern': 'union select', 'nocase': True}])
+    assert [s.id for s in engine.scan(b'x /BIN/SH -I; UNION SELECT 1')[0]] == ['B']
+    assert [s.id for s in engine.scan(b'/bin/sh -i')[0]] == ['A']
+
+
+def test_port_and_proto_scoping(tmp_path):
+    engine = _engine(tmp_path, [{'id': 'ANY', 'pattern': '${jndi:'},
+                                {'id': 'WEB', 'pattern': 'union select', 'proto': 'tcp', 'ports': [80]},
+                                {'id': 'TCP', 'pattern': 'powershell -enc', 'proto': 'tcp'}])
+    payload = b'${jndi: union select powershell -enc'
+    assert {s.id for s in engine.scan(payload, port=80, proto=PROTO_TCP)[0]} == {'ANY', 'WEB', 'TCP'}
+    assert {s.id for s in engine.scan(payload, port=443, proto=PROTO_TCP)[0]} == {'ANY', 'TCP'}
+    assert {s.id for s in engine.scan(payload, port=80, proto=PROTO_UDP)[0]} == {'ANY'}
+    # Ephemeral ports share the unscoped automaton
+    assert engine.automaton(PROTO_TCP, 50001) is engine.automaton(PROTO_TCP, 50002)
+
+
+def test_payloads_without_applicable_signatures_are_skipped(tmp_path):
+    engine = _engine(tmp_path, [{'id': 'TEL', 'pattern': 'login: root', 'proto': 'tcp', 'ports': [23]}])
+    assert engine.automaton(PROTO_TCP, 80) is None
+    assert engine.automaton(PROTO_UDP, 23) is None
+    assert engine.automaton(PROTO_TCP, 23) is not None
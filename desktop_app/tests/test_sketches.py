@@ -0,0 +1,85 @@
+"""اختبارات الهياكل الاحتمالية وكاشف الفحص"""
+
+import random
+
+from scan_detector import ScanDetector
+from sketches import CountMinSketch, HyperLogLog, SpaceSaving, union_count
+
+
+def test_hyperloglog_within_error_bound():
+    rng = random.Random(7)
+    for true_count in (10, 1000, 50000):
+        hll = HyperLogLog(p=10)
+        for value in rng.sample(range(1 << 40), true_count):
+            hll.add(value)
+        # 1.04 / sqrt(1024) ~ 3.3%; allow four standard errors
+        assert abs(hll.count() - true_count) <= max(2, 0.13 * true_count)
+
+
+def test_hyperloglog_ignores_duplicates():
+    hll = HyperLogLog()
+    for value in range(20):
+        hll.add(value)
+    once = hll.count()
+    for _ in range(100):
+        assert not any(hll.add(value) for value in range(20))
+    assert hll.count() == once
+    assert abs(once - 20) <= 2
+
+
+def test_union_count_merges_registers():
+    left, right = HyperLogLog(p=10), HyperLogLog(p=10)
+    for value in range(3000):
+        (left if value % 2 else right).add(value)
+        left.add(value + 1000)      # overlap with right's half
+    assert abs(union_count([left, right]) - 4000) <= 0.13 * 4000
+    assert union_count([]) == 0.0
+
+
+def test_count_min_never_underestimates():
+    rng = random.Random(11)
+    cms = CountMinSketch(width=512, depth=4)
+    truth = {}
+    for _ in range(20000):
+        key = rng.randrange(2000)
+        truth[key] = truth.get(key, 0) + 1
+        cms.add(key)
+    assert all(cms.query(key) >= count for key, count in truth.items())
+    assert cms.total == 20000
+
+
+def test_count_min_saturates_instead_of_wrapping():
+    cms = CountMinSketch(width=16, depth=2)
+    cms.add(1, 0xFFFFFFF0)
+    assert cms.add(1, 100) == 0xFFFFFFFF
+
+
+def test_space_saving_finds_heavy_hitters():
+    rng = random.Random(5)
+    summary = SpaceSaving(capacity=32)
+    truth = {}
+    for _ in range(50000):
+        key = rng.choice((1, 2, 3)) if rng.random() < 0.3 else rng.getrandbits(24)
+        truth[key] = truth.get(key, 0) + 1
+        summary.add(key)
+    top = summary.top(3)
+    assert {key for key, _, _ in top} == {1, 2, 3}
+    # The count is an upper bound and count - error a lower bound
+    assert all(count - error <= truth[key] <= count for key, count, error in top)
+    assert len(summary) == 32
+
+
+def test_vertical_scan_alerts_once():
+    detector = ScanDetector()
+    alerts = []
+    for port in range(1, 201):
+        alerts += detector.observe('10.0.0.66', '10.0.0.1', port, 1000.0 + port * 0.01)
+    assert [alert['type'] for alert in alerts].count('Port Scan') == 1
+
+
+def test_spoofed_sources_are_gated():
+    detector = ScanDetector(max_sources=64)
+    for i in range(20000):
+        detector.observe(0x0B000000 + i, 0x0A000001, 80, 2000.0 + i * 0.001)
+    assert len(detector.sources) <= 64
+    assert detector.counters['gated'] > 0
@@ -0,0 +1,52 @@
+"""اختبارات صف العدادات الذي تحدّثه الـ Triggers"""
+
+from datetime import datetime, timedelta
+
+
+def _alert(n):
+    return {'type': 'Port Scan', 'severity': 'High', 'description': f'scan {n}',
+            'source_ip': f'10.0.0.{n}', 'target_ip': '10.0.0.1'}
+
+
+def test_counters_follow_inserts_updates_and_deletes(db):
+    db.save_devices([{'ip': f'10.0.0.{n}', 'mac': f'02:00:00:00:00:{n:02x}'} for n in range(1, 5)])
+    for n in range(3):
+        db.save_security_alert(_alert(n))
+    db.save_scan_history({'type': 'Quick', 'duration': 1.0, 'devices_found': 4})
+    assert db.get_statistics() == {'total_devices': 4, 'active_devices': 4, 'total_alerts': 3,
+                                   'unresolved_alerts': 3, 'total_scans': 1}
+
+    db.mark_device_trusted('10.0.0.1')      # not a status change
+    db.resolve_alert(1)
+    db.resolve_alert(1)                     # already resolved
+    stats = db.get_statistics()
+    assert (stats['active_devices'], stats['unresolved_alerts']) == (4, 2)
+
+    db.clear_devices()
+    assert db.get_statistics()['total_devices'] == db.get_statistics()['active_devices'] == 0
+    assert db.check_statistics() == {}
+
+
+def test_expired_devices_stop_counting_as_active(db):
+    db.save_devices([{'ip': '10.0.0.1', 'mac': '02:00:00:00:00:01'},
+                     {'ip': '10.0.0.2', 'mac': '02:00:00:00:00:02'}])
+    stale = (datetime.now() - timedelta(hours=2)).isoformat()
+    db.pool.execute("UPDATE devices SET last_seen = ? WHERE ip = '10.0.0.1'", (stale,))
+
+    assert db.expire_active_devices() == 1
+    assert db.expire_active_devices() == 0
+    assert db.get_statistics()['active_devices'] == 1
+    assert db.get_device('10.0.0.1')['status'] == 'Inactive'
+
+    # Seen again by the next scan
+    db.save_devices([{'ip': '10.0.0.1', 'mac': '02:00:00:00:00:01'}])
+    assert db.get_statistics()['active_devices'] == 2
+    assert db.check_statistics() == {}
+
+
+def test_rebuild_repairs_drifted_counters(db):
+    db.save_devices([{'ip': '10.0.0.1', 'mac': '02:00:00:00:00:01'}])
+    db.pool.execute('UPDATE stats_counters SET total_devices = 7, total_scans = -1 WHERE id = 1')
+    assert db.check_statistics() == {'total_devices': (7, 1), 'total_scans': (-1, 0)}
+    assert db.rebuild_statistics()['total_devices'] == 1
+    assert db.check_statistics() == {}
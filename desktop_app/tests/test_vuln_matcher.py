@@ -0,0 +1,80 @@
+"""اختبارات مطابقة الثغرات"""
+
+import json
+import sqlite3
+
+from vuln_matcher import VulnerabilityMatcher, version_key
+
+
+def _item(cve_id, vendor, product, score=7.5, **bounds):
+    match = {'vulnerable': True, 'cpe23Uri': f'cpe:2.3:a:{vendor}:{product}:*:*:*:*:*:*:*:*'}
+    match.update(bounds)
+    return {
+        'cve': {'CVE_data_meta': {'ID': cve_id},
+                'description': {'description_data': [{'lang': 'en', 'value': cve_id}]}},
+        'configurations': {'nodes': [{'operator': 'OR', 'cpe_match': [match]}]},
+        'impact': {'baseMetricV3': {'cvssV3': {'baseScore': score, 'baseSeverity': 'HIGH'}}},
+    }
+
+
+def _feed(path, items):
+    path.write_text(json.dumps({'CVE_data_type': 'CVE', 'CVE_Items': items}))
+    return str(path)
+
+
+def _ids(matcher, product, version, vendor=None):
+    matcher.cache.clear()
+    return sorted(v['id'] for v in matcher.match(product, version, vendor))
+
+
+def test_version_key_order():
+    ordered = ['1.9', '2.0dev1', '2.0alpha2', '2.0beta1', '2.0rc1', '2.0rc2', '2.0', '2.0p1', '2.0.1', '2.10']
+    keys = [version_key(v) for v in ordered]
+    assert keys == sorted(keys)
+    assert version_key('2.0') == version_key('2.00')
+    assert version_key(None) == version_key('') == ''
+
+
+def test_range_bounds_and_pre_releases(tmp_path):
+    matcher = VulnerabilityMatcher(str(tmp_path / 'cve.db'))
+    matcher.import_feed(_feed(tmp_path / 'feed.json', [
+        _item('CVE-1', 'apache', 'http_server', versionStartIncluding='2.4.0', versionEndExcluding='2.4.50'),
+        _item('CVE-2', 'apache', 'http_server', versionStartExcluding='2.4.49', versionEndIncluding='2.4.51'),
+        _item('CVE-3', 'other', 'http_server', versionEndExcluding='3.0'),
+    ]))
+    assert _ids(matcher, 'http_server', '2.3.9') == ['CVE-3']
+    assert _ids(matcher, 'http_server', '2.4.0', 'apache') == ['CVE-1']
+    assert _ids(matcher, 'http_server', '2.4.49') == ['CVE-1', 'CVE-3']
+    assert _ids(matcher, 'http_server', '2.4.50rc1') == ['CVE-1', 'CVE-2', 'CVE-3']
+    assert _ids(matcher, 'http_server', '2.4.50') == ['CVE-2', 'CVE-3']
+    assert _ids(matcher, 'http_server', '2.4.51') == ['CVE-2', 'CVE-3']
+    assert _ids(matcher, 'http_server', '3.0rc1') == ['CVE-3']
+    assert _ids(matcher, 'http_server', '3.0') == []
+    assert _ids(matcher, 'nginx', '1.0') == []
+    matcher.close()
+
+
+def test_later_feed_replaces_cve_ranges(tmp_path):
+    matcher = VulnerabilityMatcher(str(tmp_path / 'cve.db'))
+    first = _feed(tmp_path / 'a.json', [
+        _item('CVE-1', 'openbsd', 'openssh', score=5.0, versionEndExcluding='8.0'),
+        _item('CVE-2', 'openbsd', 'openssh', versionEndExcluding='7.0'),
+    ])
+    modified = _feed(tmp_path / 'b.json', [
+        _item('CVE-1', 'openbsd', 'openssh', score=9.8, versionEndExcluding='9.0'),
+        {'cve': {'CVE_data_meta': {'ID': 'CVE-2'}}, 'configurations': {'nodes': []}},
+    ])
+    assert matcher.import_feed([first, modified]) == 1
+    assert matcher.stats() == {'cves': 1, 'ranges': 1}
+    found = matcher.match('openssh', '8.5')
+    assert [(v['id'], v['score']) for v in found] == [('CVE-1', 9.8)]
+    assert _ids(matcher, 'openssh', '6.0') == ['CVE-1']
+    matcher.close()
+
+
+def test_outdated_index_is_not_used(tmp_path):
+    path = tmp_path / 'cve.db'
+    sqlite3.connect(str(path)).close()
+    matcher = VulnerabilityMatcher(str(path))
+    assert not matcher.available
+    assert matcher.match('openssh', '8.5') == []
@@ -0,0 +1,366 @@
+"""
+Threat Intelligence Module
+وحدة قوائم الحظر (Threat Intel) للعناوين
+
+الوظائف:
+- استيراد ملفات قوائم الحظر الكبيرة (IP / CIDR / نطاقات) بملايين السطور
+- دمج العناوين في مصفوفة فترات مرتبة (uint32) محفوظة في ملف ثنائي
+- تحميل الملف عبر mmap بدون نسخه إلى الذاكرة
+- فحص العضوية بـ bisect (ميكروثوانٍ)
+- إعادة التحميل واستبدال الفهرس دفعة واحدة عند تغيّر الملف
+"""
+
+import bisect
+import json
+import mmap
+import os
+import re
+import socket
+import struct
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from packet_decoder import ip_to_str
+
+DEFAULT_BLOCKLIST = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'threat_intel.bin')
+
+MAGIC = b'NGBL'
+VERSION = 1
+# magic, version, interval count, metadata length
+HEADER = struct.Struct('<4sHxxII')
+
+_ENTRY = re.compile(r'^\s*(\d{1,3}(?:\.\d{1,3}){3})(?:\s*(?:/(\d{1,2})|-\s*(\d{1,3}(?:\.\d{1,3}){3})))?')
+
+
+def ip_to_int(ip):
+    """IPv4 نصي -> عدد صحيح (None إن لم يكن صالحاً)"""
+    try:
+        return struct.unpack('!I', socket.inet_aton(ip))[0]
+    except (OSError, TypeError):
+        return None
+
+
+def parse_entry(line):
+    """
+    سطر من قائمة حظر -> (بداية, نهاية) أو None
+    يدعم: 1.2.3.4 | 1.2.3.0/24 | 1.2.3.4 - 1.2.3.9 | مع تعليقات # أو ;
+    """
+    match = _ENTRY.match(line)
+    if match is None:
+        return None
+    start = ip_to_int(match.group(1))
+    if start is None:
+        return None
+    if match.group(2) is not None:
+        prefix = int(match.group(2))
+        if prefix > 32:
+            return None
+        mask = (0xFFFFFFFF << (32 - prefix)) & 0xFFFFFFFF
+        start &= mask
+        return start, start | (~mask & 0xFFFFFFFF)
+    if match.group(3) is not None:
+        end = ip_to_int(match.group(3))
+        if end is None or end < start:
+            return None
+        return start, end
+    return start, start
+
+
+def merge_intervals(starts, ends):
+    """دمج الفترات المتداخلة أو المتلاصقة (مصفوفات numpy)"""
+    if len(starts) == 0:
+        return starts.astype(np.uint32), ends.astype(np.uint32)
+
+    order = np.lexsort((ends, starts))
+    starts = starts[order].astype(np.int64)
+    ends = ends[order].astype(np.int64)
+
+    # A new group starts where the interval begins after everything before it ends (+1: adjacent)
+    running_end = np.maximum.accumulate(ends)
+    new_group = np.empty(len(starts), dtype=bool)
+    new_group[0] = True
+    new_group[1:] = starts[1:] > running_end[:-1] + 1
+
+    group_starts = starts[new_group]
+    group_index = np.flatnonzero(new_group)
+    group_ends = np.maximum.reduceat(ends, group_index)
+    return group_starts.astype(np.uint32), group_ends.astype(np.uint32)
+
+
+def build_blocklist(sources, path=DEFAULT_BLOCKLIST, chunk_entries=1 << 20, progress=None):
+    """
+    استيراد ملفات قوائم الحظر إلى ملف الفهرس الثنائي
+    الملف يُكتب إلى ملف مؤقت ثم يُستبدل دفعة واحدة
+    """
+    if isinstance(sources, str):
+        sources = [sources]
+
+    # Parsed in chunks and merged as we go so memory stays bounded by the merged size
+    merged_starts = np.empty(0, dtype=np.uint32)
+    merged_ends = np.empty(0, dtype=np.uint32)
+    pending = []
+    entries = 0
+
+    def _flush():
+        nonlocal merged_starts, merged_ends, pending
+        if not pending:
+            return
+        chunk = np.array(pending, dtype=np.int64)
+        pending = []
+        merged_starts, merged_ends = merge_intervals(
+            np.concatenate([merged_starts, chunk[:, 0]]),
+            np.concatenate([merged_ends, chunk[:, 1]])
+        )
+
+    for source in sources:
+        with open(source, 'r', encoding='utf-8', errors='ignore') as f:
+            for line in f:
+                entry = parse_entry(line)
+                if entry is None:
+                    continue
+                pending.append(entry)
+                entries += 1
+                if len(pending) >= chunk_entries:
+                    _flush()
+                    if progress:
+                        progress(entries)
+    _flush()
+
+    meta = json.dumps({
+        'sources': [os.path.basename(s) for s in sources],
+        'entries': entries,
+        'addresses': int((merged_ends.astype(np.int64) - merged_starts + 1).sum()),
+        'built': time.time()
+    }).encode('utf-8')
+    meta += b' ' * (-len(meta) % 4)        # keep the arrays 4-byte aligned
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(merged_starts), len(meta)))
+        f.write(meta)
+        f.write(merged_starts.astype('<u4').tobytes())
+        f.write(merged_ends.astype('<u4').tobytes())
+    os.replace(tmp_path, path)
+
+    if progress:
+        progress(entries)
+    return {'entries': entries, 'intervals': len(merged_starts)}
+
+
+class _Index:
+    """فهرس محمّل: mmap + عرضان (بدايات / نهايات)"""
+
+    __slots__ = ('mm', 'starts', 'ends', 'meta', 'mtime')
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.mtime = os.fstat(f.fileno()).st_mtime
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count, meta_len = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Not a blocklist index: {path}")
+        offset = HEADER.size
+        self.meta = json.loads(self.mm[offset:offset + meta_len].decode('utf-8').strip() or '{}')
+        offset += meta_len
+        view = memoryview(self.mm)
+        self.starts = view[offset:offset + count * 4].cast('I')
+        self.ends = view[offset + count * 4:offset + count * 8].cast('I')
+
+
+class ThreatIntel:
+    """فحص العناوين مقابل قائمة الحظر المحمّلة"""
+
+    def __init__(self, path=DEFAULT_BLOCKLIST, check_interval=5.0):
+        self.path = path
+        self.check_interval = check_interval
+        self.index = None
+        self.last_check = 0.0
+        self.generation = 0
+        self.load()
+
+    def load(self):
+        """تحميل الملف (الفهرس القديم يبقى عند الخطأ)"""
+        try:
+            index = _Index(self.path)
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            print(f"Error loading blocklist: {e}")
+            return False
+        # Single reference swap: lookups see the old or the new index, never a mix
+        self.index = index
+        self.generation += 1
+        return True
+
+    def maybe_reload(self):
+        """إعادة التحميل إذا تغيّر الملف (بحد أقصى مرة كل check_interval)"""
+        now = time.monotonic()
+        if now - self.last_check < self.check_interval:
+            return False
+        self.last_check = now
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return False
+        if self.index is not None and mtime == self.index.mtime:
+            return False
+        return self.load()
+
+    def import_lists(self, sources, progress=None):
+        """استيراد قوائم جديدة ثم تحميلها"""
+        result = build_blocklist(sources, self.path, progress=progress)
+        self.load()
+        return result
+
+    @property
+    def count(self):
+        index = self.index
+        return len(index.starts) if index is not None else 0
+
+    @property
+    def meta(self):
+        index = self.index
+        return index.meta if index is not None else {}
+
+    def contains_int(self, ip):
+        """فحص عنوان (عدد صحيح) بـ bisect"""
+        index = self.index
+        if index is None:
+            return False
+        i = bisect.bisect_right(index.starts, ip) - 1
+        return i >= 0 and ip <= index.ends[i]
+
+    def contains(self, ip):
+        """فحص عنوان (نص أو عدد صحيح)"""
+        if isinstance(ip, str):
+            ip = ip_to_int(ip)
+            if ip is None:
+                return False
+        return self.contains_int(ip)
+
+    def contains_many(self, ips):
+        """فحص دفعة عناوين (أعداد صحيحة) دفعة واحدة"""
+        index = self.index
+        ips = np.asarray(ips, dtype=np.uint32)
+        if index is None or len(index.starts) == 0:
+            return np.zeros(len(ips), dtype=bool)
+        starts = np.frombuffer(index.starts, dtype=np.uint32)
+        ends = np.frombuffer(index.ends, dtype=np.uint32)
+        i = np.searchsorted(starts, ips, side='right') - 1
+        return (i >= 0) & (ips <= ends[np.maximum(i, 0)])
+
+    def alert(self, ip, context, target_ip=None, severity='High'):
+        """تنبيه تطابق مع قائمة الحظر"""
+        sources = ', '.join(self.meta.get('sources', [])) or 'local blocklist'
+        return {
+            'type': 'Threat Intel Match',
+            'severity': severity,
+            'description': f"{context} {ip} is on the threat-intel blocklist ({sources})",
+            'source_ip': ip,
+            'target_ip': target_ip
+        }
+
+    def check_devices(self, devices):
+        """فحص أجهزة الشبكة"""
+        self.maybe_reload()
+        return [self.alert(d['ip'], 'Device', severity='Critical')
+                for d in devices if d.get('ip') and self.contains(d['ip'])]
+
+
+class ThreatIntelDetector:
+    """فحص العناوين البعيدة في الحزم الملتقطة (مرة لكل عنوان جديد)"""
+
+    needs = ('all',)
+
+    def __init__(self, intel=None, max_seen=65536, recheck=3600):
+        self.intel = intel or ThreatIntel()
+        self.max_seen = max_seen
+        self.recheck = recheck
+        self.seen = OrderedDict()       # ip -> last check time
+        self._lock = threading.Lock()
+
+    def _check(self, ip, ts):
+        last = self.seen.get(ip)
+        if last is not None and ts - last < self.recheck:
+            return False
+        self.seen[ip] = ts
+        self.seen.move_to_end(ip)
+        if len(self.seen) > self.max_seen:
+            self.seen.popitem(last=False)
+        return self.intel.contains_int(ip)
+
+    def observe(self, src, dst, ts=None, context='Connection with'):
+        """فحص اتصال جديد (عناوين نصية أو أعداد صحيحة)"""
+        ts = ts if ts is not None else time.time()
+        alerts = []
+        with self._lock:
+            for ip, peer in ((src, dst), (dst, src)):
+                value = ip_to_int(ip) if isinstance(ip, str) else ip
+                if value is not None and self._check(value, ts):
+                    ip_text = ip if isinstance(ip, str) else ip_to_str(ip)
+                    peer_text = peer if isinstance(peer, str) else ip_to_str(peer)
+                    alerts.append(self.intel.alert(ip_text, context, target_ip=peer_text))
+        return alerts
+
+    def process(self, pkt):
+        """معالجة حزمة مفكوكة"""
+        if not pkt.src_ip or self.intel.index is None:
+            return []
+        seen = self.seen
+        # Fast path: both ends already checked recently
+        if pkt.src_ip in seen and pkt.dst_ip in seen:
+            return []
+        self.intel.maybe_reload()
+        return self.observe(pkt.src_ip, pkt.dst_ip, pkt.ts, 'Traffic with')
+
+    def flush(self):
+        self.seen.clear()
+        return []
+
+
+# Test the module
+if __name__ == "__main__":
+    import random
+    import sys
+    import tempfile
+
+    if len(sys.argv) > 2 and sys.argv[1] == 'import':
+        start = time.perf_counter()
+        result = build_blocklist(sys.argv[2:], progress=lambda n: print(f"\r{n:,} entries", end=''))
+        print(f"\n{result['intervals']:,} intervals in {time.perf_counter() - start:.1f}s -> {DEFAULT_BLOCKLIST}")
+        sys.exit(0)
+
+    random.seed(1)
+    source = os.path.join(tempfile.gettempdir(), 'guardian_blocklist.txt')
+    count = 2_000_000
+    with open(source, 'w') as f:
+        f.write("# synthetic blocklist\n")
+        for i in range(count):
+            ip = random.getrandbits(32)
+            if i % 10 == 0:
+                f.write(f"{ip_to_str(ip & 0xFFFFFF00)}/24 ; SBL{i}\n")
+            else:
+                f.write(f"{ip_to_str(ip)}\n")
+        f.write("203.0.113.7\n")
+
+    path = os.path.join(tempfile.gettempdir(), 'guardian_blocklist.bin')
+    start = time.perf_counter()
+    result = build_blocklist(source, path)
+    print(f"Imported {result['entries']:,} entries -> {result['intervals']:,} intervals "
+          f"in {time.perf_counter() - start:.1f}s ({os.path.getsize(path) / 1e6:.1f} MB)")
+
+    intel = ThreatIntel(path)
+    print(f"203.0.113.7 listed: {intel.contains('203.0.113.7')}, 192.168.1.1 listed: {intel.contains('192.168.1.1')}")
+
+    probes = [random.getrandbits(32) for _ in range(200000)]
+    start = time.perf_counter()
+    hits = sum(intel.contains_int(ip) for ip in probes)
+    elapsed = time.perf_counter() - start
+    print(f"{elapsed / len(probes) * 1e6:.2f} us per lookup ({hits} hits)")
+
+    start = time.perf_counter()
+    intel.contains_many(probes)
+    print(f"Batch: {(time.perf_counter() - start) / len(probes) * 1e9:.0f} ns per lookup")
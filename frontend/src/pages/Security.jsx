@@ -67,18 +67,26 @@ function Security() {
         queryFn: () => alertService.getAllAlerts(),
     });
 
+    // Fetch open incidents (alerts correlated by IP / MAC)
+    const { data: incidentsData, isLoading: isLoadingIncidents, refetch: refetchIncidents } = useQuery({
+        queryKey: ['incidents'],
+        queryFn: () => alertService.getIncidents({ status: 'Open' }),
+    });
+
     const handleRefresh = () => {
         refetchScore();
         refetchAlerts();
+        refetchIncidents();
     };
 
-    const isLoading = isLoadingScore || isLoadingAlerts;
+    const isLoading = isLoadingScore || isLoadingAlerts || isLoadingIncidents;
 
     // Process data
     const currentScore = scoreData && scoreData.length > 0 ? scoreData[scoreData.length - 1].score : 85;
     const securityScoreChartData = [{ name: 'Score', value: currentScore, fill: currentScore > 70 ? '#00e676' : '#ff1744' }];
 
     const alerts = Array.isArray(alertsData) ? alertsData : (alertsData?.results || []);
+    const incidents = Array.isArray(incidentsData) ? incidentsData : (incidentsData?.results || []);
 
     // Derive vulnerabilities stat from alerts for now
     const vulnerabilities = [
@@ -212,20 +220,20 @@ function Security() {
 
             {/* Alerts and Recommendations */}
             <Grid container spacing={3}>
-                {/* Security Alerts Timeline */}
+                {/* Incidents (correlated alerts) */}
                 <Grid item xs={12} md={6}>
                     <Card>
                         <CardContent>
                             <Typography variant="h6" fontWeight={600} gutterBottom>
-                                Recent Security Alerts
+                                Open Incidents
                             </Typography>
                             <List sx={{ maxHeight: 400, overflow: 'auto' }}>
-                                {alerts.length > 0 ? (
-                                    alerts.slice(0, 10).map((alert, index) => { // Show top 10
-                                        const { color, icon: IconComponent } = getSeverityConfig(alert.severity);
+                                {incidents.length > 0 ? (
+                                    incidents.slice(0, 10).map((incident, index) => { // Show top 10
+                                        const { color, icon: IconComponent } = getSeverityConfig(incident.severity);
                                         return (
                                             <ListItem
-                                                key={alert.id || index}
+                                                key={incident.id || index}
                                                 sx={{
                                                     borderRadius: 2,
                                                     mb: 1,
@@ -238,15 +246,16 @@ function Security() {
                                                     <IconComponent color={color} />
                                                 </ListItemIcon>
                                                 <ListItemText
-                                                    primary={alert.alert_type || 'Security Alert'} // Use alert_type from model
+                                                    primary={incident.title || 'Security Incident'}
                                                     secondary={
                                                         <>
                                                             <Typography component="span" variant="body2" color="text.primary">
-                                                                {alert.description}
+                                                                {incident.alert_count} related alerts
+                                                                {incident.alerts?.length > 0 && `: ${incident.alerts[0].description}`}
                                                             </Typography>
                                                             <br />
                                                             <Typography component="span" variant="caption" color="text.secondary">
-                                                                {new Date(alert.timestamp).toLocaleString()}
+                                                                {new Date(incident.first_seen).toLocaleString()} - {new Date(incident.last_seen).toLocaleString()}
                                                             </Typography>
                                                         </>
                                                     }
@@ -257,7 +266,7 @@ function Security() {
                                     })
                                 ) : (
                                     <Typography variant="body2" color="text.secondary" sx={{ p: 2, textAlign: 'center' }}>
-                                        No recent alerts.
+                                        No open incidents.
                                     </Typography>
                                 )}
                             </List>
@@ -25,6 +25,18 @@ export const alertService = {
         return response.data;
     },
 
+    // Get incidents (correlated alerts)
+    getIncidents: async (params = {}) => {
+        const response = await api.get('/alerts/incidents/', { params });
+        return response.data;
+    },
+
+    // Resolve an incident and all of its alerts
+    resolveIncident: async (id) => {
+        const response = await api.post(`/alerts/incidents/${id}/resolve/`);
+        return response.data;
+    },
+
     // Get alerts stats (simulated for now if not endpoint exists)
     getStats: async () => {
         // We can either add an endpoint or calculate on frontend
@@ -18,6 +18,12 @@ export const monitoringService = {
         const response = await api.get('/monitoring/device_distribution/');
         return response.data;
     },
+
+    // Get latest top talkers snapshot (sources / destinations / ports)
+    getTopTalkers: async () => {
+        const response = await api.get('/monitoring/top_talkers/');
+        return response.data;
+    },
 };
 
 export default monitoringService;